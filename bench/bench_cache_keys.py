@@ -0,0 +1,201 @@
+"""
+Replay a request log against simulated caches to compare hit rates with the
+raw feed URLs and request URIs as cache keys (as FeedMixer used to key them)
+and with canonical ones (see `feedmixer.canonical_url` and
+`feedmixer_api.MixedFeed.render_key`):
+
+- fetch: an LRU cache of fetched feeds, keyed by feed URL (standing in for the
+  CacheControl cache, the entry store and the latency estimates)
+- render: an LRU cache of rendered mixes, keyed by request
+
+The log is a file of request targets (``/atom?f=...&n=3``), one per line;
+lines in Common Log Format (as written by gunicorn or a front-end proxy) are
+accepted too. Without ``--log`` a synthetic log is generated in which feed
+URLs are spelled in several equivalent ways and mixes list their feeds in
+varying order. Run from the repository root::
+
+$ python -m bench.bench_cache_keys --log access.log -o keys.json
+
+Entries never expire in the simulated caches, so the hit rates are upper
+bounds for a given cache size; the difference between the two keyings is
+what matters.
+"""
+
+import collections
+import random
+import re
+import urllib.parse
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import falcon
+
+from bench.common import StubSession, arg_parser, write_results
+from feedmixer import FeedMixer
+from feedmixer_api import MixedFeed
+
+# The request target of a Common Log Format line
+_CLF_REQUEST = re.compile(r'"[A-Z]+ (\S+) HTTP/[0-9.]+"')
+
+ENDPOINTS = {"/atom": "atom", "/rss": "rss", "/json": "json"}
+
+
+class LRUCounter(object):
+    """
+    Count the hits and misses of an LRU cache of `maxsize` keys.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.keys = collections.OrderedDict()  # type: collections.OrderedDict[str, None]
+        self.hits = 0
+        self.misses = 0
+        self.distinct = set()  # type: set
+
+    def access(self, key: str) -> None:
+        self.distinct.add(key)
+        if key in self.keys:
+            self.hits += 1
+            self.keys.move_to_end(key)
+            return
+        self.misses += 1
+        self.keys[key] = None
+        if len(self.keys) > self.maxsize:
+            self.keys.popitem(last=False)
+
+    def result(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "requests": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "distinct_keys": len(self.distinct),
+        }
+
+
+def read_log(path: str) -> List[str]:
+    """
+    The request targets of the mix endpoints in the log at `path`.
+    """
+    targets = []
+    with open(path, "r") as f:
+        for line in f:
+            m = _CLF_REQUEST.search(line)
+            target = m.group(1) if m else line.strip()
+            if urllib.parse.urlsplit(target).path in ENDPOINTS:
+                targets.append(target)
+    return targets
+
+
+def respell(url: str, rng: random.Random) -> str:
+    """
+    An equivalent spelling of the canonical `url`.
+    """
+    parts = urllib.parse.urlsplit(url)
+    variant = rng.randrange(4)
+    if variant == 0:
+        return urllib.parse.urlunsplit((parts.scheme.upper(), parts.netloc, parts.path, parts.query, ""))
+    if variant == 1:
+        return urllib.parse.urlunsplit((parts.scheme, parts.netloc.upper() + ":80", parts.path, parts.query, ""))
+    if variant == 2:
+        return url + "?"
+    return url + "#entries"
+
+
+def synthetic_log(requests: int, feeds: int, mixes: int, variants: float, seed: int = 0) -> List[str]:
+    """
+    `requests` request targets for `mixes` mixes (requested with a Zipf-like
+    popularity) of 2 to 10 of `feeds` feeds. Each feed URL is respelled with
+    probability `variants`, and the feeds of a mix are listed in a random
+    order.
+    """
+    rng = random.Random(seed)
+    pool = ["http://feeds{}.example.org/feed/{}".format(i % 7, i) for i in range(feeds)]
+    specs = []
+    for _ in range(mixes):
+        urls = rng.sample(pool, rng.randint(2, min(10, feeds)))
+        specs.append((urls, rng.choice([3, 5, 10]), rng.choice(list(ENDPOINTS))))
+    weights = [1.0 / (rank + 1) for rank in range(mixes)]
+    targets = []
+    for spec in rng.choices(specs, weights=weights, k=requests):
+        urls, n, path = spec
+        urls = [respell(u, rng) if rng.random() < variants else u for u in urls]
+        rng.shuffle(urls)
+        qs = urllib.parse.urlencode([("f", u) for u in urls] + [("n", n)])
+        targets.append("{}?{}".format(path, qs))
+    return targets
+
+
+def mix_request(target: str) -> Tuple[str, List[str], int]:
+    """
+    The feed type, the feeds (as given) and `n` of the request `target`.
+    """
+    parts = urllib.parse.urlsplit(target)
+    qs = falcon.uri.parse_query_string(parts.query)
+    feeds = qs.get("f", [])
+    if not isinstance(feeds, list):
+        feeds = [feeds]
+    try:
+        n = int(qs.get("n", -1))
+    except ValueError:
+        n = -1
+    return ENDPOINTS[parts.path], feeds, n
+
+
+def replay(targets: Iterable[str], cache_size: int) -> List[Dict[str, Any]]:
+    sess = StubSession({})
+    resources = {ftype: MixedFeed(ftype=ftype, sess=sess) for ftype in ENDPOINTS.values()}
+
+    def raw_keys(target: str) -> Tuple[str, List[str]]:
+        feeds = mix_request(target)[1]
+        return target, feeds[:100]
+
+    def canonical_keys(target: str) -> Tuple[str, List[str]]:
+        ftype, feeds, n = mix_request(target)
+        fm = FeedMixer(feeds=feeds, num_keep=n, sess=sess)
+        return resources[ftype].render_key(fm), fm.feeds
+
+    keyings = {"raw": raw_keys, "canonical": canonical_keys}  # type: Dict[str, Callable]
+    counters = {
+        (keying, cache): LRUCounter(cache_size) for keying in keyings for cache in ("fetch", "render")
+    }
+    for target in targets:
+        for keying, keys in keyings.items():
+            render_key, urls = keys(target)
+            rendered = counters[(keying, "render")]
+            hits = rendered.hits
+            rendered.access(render_key)
+            if rendered.hits > hits:
+                # a mix served from the render cache fetches nothing
+                continue
+            for url in urls:
+                counters[(keying, "fetch")].access(url)
+
+    return [
+        dict(case="{}/{}".format(cache, keying), cache=cache, keying=keying, cache_size=cache_size, **c.result())
+        for (keying, cache), c in counters.items()
+    ]
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n\n")[0])
+    parser.add_argument("--log", help="request log to replay (default: a synthetic log)")
+    parser.add_argument("--cache-size", type=int, default=128, help="entries per simulated cache (default: 128)")
+    parser.add_argument("--requests", type=int, default=20000, help="synthetic requests (default: 20000)")
+    parser.add_argument("--feeds", type=int, default=400, help="distinct synthetic feeds (default: 400)")
+    parser.add_argument("--mixes", type=int, default=200, help="distinct synthetic mixes (default: 200)")
+    parser.add_argument(
+        "--variants", type=float, default=0.3, help="share of synthetic URLs respelled (default: 0.3)"
+    )
+    args = parser.parse_args()
+
+    if args.log:
+        targets = read_log(args.log)
+    else:
+        requests = 2000 if args.quick else args.requests
+        targets = synthetic_log(requests, args.feeds, args.mixes, args.variants)
+    write_results("cache_keys", replay(targets, args.cache_size), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Measure memory with `tracemalloc`:
+
+- parser_cache: bytes retained per feed held in the parser cache (the parse
+  result, plus the document text which the cache keeps alive as its key)
+- http_cache: bytes retained per response held in the CacheControl dict cache
+  (fetched from a local upstream which sends `Cache-Control: max-age`)
+- mix: peak bytes allocated while a mix is in flight (with a cold and with a
+  warm parser cache) and bytes still retained once it is done
+
+Run from the repository root::
+
+$ python -m bench.bench_memory -o memory.json
+
+Pass ``--max-per-feed BYTES`` to exit with an error status if the retained
+bytes per cached feed exceed a limit (for use as a regression check).
+"""
+
+import functools
+import gc
+import sys
+import tracemalloc
+from typing import Any, Dict, List
+
+import cachecontrol
+import feedparser
+import requests
+from cachecontrol.cache import DictCache
+
+from bench import fixtures
+from bench.common import StubSession, arg_parser, write_results
+from bench.loadtest import ThreadingHTTPServer, UpstreamHandler, farm_urls, serve_in_thread
+from feedmixer import FeedMixer
+
+
+def traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def parser_cache_cost(docs: Dict[str, str]) -> Dict[str, Any]:
+    cache = functools.lru_cache(maxsize=len(docs))(feedparser.parse)
+    before = traced()
+    for doc in docs.values():
+        cache(doc)
+    retained = traced() - before
+    # the documents were allocated before tracing started, but the cache keeps
+    # them alive as its keys, so count them too
+    key_bytes = sum(sys.getsizeof(doc) for doc in docs.values())
+    return {
+        "feeds": len(docs),
+        "doc_bytes": key_bytes // len(docs),
+        "parse_result_bytes_per_feed": retained // len(docs),
+        "bytes_per_feed": (retained + key_bytes) // len(docs),
+    }
+
+
+def http_cache_cost(fmt: str, num_feeds: int, entries: int) -> Dict[str, Any]:
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), UpstreamHandler)
+    serve_in_thread(upstream)
+    spec = {"count": num_feeds, "format": fmt, "entries": entries, "max_age": 3600}
+    urls = farm_urls(upstream.server_address[1], [spec])
+    cache = DictCache()
+    sess = cachecontrol.CacheControl(requests.Session(), cache=cache)
+    try:
+        # make one request first so the connection pool is set up
+        sess.get(urls[0]).content
+        cache.data.clear()
+        before = traced()
+        for url in urls:
+            sess.get(url).content
+        retained = traced() - before
+    finally:
+        upstream.shutdown()
+        upstream.server_close()
+    return {
+        "feeds": num_feeds,
+        "entries": len(cache.data),
+        "serialized_bytes_per_feed": sum(len(v) for v in cache.data.values()) // num_feeds,
+        "bytes_per_feed": retained // num_feeds,
+    }
+
+
+def mix_cost(docs: Dict[str, str], ftype: str, num_keep: int) -> Dict[str, Any]:
+    sess = StubSession(docs)
+    # responses are created once by the stub; make them before measuring
+    for url in docs:
+        sess.get(url)
+    parser_cache = functools.lru_cache(maxsize=len(docs))(feedparser.parse)
+
+    result = {}  # type: Dict[str, Any]
+    for label in ("cold", "warm"):
+        before = traced()
+        tracemalloc.reset_peak()
+        fm = FeedMixer(feeds=list(docs), num_keep=num_keep, sess=sess, parser_cache=parser_cache)
+        getattr(fm, "{}_feed".format(ftype))()
+        peak = tracemalloc.get_traced_memory()[1]
+        del fm
+        result["{}_peak_bytes".format(label)] = peak - before
+        result["{}_retained_bytes".format(label)] = traced() - before
+    return result
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n\n")[0])
+    parser.add_argument("--feeds", type=int, default=20)
+    parser.add_argument("--entries", type=int, nargs="+", default=[20, 200])
+    parser.add_argument("--nframes", type=int, default=1)
+    parser.add_argument("--max-per-feed", type=int, help="fail if a cached feed retains more than this")
+    args = parser.parse_args()
+    if args.quick:
+        args.feeds = min(args.feeds, 5)
+        args.entries = args.entries[:1]
+
+    tracemalloc.start(args.nframes)
+    results = []  # type: List[Dict[str, Any]]
+    for fmt in fixtures.FORMATS:
+        for body in fixtures.BODIES:
+            for entries in args.entries:
+                docs = {
+                    "https://example.org/{}/{}".format(fmt, i): fixtures.make_feed(fmt, entries, body, name=str(i))
+                    for i in range(args.feeds)
+                }
+                suffix = "{}/{}/{}".format(fmt, body, entries)
+                results.append(dict(case="parser_cache/" + suffix, **parser_cache_cost(docs)))
+                for ftype in ("atom", "json"):
+                    results.append(
+                        dict(case="mix_{}/{}".format(ftype, suffix), feeds=args.feeds, **mix_cost(docs, ftype, 0))
+                    )
+        for entries in args.entries:
+            results.append(
+                dict(case="http_cache/{}/{}".format(fmt, entries), **http_cache_cost(fmt, args.feeds, entries))
+            )
+    tracemalloc.stop()
+    write_results("memory", results, args)
+
+    if args.max_per_feed is not None:
+        over = [
+            r for r in results
+            if r["case"].startswith(("parser_cache", "http_cache")) and r["bytes_per_feed"] > args.max_per_feed
+        ]
+        for r in over:
+            print("{} retains {} bytes per feed".format(r["case"], r["bytes_per_feed"]), file=sys.stderr)
+        if over:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
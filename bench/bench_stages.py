@@ -0,0 +1,203 @@
+"""
+Microbenchmarks for the stages FeedMixer goes through to produce a mixed feed:
+
+- parse: `feedmixer.parse_document` of the fetched bytes and Content-Type via
+  `FeedMixer.cache_parser` (both a cache miss and a cache hit)
+- sort: `feedmixer.merge_entries` of four feeds' stored entries (the merge
+  done in `__mix`)
+- extract: `feedmixer.extract_entry` of each entry with its feed's `FeedInfo`
+  (as `StoredEntry.meta` does)
+- refresh: `EntryStore.update` (and extraction) of a feed whose previous
+  version is already in the store, with one new entry
+- atom_feed/rss_feed/json_feed: `atom_feed()`, `rss_feed()` and `json_feed()`
+- atom_native/rss_native: `atom_feed()` and `rss_feed()` with `native_xml`
+  set, once each entry's markup is kept in the store (as for every request
+  after the first to include it)
+- atom_native_cold/rss_native_cold: the same, but with a fresh store (so every
+  entry is serialized)
+- json_stdlib/json_orjson/json_msgspec: `json_feed()` with each available
+  `json_backend`
+- extract_titles/atom_titles: `extract_entry` and `atom_feed()` with
+  ``fields=title`` (no content is processed or written)
+- text_nocharset/bytes_nocharset: getting a document out of a
+  `requests.Response` and parsing it (uncached), for a document with no
+  encoding in its XML declaration served as ``application/xml`` without a
+  charset: through `Response.text` (which runs charset detection over the
+  whole body to decode it) as FeedMixer used to, and as raw bytes with the
+  Content-Type (see `feedmixer.parse_document`)
+
+The fixtures are generated feeds (see `bench/fixtures.py`) of varying size,
+body length and format. Run from the repository root::
+
+$ python -m bench.bench_stages -o before.json
+$ # ...change things...
+$ python -m bench.bench_stages -o after.json --compare before.json
+"""
+
+from typing import Any, Callable, Dict, List
+
+import feedparser
+import requests
+
+from bench import fixtures
+from bench.common import StubSession, arg_parser, time_call, write_results
+from feedmixer import (
+    JSON_BACKENDS,
+    Document,
+    EntryStore,
+    FeedMixer,
+    extract_entry,
+    feed_info,
+    merge_entries,
+    parse_document,
+    parse_fields,
+)
+
+STAGES = [
+    "parse_miss",
+    "parse_hit",
+    "sort",
+    "extract",
+    "refresh",
+    "atom_feed",
+    "rss_feed",
+    "json_feed",
+    "atom_native",
+    "rss_native",
+    "atom_native_cold",
+    "rss_native_cold",
+    "extract_titles",
+    "atom_titles",
+    "text_nocharset",
+    "bytes_nocharset",
+] + ["json_{}".format(backend) for backend in JSON_BACKENDS]
+
+
+def make_response(content: bytes, content_type: str) -> requests.Response:
+    """
+    A real `requests.Response` (so that `.text` does what it does for a
+    fetched document).
+    """
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = content
+    resp.headers["Content-Type"] = content_type
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    return resp
+
+
+def bench_case(fmt: str, body: str, size: int, stages: List[str], repeat: int) -> List[Dict[str, Any]]:
+    url = "https://example.org/{}".format(fmt)
+    doc = fixtures.make_feed(fmt, size, body)
+    sess = StubSession({url: doc})
+    fm = FeedMixer(feeds=[url], num_keep=0, sess=sess)
+
+    # (as fetched: the bytes and Content-Type the stub session serves)
+    fetched = Document(doc.encode("utf-8"), sess.resp_headers["Content-Type"])
+    parsed = parse_document(fm.cache_parser, fetched)
+    entries = parsed.entries
+    info = feed_info(parsed)
+    mix_store = EntryStore()
+    stored_feeds = [mix_store.update("{}/{}".format(url, i), parsed).entries for i in range(4)]
+
+    # the refreshed version of the feed has one more entry
+    refreshed_doc = fixtures.make_feed(fmt, size + 1, body).encode("utf-8")
+    refreshed = parse_document(fm.cache_parser, Document(refreshed_doc, fetched.content_type))
+    store = EntryStore()
+
+    def reset_store() -> None:
+        store.clear()
+        for s in store.update(url, parsed).document:
+            s.meta()
+
+    def refresh() -> None:
+        for s in store.update(url, refreshed).document:
+            s.meta()
+
+    native = FeedMixer(feeds=[url], num_keep=0, sess=sess, parser_cache=fm.cache_parser, native_xml=True)
+    cold = []  # type: List[FeedMixer]
+    titles = parse_fields("title")
+    fm_titles = FeedMixer(feeds=[url], num_keep=0, sess=sess, parser_cache=fm.cache_parser, fields=titles)
+
+    def reset_cold() -> None:
+        cold[:] = [
+            FeedMixer(feeds=[url], num_keep=0, sess=sess, parser_cache=fm.cache_parser, native_xml=True)
+        ]
+        cold[0].mixed_entries
+
+    nocharset = make_response(fixtures.make_feed(fmt, size, body, charset=None).encode("utf-8"), "application/xml")
+
+    def parse_bytes() -> None:
+        parse_document(feedparser.parse, Document(nocharset.content, nocharset.headers.get("content-type")))
+
+    cases = {
+        "parse_miss": (lambda: parse_document(fm.cache_parser, fetched), fm.cache_parser.cache_clear),
+        "parse_hit": (lambda: parse_document(fm.cache_parser, fetched), None),
+        "sort": (lambda: merge_entries(stored_feeds), None),
+        "extract": (lambda: [extract_entry(e, feed=info) for e in entries], None),
+        "refresh": (refresh, reset_store),
+        "atom_feed": (fm.atom_feed, None),
+        "rss_feed": (fm.rss_feed, None),
+        "json_feed": (fm.json_feed, None),
+        "atom_native": (native.atom_feed, None),
+        "rss_native": (native.rss_feed, None),
+        "atom_native_cold": (lambda: cold[0].atom_feed(), reset_cold),
+        "rss_native_cold": (lambda: cold[0].rss_feed(), reset_cold),
+        "extract_titles": (lambda: [extract_entry(e, fields=titles, feed=info) for e in entries], None),
+        "atom_titles": (fm_titles.atom_feed, None),
+        "text_nocharset": (lambda: feedparser.parse(nocharset.text), None),
+        "bytes_nocharset": (parse_bytes, None),
+    }  # type: Dict[str, Any]
+    for backend in JSON_BACKENDS:
+        fm_json = FeedMixer(feeds=[url], num_keep=0, sess=sess, parser_cache=fm.cache_parser, json_backend=backend)
+        fm_json.mixed_entries
+        cases["json_" + backend] = (fm_json.json_feed, None)
+
+    # warm up: populate the parser cache, fm.mixed_entries and the native
+    # serializer's stored markup
+    parse_document(fm.cache_parser, fetched)
+    fm.mixed_entries
+    native.atom_feed()
+    native.rss_feed()
+    fm_titles.mixed_entries
+
+    results = []
+    for stage in stages:
+        fn, setup = cases[stage]  # type: Callable, Any
+        timing = time_call(fn, setup=setup, repeat=repeat)
+        results.append(
+            dict(
+                case="{}/{}/{}/{}".format(stage, fmt, body, size),
+                stage=stage,
+                format=fmt,
+                body=body,
+                entries=size,
+                bytes=len(doc.encode("utf-8")),
+                **timing
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", help="entries per feed (default: {})".format(fixtures.SIZES))
+    parser.add_argument("--bodies", nargs="+", choices=fixtures.BODIES, default=fixtures.BODIES)
+    parser.add_argument("--formats", nargs="+", choices=fixtures.FORMATS, default=fixtures.FORMATS)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = args.sizes or (fixtures.SIZES[:2] if args.quick else fixtures.SIZES)
+    repeat = 3 if args.quick else args.repeat
+
+    results = []  # type: List[Dict[str, Any]]
+    for fmt in args.formats:
+        for body in args.bodies:
+            for size in sizes:
+                results += bench_case(fmt, body, size, args.stages, repeat)
+    write_results("stages", results, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Measure cold-start time: how long a fresh interpreter takes to import each of
+the feedmixer modules (with a breakdown by top-level package, from
+``python -X importtime``), and to import `feedmixer_wsgi` and serve its first
+response for each feed type (which includes importing that type's output
+modules).
+
+Every sample is a new interpreter, so the OS file cache is warm but nothing is
+already imported. Run from the repository root::
+
+$ python -m bench.bench_startup -o startup.json
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from bench.common import arg_parser, write_results
+
+MODULES = ["feedmixer", "feedmixer_api", "feedmixer_wsgi"]
+
+# Serve one request from a fresh interpreter (no feeds, so nothing is fetched)
+# and print the times taken to import the app and to respond, in seconds.
+FIRST_RESPONSE = """
+import json, time
+t0 = time.perf_counter()
+import feedmixer_wsgi
+t1 = time.perf_counter()
+environ = {{
+    "REQUEST_METHOD": "GET", "PATH_INFO": "/{ftype}", "QUERY_STRING": "",
+    "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+    "wsgi.url_scheme": "http", "wsgi.input": None, "wsgi.errors": None,
+}}
+body = b"".join(feedmixer_wsgi.application(environ, lambda status, headers: None))
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_response_s": t2 - t0}}))
+"""
+
+
+def run(args: List[str]) -> subprocess.CompletedProcess:
+    # quiet the per-request log output of feedmixer_wsgi
+    env = dict(os.environ, FM_LOG_LEVEL="WARNING")
+    return subprocess.run([sys.executable] + args, capture_output=True, text=True, check=True, env=env)
+
+
+def parse_importtime(stderr: str) -> Dict[str, Any]:
+    """
+    Parse the output of ``-X importtime``: the total time (in seconds) and
+    the time spent importing each top-level package (the sum of the self
+    times of its modules).
+    """
+    packages = defaultdict(float)  # type: Dict[str, float]
+    total = 0.0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        seconds = int(self_us) / 1e6
+        packages[name.strip().split(".")[0]] += seconds
+        total += seconds
+    return {"total": total, "packages": dict(packages)}
+
+
+def import_times(module: str, repeat: int) -> Dict[str, Any]:
+    samples = [parse_importtime(run(["-X", "importtime", "-c", "import " + module]).stderr) for _ in range(repeat)]
+    # (the interpreter's own startup imports, e.g. site, are not attributed to
+    # the module)
+    baseline = [parse_importtime(run(["-X", "importtime", "-c", "pass"]).stderr) for _ in range(repeat)]
+    base_packages = set().union(*(b["packages"] for b in baseline))
+
+    packages = defaultdict(list)  # type: Dict[str, List[float]]
+    totals = []
+    for sample in samples:
+        own = {k: v for k, v in sample["packages"].items() if k not in base_packages}
+        totals.append(sum(own.values()))
+        for name, seconds in own.items():
+            packages[name].append(seconds)
+    return {
+        "median_s": statistics.median(totals),
+        "best_s": min(totals),
+        "packages": {name: statistics.median(times) for name, times in packages.items()},
+    }
+
+
+def first_response(ftype: str, repeat: int) -> Dict[str, float]:
+    samples = [json.loads(run(["-c", FIRST_RESPONSE.format(ftype=ftype)]).stdout) for _ in range(repeat)]
+    return {
+        "import_s": statistics.median(s["import_s"] for s in samples),
+        "median_s": statistics.median(s["first_response_s"] for s in samples),
+        "best_s": min(s["first_response_s"] for s in samples),
+    }
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--top", type=int, default=10, help="packages to list per module")
+    args = parser.parse_args()
+    repeat = 3 if args.quick else args.repeat
+
+    results = []  # type: List[Dict[str, Any]]
+    for module in MODULES:
+        timing = import_times(module, repeat)
+        results.append(dict(case="import/{}".format(module), median_s=timing["median_s"], best_s=timing["best_s"]))
+        top = sorted(timing["packages"].items(), key=lambda kv: kv[1], reverse=True)[: args.top]
+        for name, seconds in top:
+            results.append(dict(case="import/{}/{}".format(module, name), median_s=seconds))
+    for ftype in ("atom", "rss", "json"):
+        results.append(dict(case="first_response/{}".format(ftype), **first_response(ftype, repeat)))
+    write_results("startup", results, args)
+
+
+if __name__ == "__main__":
+    main()
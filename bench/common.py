@@ -0,0 +1,162 @@
+"""
+Helpers shared by the benchmark scripts: timing, an in-memory session and
+machine-readable result files.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+
+class StubResponse(object):
+    """
+    Just enough of a `requests.Response` for `FeedMixer` to consume.
+    """
+
+    def __init__(self, text: str, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError("{} error".format(self.status_code))
+
+
+class StubSession(object):
+    """
+    A session which serves documents from a dict (URL -> body) without any
+    network I/O, so that only FeedMixer's own work is measured.
+    """
+
+    def __init__(self, docs: Dict[str, str], headers: Optional[Dict[str, str]] = None) -> None:
+        self.docs = docs
+        self.headers = {}  # type: Dict[str, str]
+        self.resp_headers = headers or {"Content-Type": "application/xml; charset=utf-8"}
+        self._responses = {}  # type: Dict[str, StubResponse]
+
+    def get(self, url: str, **kwargs) -> StubResponse:
+        resp = self._responses.get(url)
+        if resp is None:
+            resp = StubResponse(self.docs[url], headers=self.resp_headers)
+            self._responses[url] = resp
+        return resp
+
+
+def time_call(
+    fn: Callable[[], Any], setup: Optional[Callable[[], Any]] = None, repeat: int = 5, min_time: float = 0.05
+) -> Dict[str, float]:
+    """
+    Time `fn()`. `setup()` (if given) is run untimed before every call. Each
+    sample is the mean of as many calls as fit in `min_time` seconds.
+
+    Returns:
+        A dict with the best, median and mean per-call time (in seconds) and
+        the number of calls per sample.
+    """
+    # calibrate how many calls make up one sample
+    number = 1
+    while True:
+        elapsed = _run(fn, setup, number)
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    samples = [_run(fn, setup, number) / number for _ in range(repeat)]
+    return {
+        "best_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def _run(fn: Callable[[], Any], setup: Optional[Callable[[], Any]], number: int) -> float:
+    total = 0.0
+    for _ in range(number):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        total += time.perf_counter() - t0
+    return total
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def metadata() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": git_revision(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+    }
+
+
+def arg_parser(description: str) -> argparse.ArgumentParser:
+    """
+    An ArgumentParser with the options common to all benchmarks.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "-o", "--output", help="write JSON results to this file (default: stdout)"
+    )
+    parser.add_argument(
+        "--compare", metavar="BASELINE", help="JSON results from a previous run to compare against"
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="fewer repeats and only the smaller fixtures"
+    )
+    return parser
+
+
+def write_results(name: str, results: List[Dict[str, Any]], args: argparse.Namespace) -> None:
+    """
+    Write `results` (a list of flat dicts each with a unique `case` key) as
+    JSON, and optionally print a comparison against a baseline file.
+    """
+    doc = {"benchmark": name, "meta": metadata(), "results": results}
+    out = json.dumps(doc, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r["case"]: r for r in json.load(f)["results"]}
+        compare(baseline, results)
+
+
+def compare(baseline: Dict[str, Dict[str, Any]], results: List[Dict[str, Any]], key: str = "median_s") -> None:
+    """
+    Print the ratio new/old of `key` for each case present in both runs (to
+    stderr, so it does not mix with JSON on stdout).
+    """
+    for r in results:
+        old = baseline.get(r["case"])
+        if old is None or key not in old or key not in r or not old[key]:
+            continue
+        ratio = r[key] / old[key]
+        flag = "  <-- slower" if ratio > 1.1 else ""
+        print("{:<60} {:>8.3f}x{}".format(r["case"], ratio, flag), file=sys.stderr)
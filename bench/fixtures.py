@@ -0,0 +1,117 @@
+"""
+Generated fixture feeds for the benchmarks.
+
+Feeds are generated deterministically so that timings taken on different
+commits are comparable.
+"""
+
+import datetime
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+# The sizes and shapes exercised by the benchmarks by default
+SIZES = [10, 100, 1000, 5000]
+BODIES = ["small", "large"]
+FORMATS = ["atom", "rss"]
+
+EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+SMALL_BODY = "A short summary of the entry."
+LARGE_PARAGRAPH = (
+    "<p>Lorem ipsum dolor sit amet, <a href=\"https://example.org/a?b=1&amp;c=2\">"
+    "consectetur</a> adipiscing elit, sed do eiusmod tempor incididunt ut labore "
+    "et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation "
+    "ullamco laboris nisi ut aliquip ex ea commodo consequat.</p>"
+)
+# roughly 10KB of HTML per entry
+LARGE_BODY = LARGE_PARAGRAPH * 40
+
+
+def body_html(body: str) -> str:
+    if body == "large":
+        return LARGE_BODY
+    return SMALL_BODY
+
+
+def make_atom(
+    num_entries: int, body: str = "small", name: str = "feed", charset: Optional[str] = "utf-8"
+) -> str:
+    """
+    Returns an Atom document with `num_entries` entries, newest first.
+    """
+    html = escape(body_html(body))
+    prolog = '<?xml version="1.0" encoding="{}"?>\n'.format(charset) if charset else '<?xml version="1.0"?>\n'
+    parts = [
+        prolog,
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        "<title>Benchmark {}</title>".format(name),
+        '<link href="https://example.org/{}/"/>'.format(name),
+        "<id>urn:bench:{}</id>".format(name),
+        "<updated>{}</updated>".format(EPOCH.strftime("%Y-%m-%dT%H:%M:%SZ")),
+        "<author><name>Bench Author</name><uri>https://example.org/</uri></author>",
+    ]
+    for i in range(num_entries):
+        date = (EPOCH - datetime.timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        parts.append(
+            "<entry>"
+            "<title>{name} entry {i}</title>"
+            '<link href="https://example.org/{name}/{i}"/>'
+            "<id>urn:bench:{name}:{i}</id>"
+            "<published>{date}</published>"
+            "<updated>{date}</updated>"
+            '<category term="bench"/>'
+            '<summary type="html">{summary}</summary>'
+            '<content type="html">{html}</content>'
+            "</entry>".format(name=name, i=i, date=date, summary=escape(SMALL_BODY), html=html)
+        )
+    parts.append("</feed>\n")
+    return "".join(parts)
+
+
+def make_rss(
+    num_entries: int, body: str = "small", name: str = "feed", charset: Optional[str] = "utf-8"
+) -> str:
+    """
+    Returns an RSS 2.0 document with `num_entries` items, newest first.
+    """
+    html = escape(body_html(body))
+    prolog = '<?xml version="1.0" encoding="{}"?>\n'.format(charset) if charset else '<?xml version="1.0"?>\n'
+    parts = [
+        prolog,
+        '<rss version="2.0"><channel>',
+        "<title>Benchmark {}</title>".format(name),
+        "<link>https://example.org/{}/</link>".format(name),
+        "<description>Generated feed</description>",
+    ]
+    for i in range(num_entries):
+        date = (EPOCH - datetime.timedelta(minutes=i)).strftime("%a, %d %b %Y %H:%M:%S GMT")
+        parts.append(
+            "<item>"
+            "<title>{name} item {i}</title>"
+            "<link>https://example.org/{name}/{i}</link>"
+            "<guid>https://example.org/{name}/{i}</guid>"
+            "<pubDate>{date}</pubDate>"
+            "<category>bench</category>"
+            '<enclosure url="https://example.org/{name}/{i}.mp3" length="1024" type="audio/mpeg"/>'
+            "<description>{html}</description>"
+            "</item>".format(name=name, i=i, date=date, html=html)
+        )
+    parts.append("</channel></rss>\n")
+    return "".join(parts)
+
+
+GENERATORS = {"atom": make_atom, "rss": make_rss}
+
+
+def make_feed(fmt: str, num_entries: int, body: str = "small", name: str = "feed", **kwargs) -> str:
+    return GENERATORS[fmt](num_entries, body=body, name=name, **kwargs)
+
+
+def make_feeds(fmt: str, num_feeds: int, num_entries: int, body: str = "small") -> Dict[str, str]:
+    """
+    Returns a dict of `num_feeds` distinct documents keyed by a fake URL.
+    """
+    return {
+        "https://example.org/{}/{}".format(fmt, i): make_feed(fmt, num_entries, body, name="{}{}".format(fmt, i))
+        for i in range(num_feeds)
+    }
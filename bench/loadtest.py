@@ -0,0 +1,368 @@
+"""
+End-to-end load test: drives `feedmixer_wsgi` with many concurrent clients while
+a local simulated "upstream farm" serves the feeds being mixed.
+
+Each simulated upstream feed is configured by its own URL, so one farm can
+serve feeds with different behaviour in the same run::
+
+    /feed/<name>?latency=<ms>&jitter=<ms>&entries=<n>&body=<small|large>
+        &format=<atom|rss>&error=<rate>&etag=<0|1>&max_age=<seconds>
+
+- `latency`/`jitter`: delay before responding (uniformly +/- jitter)
+- `error`: probability of answering 500 instead of the feed
+- `etag`: send ETag/Last-Modified validators and answer conditional requests
+  with 304 Not Modified
+- `max_age`: send `Cache-Control: max-age=<seconds>` (omitted if not given)
+
+The farm's feeds are the default values of the command-line options, or are
+read from a JSON profile (a list of objects with the above keys plus an
+optional `count` to repeat a spec)::
+
+    [{"count": 40, "latency": 50, "etag": 1, "max_age": 60},
+     {"count": 5, "latency": 2000, "jitter": 1000, "error": 0.1}]
+
+By default FeedMixer is served in-process by a threaded `wsgiref` server. Pass
+``--gunicorn "-w 4 --threads 8"`` to run it under gunicorn instead (which is
+what the numbers are for: sizing gunicorn workers), or ``--target URL`` to
+load an instance that is already running. Results (throughput and latency
+percentiles) are written as JSON. Example::
+
+$ python -m bench.loadtest --clients 32 --duration 30 --feeds-per-mix 10
+"""
+
+import http.server
+import json
+import math
+import os
+import random
+import socket
+import socketserver
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from email.utils import formatdate
+from typing import Any, Dict, List, Optional, Tuple
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+from bench import fixtures
+from bench.common import arg_parser, write_results
+
+HOST = "127.0.0.1"
+
+# Documents are generated once per distinct (format, entries, body, name)
+_DOC_CACHE = {}  # type: Dict[Tuple[str, int, str, str], bytes]
+_DOC_LOCK = threading.Lock()
+
+
+def _document(fmt: str, entries: int, body: str, name: str) -> bytes:
+    key = (fmt, entries, body, name)
+    with _DOC_LOCK:
+        doc = _DOC_CACHE.get(key)
+        if doc is None:
+            doc = fixtures.make_feed(fmt, entries, body, name=name).encode("utf-8")
+            _DOC_CACHE[key] = doc
+    return doc
+
+
+class UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves generated feeds with the latency, size, error rate and caching
+    behaviour encoded in the request URL.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # the time the farm started serving, used as every feed's Last-Modified
+    started = formatdate(usegmt=True)
+
+    def log_message(self, format, *args):
+        """Suppress logging."""
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if not url.path.startswith("/feed/"):
+            self.send_error(404)
+            return
+        name = url.path[len("/feed/"):]
+        qs = dict(urllib.parse.parse_qsl(url.query))
+        latency = float(qs.get("latency", 0)) / 1000
+        jitter = float(qs.get("jitter", 0)) / 1000
+        delay = max(0.0, latency + random.uniform(-jitter, jitter))
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < float(qs.get("error", 0)):
+            self.send_error(500)
+            return
+
+        etag = '"{}"'.format(name)
+        use_validators = qs.get("etag", "0") not in ("0", "")
+        if use_validators and (
+            self.headers.get("If-None-Match") == etag
+            or self.headers.get("If-Modified-Since") == self.started
+        ):
+            self.send_response(304)
+            self._cache_headers(qs, etag, use_validators)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        doc = _document(qs.get("format", "atom"), int(qs.get("entries", 20)), qs.get("body", "small"), name)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(doc)))
+        self._cache_headers(qs, etag, use_validators)
+        self.end_headers()
+        try:
+            self.wfile.write(doc)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up (timed out)
+            pass
+
+    def _cache_headers(self, qs: Dict[str, str], etag: str, use_validators: bool) -> None:
+        if use_validators:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", self.started)
+        if "max_age" in qs:
+            self.send_header("Cache-Control", "max-age={}".format(qs["max_age"]))
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        """Suppress logging."""
+        pass
+
+
+def serve_in_thread(server: socketserver.BaseServer) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def farm_urls(port: int, specs: List[Dict[str, Any]]) -> List[str]:
+    """
+    Expand the feed specs into the list of upstream feed URLs.
+    """
+    urls = []
+    for i, spec in enumerate(specs):
+        spec = dict(spec)
+        count = int(spec.pop("count", 1))
+        for j in range(count):
+            qs = urllib.parse.urlencode(sorted(spec.items()))
+            urls.append("http://{}:{}/feed/s{}f{}?{}".format(HOST, port, i, j, qs))
+    return urls
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Client(threading.Thread):
+    """
+    Repeatedly GETs random mixes from the FeedMixer instance until `deadline`.
+    """
+
+    def __init__(
+        self, target: str, urls: List[str], args: Any, deadline: float, seed: int
+    ) -> None:
+        super().__init__(daemon=True)
+        self.target = target
+        self.urls = urls
+        self.args = args
+        self.deadline = deadline
+        self.rand = random.Random(seed)
+        self.latencies = []  # type: List[float]
+        self.statuses = {}  # type: Dict[str, int]
+        self.fm_errors = 0
+        self.bytes = 0
+
+    def run(self) -> None:
+        sess = requests.Session()
+        k = min(self.args.feeds_per_mix, len(self.urls))
+        while time.monotonic() < self.deadline:
+            feeds = self.rand.sample(self.urls, k)
+            ftype = self.rand.choice(self.args.endpoints)
+            params = [("f", f) for f in feeds] + [("n", self.args.n)]
+            t0 = time.perf_counter()
+            try:
+                resp = sess.get("{}/{}".format(self.target, ftype), params=params, timeout=self.args.client_timeout)
+                status = str(resp.status_code)
+                self.bytes += len(resp.content)
+                if resp.headers.get("X-fm-errors"):
+                    self.fm_errors += 1
+            except requests.RequestException as e:
+                status = type(e).__name__
+            self.latencies.append(time.perf_counter() - t0)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def start_feedmixer(args: Any) -> Tuple[str, Optional[Any]]:
+    """
+    Start the FeedMixer app (in-process or under gunicorn) unless a target was
+    given. Returns the base URL and a handle to stop it with.
+    """
+    if args.target:
+        return args.target.rstrip("/"), None
+
+    os.environ.setdefault("FM_LOG_LEVEL", "WARNING")
+    if args.gunicorn is not None:
+        port = free_port()
+        cmd = [sys.executable, "-m", "gunicorn", "-b", "{}:{}".format(HOST, port)]
+        cmd += args.gunicorn.split() + ["feedmixer_wsgi"]
+        proc = subprocess.Popen(cmd)
+        base = "http://{}:{}".format(HOST, port)
+        for _ in range(100):
+            try:
+                requests.get(base + "/json", timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.1)
+        return base, proc
+
+    import feedmixer_wsgi
+
+    server = make_server(
+        HOST, 0, feedmixer_wsgi.application, server_class=ThreadingWSGIServer, handler_class=QuietWSGIRequestHandler
+    )
+    serve_in_thread(server)
+    return "http://{}:{}".format(HOST, server.server_address[1]), server
+
+
+def stop_feedmixer(handle: Optional[Any]) -> None:
+    if handle is None:
+        return
+    if isinstance(handle, subprocess.Popen):
+        handle.terminate()
+        handle.wait()
+    else:
+        handle.shutdown()
+        handle.server_close()
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run for")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of load before measuring")
+    parser.add_argument("--feeds-per-mix", type=int, default=5, help="f parameters per request")
+    parser.add_argument("-n", type=int, default=3, help="the n parameter of each request")
+    parser.add_argument("--endpoints", nargs="+", default=["atom", "rss", "json"])
+    parser.add_argument("--client-timeout", type=float, default=60)
+    parser.add_argument("--profile", help="JSON file describing the upstream feeds")
+    parser.add_argument("--upstream-feeds", type=int, default=50, help="number of upstream feeds (without --profile)")
+    parser.add_argument("--latency", type=float, default=100, help="upstream latency in ms (without --profile)")
+    parser.add_argument("--jitter", type=float, default=50, help="upstream latency jitter in ms (without --profile)")
+    parser.add_argument("--entries", type=int, default=20, help="entries per upstream feed (without --profile)")
+    parser.add_argument("--body", choices=fixtures.BODIES, default="small", help="(without --profile)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="(without --profile)")
+    parser.add_argument("--etag", action="store_true", help="upstreams support 304 responses (without --profile)")
+    parser.add_argument("--max-age", type=int, help="upstream Cache-Control max-age (without --profile)")
+    parser.add_argument("--gunicorn", metavar="ARGS", help="run FeedMixer under gunicorn with these extra arguments")
+    parser.add_argument("--target", metavar="URL", help="load an already-running FeedMixer instance")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.quick:
+        args.duration = min(args.duration, 5)
+        args.warmup = min(args.warmup, 1)
+
+    if args.profile:
+        with open(args.profile) as f:
+            specs = json.load(f)
+    else:
+        spec = {
+            "count": args.upstream_feeds,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "entries": args.entries,
+            "body": args.body,
+            "error": args.error_rate,
+            "etag": int(args.etag),
+        }  # type: Dict[str, Any]
+        if args.max_age is not None:
+            spec["max_age"] = args.max_age
+        specs = [spec]
+
+    upstream = ThreadingHTTPServer((HOST, 0), UpstreamHandler)
+    serve_in_thread(upstream)
+    urls = farm_urls(upstream.server_address[1], specs)
+    target, handle = start_feedmixer(args)
+
+    try:
+        if args.warmup:
+            warm = [
+                Client(target, urls, args, time.monotonic() + args.warmup, args.seed + 1000 + i)
+                for i in range(args.clients)
+            ]
+            for c in warm:
+                c.start()
+            for c in warm:
+                c.join()
+
+        start = time.monotonic()
+        clients = [Client(target, urls, args, start + args.duration, args.seed + i) for i in range(args.clients)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        elapsed = time.monotonic() - start
+    finally:
+        stop_feedmixer(handle)
+        upstream.shutdown()
+        upstream.server_close()
+
+    latencies = sorted(lat for c in clients for lat in c.latencies)
+    statuses = {}  # type: Dict[str, int]
+    for c in clients:
+        for status, count in c.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    result = {
+        "case": "load/{}c/{}f".format(args.clients, args.feeds_per_mix),
+        "clients": args.clients,
+        "feeds_per_mix": args.feeds_per_mix,
+        "upstream_feeds": len(urls),
+        "server": "target" if args.target else ("gunicorn " + args.gunicorn if args.gunicorn is not None else "wsgiref"),
+        "duration_s": elapsed,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "statuses": statuses,
+        "responses_with_fm_errors": sum(c.fm_errors for c in clients),
+        "response_bytes": sum(c.bytes for c in clients),
+        "mean_s": statistics.fmean(latencies) if latencies else float("nan"),
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "max_s": latencies[-1] if latencies else float("nan"),
+    }
+    write_results("loadtest", [result], args)
+
+
+if __name__ == "__main__":
+    main()
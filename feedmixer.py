@@ -44,19 +44,50 @@ Interface
 ---------
 """
 
+import collections
 import concurrent.futures
 import datetime
+import bisect
 import functools
+import heapq
+import importlib.util
+import itertools
+import json
 import logging
+import math
+import re
+import threading
+import time
+import types
+import urllib.parse
+import xml.sax.saxutils
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List, Optional, Type, TypedDict, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypedDict,
+    Union,
+)
 
-# https://docs.djangoproject.com/en/1.10/_modules/django/utils/feedgenerator/
-import feedgenerator
 import feedparser
 import requests
-from feedgenerator import Atom1Feed, Rss201rev2Feed, SyndicationFeed
-from jsonfeed import JSONFeed
+
+# The output format modules (feedgenerator, jsonfeed, and the optional JSON
+# backends) are imported where they are first used rather than here, so that
+# importing feedmixer (and starting a worker) does not pay for them.
+if TYPE_CHECKING:
+    # https://docs.djangoproject.com/en/1.10/_modules/django/utils/feedgenerator/
+    import feedgenerator
 
 DEFAULT_TIMEOUT = 30
 
@@ -65,7 +96,7 @@ DEFAULT_TIMEOUT = 30
 class EntryMetadata(TypedDict, total=False):
     title: str
     link: str
-    description: str
+    description: Optional[str]
     author_email: Optional[str]
     author_name: Optional[str]
     author_link: Optional[str]
@@ -76,21 +107,1036 @@ class EntryMetadata(TypedDict, total=False):
     comments: Optional[str]
     unique_id: Optional[str]
     item_copyright: Optional[str]
-    categories: List[str]
-    enclosures: List[feedgenerator.Enclosure]
-    enclosure: feedgenerator.Enclosure
+    categories: Tuple[str, ...]
+    enclosures: Tuple["feedgenerator.Enclosure", ...]
+    enclosure: "feedgenerator.Enclosure"
     unique_id_is_permalink: bool
 
 class ParseError(Exception):
     pass
 
 
+# The names which can be given in `fields` to select the `EntryMetadata` which
+# is extracted (and so emitted). Every output format needs an entry's title,
+# link, id and dates, so those are always extracted.
+FIELDS = (
+    "title",
+    "link",
+    "unique_id",
+    "pubdate",
+    "updateddate",
+    "description",
+    "author",
+    "feed",
+    "comments",
+    "item_copyright",
+    "categories",
+    "enclosures",
+)
+REQUIRED_FIELDS = frozenset(FIELDS[:5])
+
+fields_t = Optional[FrozenSet[str]]
+
+
+def parse_fields(fields: Union[str, Iterable[str]]) -> FrozenSet[str]:
+    """
+    Validate a selection of `FIELDS` (a comma-separated string, or a list of
+    them) and return it as a set which includes the `REQUIRED_FIELDS`.
+
+    Raises:
+        ValueError: if a field is not one of `FIELDS`.
+    """
+    if isinstance(fields, str):
+        fields = [fields]
+    names = set(REQUIRED_FIELDS)
+    for field in fields:
+        for name in field.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if name not in FIELDS:
+                raise ValueError("Unknown field '{}' (use {})".format(name, ", ".join(FIELDS)))
+            names.add(name)
+    return frozenset(names)
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+_PERCENT_ESCAPE = re.compile(r"%[0-9A-Fa-f]{2}")
+_UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def _normalize_escape(m: "re.Match[str]") -> str:
+    char = chr(int(m.group(0)[1:], 16))
+    return char if char in _UNRESERVED else m.group(0).upper()
+
+
+def canonical_url(url: str) -> str:
+    """
+    The canonical form of the http(s) `url`, so that spellings of the same
+    feed share a fetch, the caches and their error report: the scheme and
+    host are lowercased, a default port, an empty query (a trailing '?') and
+    the fragment are dropped, an empty path becomes '/', and percent-escapes
+    are uppercased (or decoded, for unreserved characters). The query is
+    otherwise left alone: its order can matter to the server.
+
+    Anything which is not an http(s) URL is only stripped of surrounding
+    whitespace.
+    """
+    url = url.strip()
+    try:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+    netloc = parts.hostname
+    if ":" in netloc:
+        netloc = "[" + netloc + "]"
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc += ":{}".format(port)
+    userinfo = parts.netloc.rpartition("@")[0]
+    if userinfo:
+        netloc = userinfo + "@" + netloc
+    path = _PERCENT_ESCAPE.sub(_normalize_escape, parts.path) or "/"
+    query = _PERCENT_ESCAPE.sub(_normalize_escape, parts.query)
+    return urllib.parse.urlunsplit((scheme, netloc, path, query, ""))
+
+
+def canonical_feeds(urls: Iterable[str]) -> List[str]:
+    """
+    The canonical forms (see `canonical_url`) of `urls`, in order, without
+    duplicates.
+    """
+    return list(dict.fromkeys(canonical_url(url) for url in urls))
+
+
 FCException = Union[Exception, ParseError]
 error_dict_t = Dict[str, FCException]
 
 logger = logging.getLogger(__name__)
 
 
+# A fetched feed: the raw body and the Content-Type it was served with (if
+# any). The body is not decoded: feedparser works out the encoding itself
+# (from the Content-Type charset, the XML declaration or a byte order mark).
+Document = NamedTuple("Document", [("content", bytes), ("content_type", Optional[str])])
+
+
+def parse_document(
+    parse: Callable[..., feedparser.util.FeedParserDict], doc: Document
+) -> feedparser.util.FeedParserDict:
+    """
+    Parse `doc` with `parse` (`feedparser.parse`, or a parser cache wrapping
+    it). Its Content-Type is passed as a (hashable) tuple of response
+    headers, so that the parser cache is keyed on the body and Content-Type.
+    """
+    if doc.content_type:
+        return parse(doc.content, response_headers=(("content-type", doc.content_type),))
+    return parse(doc.content)
+
+
+def entry_sort_key(e: feedparser.util.FeedParserDict) -> tuple:
+    """
+    The published date (with fall back to updated date) of `e`, for sorting.
+    Entries with neither date sort before everything else.
+    """
+    return e.get("published_parsed") or e.get("updated_parsed") or (0,) * 9
+
+
+def _newest_first(s: "StoredEntry") -> tuple:
+    # (an ascending key, for bisect)
+    return tuple(-n for n in s.sort_key)
+
+
+def merge_entries(feeds: Iterable[List["StoredEntry"]]) -> List["StoredEntry"]:
+    """
+    Merge the entries of `feeds` (each list newest first, as an `EntryStore`
+    keeps them) into one list, newest first, by published date (with fall
+    back to updated date; see `entry_sort_key`). Entries with neither date
+    sort to the bottom.
+    """
+    return list(heapq.merge(*feeds, key=lambda s: s.sort_key, reverse=True))
+
+
+# The feed-level fields of a parsed feed which its entries are extracted
+# with. They are kept beside the entries rather than written into them, so
+# that parse results (which parser caches share between threads) are never
+# modified.
+FeedInfo = NamedTuple(
+    "FeedInfo",
+    [("link", str), ("title", str), ("author_detail", Optional[feedparser.util.FeedParserDict])],
+)
+
+
+def entry_fingerprint(e: feedparser.util.FeedParserDict) -> tuple:
+    """
+    What tells whether `e` has changed since it was stored: its id, link,
+    title and dates. An entry with neither date has nothing to say that it
+    was edited, so for one the values of every field `extract_entry` reads
+    are compared instead. (An edit to a dated entry which leaves its dates
+    alone is not picked up.)
+    """
+    # (plain dict lookups skip FeedParserDict's key aliasing)
+    updated = dict.get(e, "updated")
+    published = dict.get(e, "published")
+    if updated is not None or published is not None:
+        return (dict.get(e, "id"), dict.get(e, "link"), updated, published, dict.get(e, "title"))
+    author = dict.get(e, "author_detail")
+    return (
+        dict.get(e, "id"),
+        dict.get(e, "link"),
+        dict.get(e, "updated"),
+        dict.get(e, "published"),
+        dict.get(e, "title"),
+        dict.get(e, "summary"),
+        tuple(c.get("value") for c in dict.get(e, "content") or []),
+        (author.get("email"), author.get("name"), author.get("href")) if author is not None else None,
+        dict.get(e, "comments"),
+        dict.get(e, "license"),
+        tuple(tag.get("term") for tag in dict.get(e, "tags") or []),
+        tuple((enc.get("href"), enc.get("length"), enc.get("type")) for enc in dict.get(e, "enclosures") or []),
+    )
+
+
+def feed_info(parsed: feedparser.util.FeedParserDict) -> FeedInfo:
+    """
+    The `FeedInfo` of the feed `parsed`.
+    """
+    return FeedInfo(parsed.feed.link, parsed.feed.title, parsed.feed.get("author_detail"))
+
+
+def extract_entry(
+    e: feedparser.util.FeedParserDict,
+    prefer_summary: bool = True,
+    fields: fields_t = None,
+    feed: Optional[FeedInfo] = None,
+) -> EntryMetadata:
+    """
+    Convert a single FeedParserDict entry into a dict compatible with the
+    Django feedgenerator classes (see `FeedMixer.extract_meta`). If `fields`
+    (see `parse_fields`) is given, only those fields are extracted. The feed
+    link and title (and the author, for entries without one) are taken from
+    `feed` if it is given, and otherwise from the entry's own `feed_link`,
+    `feed_title` and `author_detail`. `e` is not modified.
+    """
+    metadata: EntryMetadata = {}
+
+    # title, link, and description are mandatory (but a description of None
+    # is left out of the output)
+    metadata["title"] = e.get("title", "")
+    metadata["link"] = e.get("link", "")
+
+    if fields is not None and "description" not in fields:
+        metadata["description"] = None
+    else:
+        summary = e.get("summary")
+        content = e.get("content")
+        if content:
+            # atom feeds can have several content tags, each with a
+            # different type. We just use the first one.
+            content = content[0].get("value")
+        if prefer_summary:
+            content = summary or content
+        else:
+            content = content or summary
+        metadata["description"] = content or ""
+
+    # use feed author if individual entries are missing author property
+    author_detail = e.get("author_detail")
+    if author_detail is None and feed is not None:
+        author_detail = feed.author_detail
+    if author_detail is not None and (fields is None or "author" in fields):
+        metadata["author_email"] = author_detail.get("email")
+        metadata["author_name"] = author_detail.get("name")
+        metadata["author_link"] = author_detail.get("href")
+
+    # Keep original feed info (these are not currently rendered by any of the feed outputs)
+    if fields is None or "feed" in fields:
+        metadata["feed_link"] = feed.link if feed is not None else e["feed_link"]
+        metadata["feed_title"] = feed.title if feed is not None else e["feed_title"]
+
+    # convert time_struct tuples into datetime objects
+    # (the min() prevents error in the off-chance that the
+    # date contains a leap-second)
+    tp = e.get("published_parsed")
+    if tp:
+        metadata["pubdate"] = datetime.datetime(*tp[:5] + (min(tp[5], 59),))
+
+    tu = e.get("updated_parsed")
+    if tu:
+        metadata["updateddate"] = datetime.datetime(*tu[:5] + (min(tu[5], 59),))
+
+    metadata["unique_id"] = e.get("id")
+    guid = metadata["unique_id"]
+    if guid and not guid.startswith("http"):
+        metadata["unique_id_is_permalink"] = False
+    if fields is None or "comments" in fields:
+        metadata["comments"] = e.get("comments")
+    if fields is None or "item_copyright" in fields:
+        metadata["item_copyright"] = e.get("license")
+
+    if "tags" in e and (fields is None or "categories" in fields):
+        # (tuples, as the metadata is shared by every mix of the entry)
+        metadata["categories"] = tuple(tag.get("term") for tag in e["tags"])
+    if "enclosures" in e and (fields is None or "enclosures" in fields):
+        import feedgenerator
+
+        metadata["enclosures"] = tuple(
+            feedgenerator.Enclosure(enc.href, enc.length, enc.type) for enc in e["enclosures"]
+        )
+    return metadata
+
+
+# Native serializer: writes the same XML as feedgenerator's Atom1Feed and
+# Rss201rev2Feed (element order, sorted attributes, self-closing empty
+# elements, escaping) but by concatenating strings rather than going through
+# SimplerXMLGenerator, and one entry at a time so that each entry's markup can
+# be kept and reused.
+
+XML_PROLOG = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0B-\x0C\x0E-\x1F]")
+
+
+def _str(s) -> Optional[str]:
+    return str(s) if s is not None else s
+
+
+def _element(name: str, contents: Optional[str] = None, attrs: Optional[Dict[str, str]] = None) -> str:
+    """
+    The markup of an element with no children, as written by
+    `SimplerXMLGenerator.addQuickElement`.
+    """
+    start = "<" + name
+    if attrs:
+        for key in sorted(attrs):
+            start += " {}={}".format(key, xml.sax.saxutils.quoteattr(attrs[key]))
+    if not contents:
+        return start + "/>"
+    if _CONTROL_CHARS.search(contents):
+        from feedgenerator.django.utils.xmlutils import UnserializableContentError
+
+        raise UnserializableContentError("Control characters are not supported in XML 1.0")
+    return "{}>{}</{}>".format(start, xml.sax.saxutils.escape(contents), name)
+
+
+def latest_post_date(entries: List[EntryMetadata]) -> datetime.datetime:
+    """
+    The latest `updateddate` or `pubdate` of `entries` (or the current time if
+    none of them has a date), as used for the feed's own updated date.
+    """
+    latest = None
+    for e in entries:
+        for key in ("updateddate", "pubdate"):
+            date = e.get(key)
+            if date and (latest is None or date > latest):
+                latest = date
+    return latest or datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def atom_entry(e: EntryMetadata) -> str:
+    """
+    Serialize one entry as an Atom `<entry>` element.
+    """
+    import feedgenerator
+
+    link = feedgenerator.iri_to_uri(e.get("link"))
+    pubdate = e.get("pubdate")
+    updated = e.get("updateddate") or pubdate or datetime.datetime.now()
+    parts = [
+        "<entry>",
+        _element("title", _str(e.get("title"))),
+        _element("link", "", {"href": link, "rel": "alternate"}),
+    ]
+    if pubdate is not None:
+        parts.append(_element("published", feedgenerator.rfc3339_date(pubdate)))
+    parts.append(_element("updated", feedgenerator.rfc3339_date(updated)))
+
+    author_name = _str(e.get("author_name"))
+    if author_name is not None:
+        parts.append("<author>")
+        parts.append(_element("name", author_name))
+        if e.get("author_email") is not None:
+            parts.append(_element("email", _str(e["author_email"])))
+        if e.get("author_link") is not None:
+            parts.append(_element("uri", feedgenerator.iri_to_uri(e["author_link"])))
+        parts.append("</author>")
+
+    unique_id = _str(e.get("unique_id"))
+    if unique_id is None:
+        unique_id = feedgenerator.get_tag_uri(link, pubdate)
+    parts.append(_element("id", unique_id))
+
+    if e.get("description") is not None:
+        parts.append(_element("summary", _str(e["description"]), {"type": "html"}))
+    if e.get("content") is not None:
+        parts.append(_element("content", _str(e["content"]), {"type": "html"}))
+    for enc in e.get("enclosures") or ():
+        attrs = {"rel": "enclosure", "href": enc.url, "length": _str(enc.length), "type": enc.mime_type}
+        parts.append(_element("link", "", attrs))
+    for cat in e.get("categories") or ():
+        parts.append(_element("category", "", {"term": _str(cat)}))
+    if e.get("item_copyright") is not None:
+        parts.append(_element("rights", _str(e["item_copyright"])))
+    parts.append("</entry>")
+    return "".join(parts)
+
+
+def rss_entry(e: EntryMetadata) -> str:
+    """
+    Serialize one entry as an RSS 2 `<item>` element.
+    """
+    import feedgenerator
+
+    parts = [
+        "<item>",
+        _element("title", _str(e.get("title"))),
+        _element("link", feedgenerator.iri_to_uri(e.get("link"))),
+    ]
+    if e.get("description") is not None:
+        parts.append(_element("description", _str(e["description"])))
+
+    author_name = _str(e.get("author_name"))
+    author_email = _str(e.get("author_email"))
+    if author_name and author_email:
+        parts.append(_element("author", "{} ({})".format(author_email, author_name)))
+    elif author_email:
+        parts.append(_element("author", author_email))
+    elif author_name:
+        parts.append(_element("dc:creator", author_name, {"xmlns:dc": "http://purl.org/dc/elements/1.1/"}))
+
+    if e.get("pubdate") is not None:
+        parts.append(_element("pubDate", feedgenerator.rfc2822_date(e["pubdate"])))
+    if e.get("comments") is not None:
+        parts.append(_element("comments", _str(e["comments"])))
+    unique_id = _str(e.get("unique_id"))
+    if unique_id is not None:
+        is_permalink = e.get("unique_id_is_permalink")
+        if unique_id and not unique_id.startswith("http"):
+            is_permalink = False
+        attrs = {}
+        if isinstance(is_permalink, bool):
+            attrs["isPermaLink"] = str(is_permalink).lower()
+        parts.append(_element("guid", unique_id, attrs))
+    if e.get("ttl") is not None:
+        parts.append(_element("ttl", _str(e["ttl"])))
+
+    enclosures = list(e.get("enclosures") or ())
+    if len(enclosures) > 1:
+        raise ValueError(
+            "RSS feed items may only have one enclosure, see "
+            "http://www.rssboard.org/rss-profile#element-channel-item-enclosure"
+        )
+    for enc in enclosures:
+        attrs = {"url": enc.url, "length": _str(enc.length), "type": enc.mime_type}
+        parts.append(_element("enclosure", "", attrs))
+    for cat in e.get("categories") or ():
+        parts.append(_element("category", _str(cat)))
+    parts.append("</item>")
+    return "".join(parts)
+
+
+ENTRY_SERIALIZERS = {"atom": atom_entry, "rss": rss_entry}
+
+
+def native_feed(
+    ftype: str, title: str, link: str, desc: str, entries: List[EntryMetadata], fragments: List[str]
+) -> str:
+    """
+    Assemble an Atom (`ftype` 'atom') or RSS 2 ('rss') feed from the already
+    serialized `fragments` of `entries` (see `atom_entry` and `rss_entry`).
+    """
+    import feedgenerator
+
+    updated = latest_post_date(entries)
+    if ftype == "atom":
+        head = [
+            '<feed xmlns="http://www.w3.org/2005/Atom">',
+            _element("title", _str(title)),
+            _element("link", "", {"href": feedgenerator.iri_to_uri(link), "rel": "alternate"}),
+            _element("id", link),
+            _element("updated", feedgenerator.rfc3339_date(updated)),
+        ]
+        if desc:
+            head.append(_element("subtitle", _str(desc)))
+        tail = "</feed>"
+    elif ftype == "rss":
+        head = [
+            '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>',
+            _element("title", _str(title)),
+            _element("link", feedgenerator.iri_to_uri(link)),
+            _element("description", _str(desc)),
+            _element("lastBuildDate", feedgenerator.rfc2822_date(updated)),
+        ]
+        tail = "</channel></rss>"
+    else:
+        raise ValueError("No native serializer for '{}'".format(ftype))
+    return XML_PROLOG + "".join(head) + "".join(fragments) + tail
+
+
+# JSON backends: encode a JSON Feed straight from `EntryMetadata` (the same
+# document as `jsonfeed.JSONFeed` writes) with the stdlib `json` module or, if
+# installed, orjson or msgspec. Dates are left as (UTC) datetime objects for
+# the backend to encode.
+
+JSON_FEED_VERSION = "https://jsonfeed.org/version/1.1"
+
+
+def _utc(date: datetime.datetime) -> datetime.datetime:
+    if date.tzinfo is None:
+        return date.replace(tzinfo=datetime.timezone.utc)
+    return date
+
+
+def json_item(e: EntryMetadata) -> Dict[str, Any]:
+    """
+    The JSON Feed item for one entry (as `JSONFeed.add_item_elements` makes
+    it, but with the dates as datetime objects).
+    """
+    item = {}  # type: Dict[str, Any]
+    if e.get("title"):
+        item["title"] = e["title"]
+    if e.get("description"):
+        item["content_html"] = e["description"]
+    if e.get("link"):
+        item["url"] = e["link"]
+    if e.get("unique_id"):
+        item["id"] = e["unique_id"]
+
+    author = {}
+    if e.get("author_link"):
+        author["url"] = e["author_link"]
+    if e.get("author_name"):
+        author["name"] = e["author_name"]
+    if e.get("author_email"):
+        author["email"] = e["author_email"]
+    if author:
+        item["authors"] = [author]
+
+    if e.get("enclosures"):
+        item["attachments"] = [
+            {"url": enc.url, "size_in_bytes": enc.length, "mime_type": enc.mime_type}
+            for enc in e["enclosures"]
+        ]
+    if e.get("pubdate"):
+        item["date_published"] = _utc(e["pubdate"])
+    if e.get("updateddate"):
+        item["date_modified"] = _utc(e["updateddate"])
+    if e.get("categories"):
+        item["tags"] = list(e["categories"])
+    return item
+
+
+def _json_default(obj: Any) -> str:
+    if isinstance(obj, datetime.datetime):
+        import feedgenerator
+
+        # (formatted as feedgenerator does, with a 'Z' for UTC)
+        return feedgenerator.rfc3339_date(obj.astimezone(datetime.timezone.utc).replace(tzinfo=None))
+    raise TypeError("Type {} not serializable.".format(type(obj)))
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, default=_json_default)
+
+
+def _orjson_dumps(obj: Any) -> str:
+    import orjson
+
+    return orjson.dumps(obj, option=orjson.OPT_UTC_Z).decode("utf-8")
+
+
+def _msgspec_dumps(obj: Any) -> str:
+    import msgspec.json
+
+    return msgspec.json.encode(obj).decode("utf-8")
+
+
+JSON_BACKENDS = {"stdlib": _stdlib_dumps}  # type: Dict[str, Callable[[Any], str]]
+
+# (orjson and msgspec are optional, and are only imported once used)
+if importlib.util.find_spec("orjson") is not None:
+    JSON_BACKENDS["orjson"] = _orjson_dumps
+
+if importlib.util.find_spec("msgspec") is not None:
+    JSON_BACKENDS["msgspec"] = _msgspec_dumps
+
+
+def encode_json_feed(
+    title: str, link: str, desc: str, entries: List[EntryMetadata], backend: str = "stdlib"
+) -> str:
+    """
+    Encode `entries` as a JSON Feed with one of the `JSON_BACKENDS`.
+    """
+    doc = {
+        "version": JSON_FEED_VERSION,
+        "title": title,
+        "home_page_url": link,
+        "description": desc,
+        "items": [json_item(e) for e in entries],
+    }
+    return JSON_BACKENDS[backend](doc)
+
+
+class StoredEntry(object):
+    """
+    An entry held by an `EntryStore`: the parsed entry, its feed's
+    `FeedInfo` and its extracted metadata, which is computed at most once per
+    value of `prefer_summary` (and `fields`), as is its native Atom/RSS
+    markup.
+
+    The parsed entry belongs to a (possibly shared) parse result and the
+    metadata and markup are handed to every request which mixes the entry,
+    so none of them is modified once made: threads read them without locks
+    or copies.
+    """
+
+    __slots__ = ("key", "fingerprint", "sort_key", "entry", "feed", "_meta", "_fragments")
+
+    def __init__(
+        self, key: Optional[str], fingerprint: tuple, entry: feedparser.util.FeedParserDict, feed: FeedInfo
+    ) -> None:
+        self.key = key
+        self.fingerprint = fingerprint
+        self.sort_key = entry_sort_key(entry)
+        self.entry = entry
+        self.feed = feed
+        self._meta = {}  # type: Dict[tuple, EntryMetadata]
+        self._fragments = {}  # type: Dict[tuple, str]
+
+    def meta(self, prefer_summary: bool = True, fields: fields_t = None) -> EntryMetadata:
+        metadata = self._meta.get((prefer_summary, fields))
+        if metadata is None:
+            # (read-only: it is shared by every mix which includes the entry)
+            metadata = types.MappingProxyType(extract_entry(self.entry, prefer_summary, fields, self.feed))
+            self._meta[(prefer_summary, fields)] = metadata
+        return metadata
+
+    def fragment(self, ftype: str, prefer_summary: bool = True, fields: fields_t = None) -> str:
+        """
+        The serialized entry ('atom' or 'rss', see `ENTRY_SERIALIZERS`).
+        """
+        fragment = self._fragments.get((ftype, prefer_summary, fields))
+        if fragment is None:
+            metadata = self.meta(prefer_summary, fields)
+            fragment = ENTRY_SERIALIZERS[ftype](metadata)
+            # (an undated Atom entry is given the current time, so it is not
+            # kept)
+            if ftype != "atom" or metadata.get("pubdate") or metadata.get("updateddate"):
+                self._fragments[(ftype, prefer_summary, fields)] = fragment
+        return fragment
+
+
+# A feed held by an `EntryStore`: the document last fetched, its `FeedInfo`,
+# every entry stored for the feed (newest first), the entries of the document
+# (in document order), and the stored entries by key.
+StoredFeed = NamedTuple(
+    "StoredFeed",
+    [
+        ("parsed", feedparser.util.FeedParserDict),
+        ("feed", FeedInfo),
+        ("entries", List[StoredEntry]),
+        ("document", List[StoredEntry]),
+        ("by_key", Dict[str, StoredEntry]),
+    ],
+)
+
+
+class EntryStore(object):
+    """
+    Keeps the entries of the most recently fetched `maxsize` feeds, keyed by
+    URL and, within a feed, by entry `id` (or `link`), newest first. When a
+    feed is refreshed only the entries which are new (or which have changed,
+    see `entry_fingerprint`) are made and inserted in date order; the rest
+    are reused along with their extracted metadata. Entries which have
+    dropped off the end of the feed's document are kept too, up to
+    `max_entries` per feed (or as many as the document has, if more). A
+    store can be shared between `FeedMixer` instances (and threads).
+    """
+
+    def __init__(self, maxsize: int = 128, max_entries: int = 100) -> None:
+        self.maxsize = maxsize
+        self.max_entries = max_entries
+        self._feeds = collections.OrderedDict()  # type: collections.OrderedDict[str, StoredFeed]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._feeds)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._feeds
+
+    def get(self, url: str) -> Optional[StoredFeed]:
+        """
+        The `StoredFeed` of `url`, or None.
+        """
+        return self._feeds.get(url)
+
+    def update(self, url: str, parsed: feedparser.util.FeedParserDict) -> StoredFeed:
+        """
+        Merge the entries of `parsed` (the feed just fetched from `url`) into
+        the store and return the feed's `StoredFeed`.
+        """
+        with self._lock:
+            known = self._feeds.get(url)
+            if known is not None:
+                self._feeds.move_to_end(url)
+                if known.parsed is parsed:
+                    # same document as last time (a parser cache hit)
+                    return known
+
+        feed = feed_info(parsed)
+        # (copies: the lists handed out before are never modified)
+        if known is None:
+            entries = []  # type: List[StoredEntry]
+        elif known.feed != feed:
+            # the feed's title, link and author go into the metadata too
+            entries = [StoredEntry(s.key, s.fingerprint, s.entry, feed) for s in known.entries]
+        else:
+            entries = list(known.entries)
+        # (entries without an id or link cannot be matched up with their
+        # next version: they are replaced by the document's)
+        entries = [s for s in entries if s.key]
+        by_key = {s.key: s for s in entries}  # type: Dict[str, StoredEntry]
+        document = []  # type: List[StoredEntry]
+        new = 0
+        for e in parsed.entries:
+            key = e.get("id") or e.get("link")
+            fingerprint = entry_fingerprint(e)
+            stored = by_key.get(key) if key else None
+            if stored is None or stored.fingerprint != fingerprint:
+                if stored is not None:
+                    entries.remove(stored)
+                stored = StoredEntry(key, fingerprint, e, feed)
+                bisect.insort(entries, stored, key=_newest_first)
+                if key:
+                    by_key[key] = stored
+                new += 1
+            document.append(stored)
+        limit = max(self.max_entries, len(parsed.entries))
+        for s in entries[limit:]:
+            by_key.pop(s.key, None)
+        del entries[limit:]
+        logger.debug("{}: {} new of {} entries".format(url, new, len(parsed.entries)))
+
+        stored_feed = StoredFeed(parsed, feed, entries, document, by_key)
+        with self._lock:
+            self._feeds[url] = stored_feed
+            self._feeds.move_to_end(url)
+            while len(self._feeds) > self.maxsize:
+                self._feeds.popitem(last=False)
+        return stored_feed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._feeds.clear()
+
+
+class LatencyTracker(object):
+    """
+    Rolling estimates of how long fetching each URL (and each host) takes:
+    an exponentially weighted moving average of the most recent fetches of
+    the `maxsize` most recently fetched URLs and hosts. Used to start the
+    slowest fetches of a mix first.
+
+    The times of each host's most recent `window` responses from the network
+    (within the last `max_age` seconds) are also kept, to give each host an
+    adaptive timeout: `timeout_factor` times their 99th percentile, clamped
+    between `min_timeout` and `max_timeout`. A host which usually answers in
+    200ms is then abandoned after a couple of seconds when it hangs, while
+    one which always takes 20s is not cut off. A request which times out
+    counts as a response which took as long as it was given, so a host which
+    becomes slower than its timeout has it widened after a couple of
+    timeouts rather than timing out for good.
+
+    A tracker can be shared between `FeedMixer` instances (and threads).
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        maxsize: int = 4096,
+        timeout_factor: float = 4.0,
+        min_timeout: float = 2.0,
+        max_timeout: Optional[float] = None,
+        window: int = 100,
+        min_samples: int = 10,
+        max_age: float = 3600,
+    ) -> None:
+        """
+        Args:
+            alpha: the weight of the latest fetch in the average (0 to 1).
+            maxsize: the number of URLs (and of hosts) to keep estimates of.
+            timeout_factor: the multiple of a host's 99th percentile response
+                time to time out its requests after (0 to disable adaptive
+                timeouts).
+            min_timeout: the shortest adaptive timeout, in seconds.
+            max_timeout: the longest adaptive timeout, in seconds (if None,
+                the timeout a request would otherwise have had). Set it above
+                that to give hosts which are consistently slow more time.
+            window: the number of response times kept per host.
+            min_samples: the number of response times needed before a
+                host's timeout is adapted.
+            max_age: how long (in seconds) a response time is kept.
+        """
+        self.alpha = alpha
+        self.maxsize = maxsize
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.window = window
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self._urls = collections.OrderedDict()  # type: collections.OrderedDict[str, float]
+        self._hosts = collections.OrderedDict()  # type: collections.OrderedDict[str, float]
+        self._samples = collections.OrderedDict()  # type: collections.OrderedDict[str, collections.deque]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def record(self, url: str, seconds: float, response: bool = False, timed_out: bool = False) -> None:
+        """
+        Record that fetching `url` (successfully or not) took `seconds`.
+
+        Args:
+            response: True if a successful response was got over the network
+                (and not from a cache). Only these (and timeouts) count
+                towards the host's timeout: cache hits and fast error
+                responses would make it too short.
+            timed_out: True if the request timed out (after `seconds`).
+        """
+        host = urllib.parse.urlsplit(url).netloc
+        now = time.monotonic()
+        with self._lock:
+            for table, key in ((self._urls, url), (self._hosts, host)):
+                known = table.get(key)
+                table[key] = seconds if known is None else known + self.alpha * (seconds - known)
+                table.move_to_end(key)
+                while len(table) > self.maxsize:
+                    table.popitem(last=False)
+            if response or timed_out:
+                samples = self._samples.get(host)
+                if samples is None:
+                    samples = self._samples[host] = collections.deque(maxlen=self.window)
+                samples.append((now, seconds))
+                self._samples.move_to_end(host)
+                while len(self._samples) > self.maxsize:
+                    self._samples.popitem(last=False)
+
+    def record_result(
+        self,
+        url: str,
+        seconds: float,
+        response: Optional[requests.Response] = None,
+        error: Optional[Exception] = None,
+    ) -> None:
+        """
+        Record a fetch of `url` which took `seconds` and either got
+        `response` or raised `error` (see `record`).
+        """
+        if error is not None:
+            self.record(url, seconds, timed_out=isinstance(error, requests.Timeout))
+        elif not getattr(response, "ok", True):
+            self.record(url, seconds)
+        else:
+            # (CacheControl marks the responses it served from its cache)
+            self.record(url, seconds, response=not getattr(response, "from_cache", False))
+
+    def percentile(self, url: str, q: float = 0.99) -> Optional[float]:
+        """
+        The `q` quantile of the recent response times of the host of `url`,
+        or None if it has fewer than `min_samples`.
+        """
+        oldest = time.monotonic() - self.max_age
+        with self._lock:
+            samples = self._samples.get(urllib.parse.urlsplit(url).netloc)
+            if samples is None:
+                samples = collections.deque()
+            while samples and samples[0][0] < oldest:
+                samples.popleft()
+            samples = sorted(seconds for _, seconds in samples)
+        if len(samples) < max(self.min_samples, 1):
+            return None
+        return samples[min(int(math.ceil(q * len(samples))), len(samples)) - 1]
+
+    def timeout(self, url: str, default: float) -> float:
+        """
+        The timeout (in seconds) for a request to `url`: `default` until its
+        host has answered `min_samples` times, then adapted to its response
+        times.
+        """
+        if self.timeout_factor <= 0:
+            return default
+        p99 = self.percentile(url)
+        if p99 is None:
+            return default
+        max_timeout = self.max_timeout if self.max_timeout is not None else default
+        return max(self.min_timeout, min(self.timeout_factor * p99, max_timeout))
+
+    def expected(self, url: str) -> Optional[float]:
+        """
+        The expected time to fetch `url`: its own estimate, or failing that
+        its host's, or None if neither has been fetched.
+        """
+        expected = self._urls.get(url)
+        if expected is None:
+            expected = self._hosts.get(urllib.parse.urlsplit(url).netloc)
+        return expected
+
+    def order(self, urls: Iterable[str]) -> List[str]:
+        """
+        `urls` sorted by expected fetch time, longest first, with the URLs of
+        unknown hosts (which are not in any cache yet) before all of them.
+        """
+        urls = list(urls)
+        with self._lock:
+            expected = [self.expected(url) for url in urls]
+        keyed = [(-e if e is not None else float("-inf"), i) for i, e in enumerate(expected)]
+        return [urls[i] for _, i in sorted(keyed)]
+
+
+class HedgedCall(concurrent.futures.Future):
+    """
+    The result of `Hedger.run`: that of the first of its calls to succeed.
+    `hedged` is set if a hedge was sent, and `won` if it was the hedge's
+    result which was used.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.hedged = False
+        self.won = False
+        # (the calls still running)
+        self._running = 1
+
+
+class Hedger(object):
+    """
+    Hedges requests which are slow to complete: if a request has not
+    completed after `delay` seconds (for `FeedMixer`, the `quantile` of its
+    host's recent response times), an identical request is sent and the
+    first of the two to succeed is used. The other is left to finish on its
+    own. A budget caps the extra load: each request earns `budget` hedges
+    (at most `burst` saved up), so at most about `budget` of all requests
+    are sent twice.
+
+    The request itself is made on the caller's thread: a single timer thread
+    (per hedger) sends the hedges which fall due, each on a thread of its
+    own, so that requests which are never hedged cost no extra thread.
+
+    The counters `requests`, `hedged` (requests which were hedged), `wins`
+    (hedges which completed first) and `denied` (requests which were slow
+    but not hedged, for lack of budget) are kept for monitoring (see
+    `stats`), and logged at INFO at most every `log_interval` seconds. A
+    hedger can be shared between `FeedMixer` instances (and threads).
+    """
+
+    def __init__(
+        self, budget: float = 0.05, burst: float = 10, quantile: float = 0.95, log_interval: float = 300
+    ) -> None:
+        """
+        Args:
+            budget: the fraction of requests which may be hedged.
+            burst: the number of hedges which can be saved up.
+            quantile: the quantile of its host's response times after which
+                a request is hedged.
+            log_interval: the minimum number of seconds between summary log
+                lines of the counters.
+        """
+        self.budget = budget
+        self.burst = burst
+        self.quantile = quantile
+        self.log_interval = log_interval
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+        self.denied = 0
+        self._tokens = float(burst)
+        self._logged = time.monotonic()
+        # (a heap of the hedges not yet due: time due, sequence, fn, call)
+        self._due = []  # type: List[Tuple[float, int, Callable[[], Any], HedgedCall]]
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._timer = None  # type: Optional[threading.Thread]
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "hedged": self.hedged, "wins": self.wins, "denied": self.denied}
+
+    def _log_stats(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._logged < self.log_interval:
+                return
+            self._logged = now
+            stats = self.stats()
+        logger.info("hedging requests={requests} hedged={hedged} wins={wins} denied={denied}".format(**stats))
+
+    def _hedge_when_due(self) -> None:
+        with self._lock:
+            while True:
+                if not self._due:
+                    self._wakeup.wait()
+                    continue
+                due, _, fn, call = self._due[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._wakeup.wait(wait)
+                    continue
+                heapq.heappop(self._due)
+                if call.done():
+                    continue
+                if self._tokens < 1:
+                    self.denied += 1
+                    continue
+                self._tokens -= 1
+                self.hedged += 1
+                call.hedged = True
+                call._running += 1
+                # (a thread of its own, rather than a pool's: a request
+                # queued behind others would only look slower)
+                threading.Thread(target=self._call, args=(fn, call, True), daemon=True).start()
+
+    def _call(self, fn: Callable[[], Any], call: HedgedCall, hedge: bool) -> None:
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                call._running -= 1
+                if not call.done() and not call._running:
+                    call.set_exception(e)
+            return
+        with self._lock:
+            if call.done():
+                return
+            call.won = hedge
+            if hedge:
+                self.wins += 1
+            call.set_result(result)
+
+    def run(self, fn: Callable[[], Any], delay: Optional[float], call: HedgedCall) -> None:
+        """
+        Call `fn` on this thread, hedged after `delay` seconds (if not None),
+        and resolve `call` with the result of the first call to succeed (or
+        the exception of the last to fail). A hedge which wins resolves
+        `call` while `fn` is still running here: wait on `call`, not on this.
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.budget, self.burst)
+            if delay is not None:
+                heapq.heappush(self._due, (time.monotonic() + delay, next(self._seq), fn, call))
+                if self._timer is None:
+                    self._timer = threading.Thread(target=self._hedge_when_due, daemon=True)
+                    self._timer.start()
+                self._wakeup.notify()
+        self._log_stats()
+        self._call(fn, call, False)
+
+
 class FeedMixer(object):
     def __init__(
         self,
@@ -105,17 +1151,28 @@ class FeedMixer(object):
         sess: Optional[requests.Session] = None,
         timeout: int = DEFAULT_TIMEOUT,
         parser_cache = None,
+        entry_store: Optional[EntryStore] = None,
+        since: Optional[datetime.datetime] = None,
+        native_xml: bool = False,
+        json_backend: Optional[str] = None,
+        fetch: Optional[Callable[[str], Document]] = None,
+        fields: Optional[Iterable[str]] = None,
+        latencies: Optional[LatencyTracker] = None,
+        hedger: Optional[Hedger] = None,
     ) -> None:
         """
         __init__(self, title, link='', desc='', feeds=[], num_keep=3, \
             max_thread=5, max_feeds=100,
-            sess=requests.Session(), parser_cache=None)
+            sess=requests.Session(), parser_cache=None, entry_store=None,
+            since=None, native_xml=False, json_backend=None, fetch=None,
+            fields=None, latencies=None, hedger=None)
 
         Args:
             title: the title of the generated feed
             link: the URL of the generated feed
             desc: the description of the generated feed
-            feeds: the list of feed URLs to fetch and mix
+            feeds: the list of feed URLs to fetch and mix (canonicalized and
+                deduplicated: see `canonical_url`)
             num_keep: the number of entries to keep from each member of `feeds`
             prefer_summary: If True, prefer the (short) 'summary'; otherwise
                 prefer the (long) feed 'content'.
@@ -126,15 +1183,60 @@ class FeedMixer(object):
                 requests. You can pass in a session object that caches results (see
                 the cachecontrol package) or sets custom headers, etc. If not
                 set, a new default session will be used per request.
-            timeout: the timeout for http requests in seconds.
-            parser_cache: A functools.lru_cache-wrapped feedparser.parse function.
-                If None, a new lru_cache with maxsize=128 will be created for this instance.
+            timeout: the timeout for http requests in seconds (for hosts
+                without an adaptive timeout yet; see `latencies`).
+            parser_cache: A functools.lru_cache-wrapped feedparser.parse function
+                (it is passed each document's raw bytes, and its Content-Type
+                as a `response_headers` tuple; see `parse_document`). If
+                None, a new lru_cache with maxsize=128 will be created for
+                this instance.
+            entry_store: An `EntryStore` in which to keep the entries of
+                fetched feeds, so that refreshing a feed only processes its new
+                entries. If None, a new store will be created for this instance.
+            since: If set, only keep entries whose published (or updated)
+                date is later than this (naive datetimes are taken to be in
+                UTC). Entries without a date are dropped. This is applied
+                after `num_keep`.
+            native_xml: If True, `atom_feed()` and `rss_feed()` write the XML
+                themselves instead of using feedgenerator (the output is the
+                same, but each entry's markup is kept in the `entry_store` and
+                reused by later requests).
+            json_backend: If set, `json_feed()` encodes the entries directly
+                with this backend (one of `JSON_BACKENDS`: 'stdlib', and
+                'orjson' or 'msgspec' if installed) instead of using the
+                jsonfeed package. Only the formatting differs (orjson and
+                msgspec write compact JSON without escaping non-ASCII).
+            fetch: If set, a function which returns the `Document` at a URL
+                (raising an exception if it has none), used instead of
+                getting it with `sess`. For example, `CrawlStore.fetch` from
+                `feedmixer_crawler` serves only documents already fetched by
+                the crawler, so that mixing never waits on the network.
+            fields: If set, only these `FIELDS` of each entry are extracted
+                and emitted (a list of names or a comma-separated string; the
+                `REQUIRED_FIELDS` are always included). For example, with
+                ['title'] no entry content is processed or written.
+            latencies: A `LatencyTracker` which records how long each feed
+                takes to fetch. When there are more `feeds` than
+                `max_threads`, the feeds expected to take longest are
+                fetched first, so that they do not start late (behind a full
+                pool of threads) and hold up the whole mix. Requests time out
+                after the tracker's adaptive timeout for their host (see
+                `LatencyTracker.timeout`; `timeout` until it has enough
+                history). If None, a new tracker will be created for this
+                instance.
+            hedger: If set, a `Hedger` with which to send a second request
+                for any feed which has not arrived by the time its host
+                usually answers (the hedger's `quantile` of its response
+                times in `latencies`), and take whichever arrives first.
+
+        Raises:
+            ValueError: if `json_backend` or one of `fields` is unknown.
         """
         self.title = title
         self.link = link
         self.desc = desc
         self.max_feeds = max_feeds
-        self._feeds = feeds[:max_feeds]
+        self._feeds = canonical_feeds(feeds)[:max_feeds]
         self._num_keep = num_keep
         self.prefer_summary = prefer_summary
         self.max_threads = max_threads
@@ -143,6 +1245,30 @@ class FeedMixer(object):
             self.cache_parser = functools.lru_cache(maxsize=128)(feedparser.parse)
         else:
             self.cache_parser = parser_cache
+        if entry_store is None:
+            entry_store = EntryStore()
+        self.entry_store = entry_store
+        self.since = since
+        self.native_xml = native_xml
+        if json_backend is not None and json_backend not in JSON_BACKENDS:
+            raise ValueError(
+                "Unknown JSON backend '{}' (available: {})".format(json_backend, ", ".join(JSON_BACKENDS))
+            )
+        self.json_backend = json_backend
+        self.fetch = fetch
+        self.fields = fields
+        if latencies is None:
+            latencies = LatencyTracker()
+        self.latencies = latencies
+        self.hedger = hedger
+        self._hedges = []  # type: List[bool]
+        # every stored entry of each feed fetched (in the order they
+        # arrived), from which the mix is derived for each `num_keep`,
+        # `prefer_summary`, `fields` and `since`
+        self._stored_feeds = collections.OrderedDict()  # type: collections.OrderedDict[str, StoredFeed]
+        self._fetched = False
+        self._view = None  # type: Optional[tuple]
+        self._mixed_stored = []  # type: List[StoredEntry]
         self._mixed_entries = []  # type: List[EntryMetadata]
         self._error_urls = {}  # type: error_dict_t
         if sess is None:
@@ -157,24 +1283,56 @@ class FeedMixer(object):
     def num_keep(self) -> int:
         """
         The number of entries to keep from each feed in `feeds`. Setting this
-        property will trigger the feeds to be re-fetched.
+        property re-derives the mix from the entries already fetched (as
+        does changing `prefer_summary`, `fields` or `since`): the feeds are
+        not fetched again.
         """
         return self._num_keep
 
     @num_keep.setter
     def num_keep(self, value: int) -> None:
         self._num_keep = value
-        self.feeds = self._feeds
+
+    @property
+    def since(self) -> Optional[datetime.datetime]:
+        """
+        If set, only entries published (or updated) after this time are kept
+        (as a naive UTC datetime; an aware one is converted when set).
+        """
+        return self._since
+
+    @since.setter
+    def since(self, value: Optional[datetime.datetime]) -> None:
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        self._since = value
+
+    @property
+    def fields(self) -> fields_t:
+        """
+        The `FIELDS` extracted from each entry (including the
+        `REQUIRED_FIELDS`), or None for all of them. Can be set to any
+        selection `parse_fields` accepts.
+        """
+        return self._fields
+
+    @fields.setter
+    def fields(self, value: Optional[Iterable[str]]) -> None:
+        self._fields = parse_fields(value) if value is not None else None
 
     @property
     def mixed_entries(self) -> List[EntryMetadata]:
         """
         The parsed feed entries fetched from the list of URLs in `feeds`.
         (Accessing the property triggers the feeds to be fetched if they
-        have not yet been.)
+        have not yet been, even if they had no entries.) The entries are
+        read-only mappings shared with other mixes: copy one (`dict(e)`) to
+        change it.
         """
-        if len(self._mixed_entries) < 1:
+        if not self._fetched:
             self.__fetch_entries()
+        elif self._view != self.__view():
+            self.__mix()
         return self._mixed_entries
 
     @property
@@ -189,16 +1347,21 @@ class FeedMixer(object):
     @property
     def feeds(self) -> List[str]:
         """
-        Get or set list of feeds.
+        Get or set list of feeds. (Setting it, even to the same list, means
+        the feeds are fetched again.)
         """
         return self._feeds
 
     @feeds.setter
     def feeds(self, value: List[str]) -> None:
         """
-        Reset _mixed_entries whenever we get a new list of feeds.
+        Reset _mixed_entries whenever we get a new list of feeds (which are
+        canonicalized and deduplicated: see `canonical_url`).
         """
-        self._feeds = value[: self.max_feeds]
+        self._feeds = canonical_feeds(value)[: self.max_feeds]
+        self._stored_feeds = collections.OrderedDict()
+        self._fetched = False
+        self._mixed_stored = []
         self._mixed_entries = []
 
     def atom_feed(self) -> str:
@@ -207,6 +1370,10 @@ class FeedMixer(object):
             An Atom feed consisting of the `num_keep` most recent entries from
             each of the `feeds`.
         """
+        if self.native_xml:
+            return self.__native_feed("atom")
+        from feedgenerator import Atom1Feed
+
         return self.__generate_feed(Atom1Feed).writeString("utf-8")
 
     def rss_feed(self) -> str:
@@ -215,6 +1382,10 @@ class FeedMixer(object):
             An RSS 2 feed consisting of the `num_keep` most recent entries from
             each of the `feeds`.
         """
+        if self.native_xml:
+            return self.__native_feed("rss")
+        from feedgenerator import Rss201rev2Feed
+
         return self.__generate_feed(Rss201rev2Feed).writeString("utf-8")
 
     def json_feed(self) -> str:
@@ -223,80 +1394,191 @@ class FeedMixer(object):
             A JSON dict consisting of the `num_keep` most recent entries from
             each of the `feeds`.
         """
+        if self.json_backend is not None:
+            return encode_json_feed(self.title, self.link, self.desc, self.mixed_entries, self.json_backend)
+        from jsonfeed import JSONFeed
+
         return self.__generate_feed(JSONFeed).writeString("utf-8")
 
+    def iter_feeds(self) -> Iterator[Tuple[str, List[EntryMetadata]]]:
+        """
+        Fetch the `feeds` as `mixed_entries` does, but yield each feed's URL
+        and its kept entries (newest first) as soon as that feed has been
+        fetched and parsed, in the order the feeds arrive (rather than once
+        the slowest has). Feeds which fail are not yielded: they are in
+        `error_urls` once the iterator is exhausted.
+        """
+        start = time.perf_counter()
+        count = 0
+        for url, kept in self.__iter_stored():
+            count += len(kept)
+            yield url, [s.meta(self.prefer_summary, self.fields) for s in kept]
+        self.__log_summary(start, count)
+
     def __fetch_entries(self) -> None:
         """
-        Multi-threaded fetching of the `feeds`. Keeps the `num_keep` most recent
-        entries from each feed, combines them (sorted chronologically), extracts
-        `feedgernerator`-compatible metadata, and then stores the list of
-        entries as `self.mixed_entries`
+        Multi-threaded fetching of the `feeds`. Merges each feed into the
+        `entry_store` and then mixes them (see `__mix`).
+        """
+        start = time.perf_counter()
+        for _ in self.__iter_stored():
+            pass
+        self.__mix()
+        self.__log_summary(start, len(self._mixed_stored))
+
+    def __view(self) -> tuple:
+        """
+        The parameters `mixed_entries` was last derived for.
+        """
+        return (self._num_keep, self.prefer_summary, self.fields, self.since)
+
+    def __keep(self, stored: StoredFeed) -> List[StoredEntry]:
+        """
+        The first `num_keep` entries of a feed's document (or, if `num_keep`
+        is less than 1, every entry stored for the feed), newest first and
+        newer than `since`.
+        """
+        if self._num_keep < 1:
+            newest = stored.entries
+        else:
+            newest = sorted(stored.document[0 : self._num_keep], key=lambda s: s.sort_key, reverse=True)
+        if self.since is not None:
+            # (sort keys are UTC time tuples; undated entries are all zeros)
+            since = self.since.timetuple()[:6]
+            newest = list(itertools.takewhile(lambda s: tuple(s.sort_key[:6]) > since, newest))
+        return newest
+
+    def __mix(self) -> None:
+        """
+        Keep the `num_keep` most recent entries from each of the feeds
+        fetched, combine them (sorted chronologically), extract
+        `feedgernerator`-compatible metadata, and then store the list of
+        entries as `self.mixed_entries`. Needs no network I/O, so a change
+        of `num_keep`, `prefer_summary`, `fields` or `since` is cheap.
         """
-        parsed_entries = []  # type: List[feedparser.util.FeedParserDict]
+        # (each feed's entries are already newest first: merge rather than
+        # sort them)
+        kept = merge_entries(self.__keep(stored) for stored in self._stored_feeds.values())
+
+        # extract metadata into a form usable by feedgenerator (only done
+        # once for each entry the store has not seen before)
+        self._mixed_stored = kept
+        self._mixed_entries = [s.meta(self.prefer_summary, self.fields) for s in kept]
+        self._view = self.__view()
+
+    def __iter_stored(self) -> Iterator[Tuple[str, List[StoredEntry]]]:
+        """
+        Fetch the `feeds` (in threads), merge each into the `entry_store` and
+        yield its URL and the `num_keep` most recent of its entries (newer
+        than `since`) as it arrives. Errors are collected in `error_urls`.
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
         self._error_urls = {}
+        self._stored_feeds = collections.OrderedDict()
+        self._fetched = False
+        # (whether each hedge won)
+        self._hedges = []
 
-        def fetch(url: str) -> requests.Response:
-            r = self.sess.get(url, timeout=self.timeout)
-            r.raise_for_status()
+        def fetch(url: str) -> Document:
+            if self.fetch is not None:
+                return self.fetch(url)
+            timeout = self.latencies.timeout(url, self.timeout)
+            start = time.perf_counter()
+            try:
+                r = self.sess.get(url, timeout=timeout)
+                r.raise_for_status()
+            except Exception as e:
+                self.latencies.record_result(url, time.perf_counter() - start, error=e)
+                raise
+            self.latencies.record_result(url, time.perf_counter() - start, r)
             # NOTE: I tried doing the parsing here in the threads, but it was
             # actually a bit slower than doing it all serially on the main
             # thread.
-            return r
+            # (the raw bytes: `r.text` would decode the whole body, after
+            # running charset detection over it if there is no charset in the
+            # Content-Type, only for feedparser to work out the encoding again)
+            return Document(r.content, r.headers.get("content-type"))
 
-        with ThreadPoolExecutor(max_workers=self.max_threads) as exec:
-            future_to_url = {exec.submit(fetch, url): url for url in self.feeds}
+        def submit(exec: ThreadPoolExecutor, url: str) -> concurrent.futures.Future:
+            if self.hedger is None or self.fetch is not None:
+                return exec.submit(fetch, url)
+            call = HedgedCall()
+            delay = self.latencies.percentile(url, self.hedger.quantile)
+            exec.submit(self.hedger.run, functools.partial(fetch, url), delay, call)
+            return call
+
+        urls = self.feeds
+        if self.fetch is None and len(urls) > self.max_threads:
+            # (only the first `max_threads` start at once: start those
+            # expected to be slowest, rather than queue them behind the rest)
+            urls = self.latencies.order(urls)
+
+        exec = ThreadPoolExecutor(max_workers=self.max_threads)
+        try:
+            future_to_url = {submit(exec, url): url for url in urls}
             for future in concurrent.futures.as_completed(future_to_url):
                 url = future_to_url[future]
-                logger.info("Fetched {}".format(url))
+                if debug:
+                    logger.debug("Fetched {}".format(url))
+                if isinstance(future, HedgedCall) and future.hedged:
+                    self._hedges.append(future.won)
                 try:
-                    resp = future.result()
-                    f = self.cache_parser(resp.text)
+                    doc = future.result()
+                    f = parse_document(self.cache_parser, doc)
 
-                    logger.debug(self.cache_parser.cache_info())
-                    logger.info("Got feed from feedparser {}".format(url))
+                    if debug:
+                        logger.debug(self.cache_parser.cache_info())
+                        logger.debug("Got feed from feedparser {}".format(url))
                     # logger.debug("Feed: {}".format(f))
 
                     parse_err = len(f.get("entries") or []) == 0 and f.get("bozo")
                     if f is None or parse_err:
-                        logger.info("Parse error ({})".format(f.get("bozo_exception")))
                         raise ParseError(
                             "Parse error: {}".format(f.get("bozo_exception"))
                         )
 
-                    if self._num_keep < 1:
-                        newest = f.entries
-                    else:
-                        newest = f.entries[0 : self._num_keep]
-
-                    for e in newest:
-                        e["feed_link"] = f.feed.link
-                        e["feed_title"] = f.feed.title
-                        if "author_detail" not in e:
-                            # use feed author if individual entries are missing
-                            # author property
-                            if "author_detail" in f.feed:
-                                e["author_detail"] = f.feed.author_detail
-                                e.author_detail = f.feed.author_detail
-
-                    parsed_entries += newest
+                    stored = self.entry_store.update(url, f)
+                    self._stored_feeds[url] = stored
+                    newest = self.__keep(stored)
                 except Exception as e:
                     # will be ParseError, RequestException, or an exception
                     # from threadpool
                     self._error_urls[url] = e
-                    logger.info("{} generated an exception: {}".format(url, e))
-
-        # sort entries by published date (with fall back to updated date)
-        parsed_entries.sort(
-            key=lambda e: e.get("published_parsed") or e.get("updated_parsed") or (0,) * 9, reverse=True
-        )
+                    if debug:
+                        logger.debug("{} generated an exception: {}".format(url, e))
+                    continue
+                yield url, newest
+        except GeneratorExit:
+            # (abandoned part way, e.g. by a streaming client which went
+            # away: do not start the fetches still queued)
+            exec.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            # (do not wait for requests which lost to their hedges: they
+            # finish on their own)
+            exec.shutdown(wait=False)
+        self._fetched = True
 
-        # extract metadata into a form usable by feedgenerator
-        mixed_entries = self.extract_meta(parsed_entries, self.prefer_summary)
-        self._mixed_entries = mixed_entries
+    def __log_summary(self, start: float, entries: int) -> None:
+        """
+        Log a single summary line per mix at INFO (and a line per feed only
+        at DEBUG, so that large mixes do not flood the log).
+        """
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "mix feeds={} errors={} entries={} ms={:.1f}{}{}".format(
+                    len(self.feeds),
+                    len(self._error_urls),
+                    entries,
+                    (time.perf_counter() - start) * 1000,
+                    " hedged={} hedge_wins={}".format(len(self._hedges), sum(self._hedges)) if self._hedges else "",
+                    "".join(" failed={}".format(url) for url in self._error_urls),
+                )
+            )
 
     @staticmethod
     def extract_meta(
-        parsed_entries: List[feedparser.util.FeedParserDict], prefer_summary=True
+        parsed_entries: List[feedparser.util.FeedParserDict], prefer_summary=True, fields: fields_t = None
     ) -> List[EntryMetadata]:
         """
         Convert a FeedParserDict object into a dict compatible with the Django
@@ -306,74 +1588,25 @@ class FeedMixer(object):
             parsed_entries: List of entries from which to extract meta data.
             prefer_summary: If True, prefer the (short) 'summary'; otherwise
                 prefer the (long) 'content'.
+            fields: If set, the fields to extract (see `parse_fields`).
         """
-        mixed_entries = []  # type: List[EntryMetadata]
-        for e in parsed_entries:
-            metadata: EntryMetadata = {}
-
-            # title, link, and description are mandatory
-            metadata["title"] = e.get("title", "")
-            metadata["link"] = e.get("link", "")
-
-            summary = e.get("summary")
-            content = e.get("content")
-            if content:
-                # atom feeds can have several content tags, each with a
-                # different type. We just use the first one.
-                content = content[0].get("value")
-            if prefer_summary:
-                content = summary or content
-            else:
-                content = content or summary
-            metadata["description"] = content or ""
-
-            if "author_detail" in e:
-                metadata["author_email"] = e["author_detail"].get("email")
-                metadata["author_name"] = e["author_detail"].get("name")
-                metadata["author_link"] = e["author_detail"].get("href")
-
-            # Keep original feed info (these are not currently rendered by any of the feed outputs)
-            metadata["feed_link"] = e["feed_link"]
-            metadata["feed_title"] = e["feed_title"]
-
-            # convert time_struct tuples into datetime objects
-            # (the min() prevents error in the off-chance that the
-            # date contains a leap-second)
-            tp = e.get("published_parsed")
-            if tp:
-                metadata["pubdate"] = datetime.datetime(*tp[:5] + (min(tp[5], 59),))
-
-            tu = e.get("updated_parsed")
-            if tu:
-                metadata["updateddate"] = datetime.datetime(*tu[:5] + (min(tu[5], 59),))
-
-            metadata["comments"] = e.get("comments")
-            metadata["unique_id"] = e.get("id")
-            metadata["item_copyright"] = e.get("license")
-
-            if "tags" in e:
-                taglist = [tag.get("term") for tag in e["tags"]]
-                metadata["categories"] = taglist
-            if "enclosures" in e:
-                enclist = []
-                for enc in e["enclosures"]:
-                    enclist.append(
-                        feedgenerator.Enclosure(enc.href, enc.length, enc.type)
-                    )
-                metadata["enclosures"] = enclist
-
-            mixed_entries.append(metadata)
-        return mixed_entries
-
-    def __generate_feed(self, gen_cls: Type[SyndicationFeed]) -> SyndicationFeed:
+        return [extract_entry(e, prefer_summary, fields) for e in parsed_entries]
+
+    def __generate_feed(self, gen_cls: Type["feedgenerator.SyndicationFeed"]) -> "feedgenerator.SyndicationFeed":
         """
         Generate a feed using one of the generator classes from the Django
         `feedgenerator` module.
         """
         gen = gen_cls(title=self.title, link=self.link, description=self.desc)
         for e in self.mixed_entries:
-            guid = e.get("unique_id", "")
-            if guid and not guid.startswith("http"):
-                e["unique_id_is_permalink"] = False
             gen.add_item(**e)
         return gen
+
+    def __native_feed(self, ftype: str) -> str:
+        """
+        Generate an Atom or RSS feed with `native_feed`, reusing the stored
+        markup of entries which have already been serialized.
+        """
+        entries = self.mixed_entries
+        fragments = [s.fragment(ftype, self.prefer_summary, self.fields) for s in self._mixed_stored]
+        return native_feed(ftype, self.title, self.link, self.desc, entries, fragments)
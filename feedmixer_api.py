@@ -33,6 +33,16 @@ full
     If set, prefer the full entry `content`; otherwise prefer the shorter entry
     `summary`.
 
+since
+    Only return entries published (or updated) after this time: an ISO 8601
+    timestamp or a number of seconds since the epoch.
+
+cursor
+    An opaque cursor as returned in the `X-fm-cursor` header of a previous
+    response; only entries newer than those already returned are returned.
+    Clients which poll a mix can pass the cursor from each response to the
+    next request to receive only what is new.
+
 As an example, assuming an instance of the FeedMixer app is running on the localhost on port 8000, let's fetch the newest entry each from the following Atom and RSS feeds:
 
 - https://catswhisker.xyz/shaarli/?do=atom
@@ -47,20 +57,70 @@ from a client programatically, remember to URL-encode the `f` fields::
 
 >>> curl 'localhost:8000/atom?f=https%3A%2F%2Fcatswhisker.xyz%2Fshaarli%2F%3Fdo%3Datom&f=https%3A%2F%2Fhnrss.org%2Fnewest&n=1'
 
+The '/stream' endpoint takes the same query string but streams newline
+delimited JSON: a record for each feed as soon as it has been fetched, and a
+final record of errors (see `StreamedMix`).
+
 
 Interface
 ---------
 """
 
+import base64
+import binascii
+import collections
+import datetime
+import functools
+import gzip
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
 import urllib
 import urllib.parse
-from typing import List, NamedTuple, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
 import falcon
+import feedparser
 import requests
 
-from feedmixer import DEFAULT_TIMEOUT, FeedMixer 
+from feedmixer import (
+    DEFAULT_TIMEOUT,
+    JSON_BACKENDS,
+    Document,
+    EntryMetadata,
+    EntryStore,
+    FeedMixer,
+    HedgedCall,
+    Hedger,
+    LatencyTracker,
+    canonical_feeds,
+    error_dict_t,
+    fields_t,
+    json_item,
+    parse_fields,
+)
+
+if TYPE_CHECKING:
+    from cachecontrol.cache import BaseCache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+FTYPES = ("atom", "rss", "json")
+
+# Content-codings we can produce, in order of preference
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+logger = logging.getLogger(__name__)
 
 
 class CORSComponent:
@@ -68,12 +128,89 @@ class CORSComponent:
         resp.set_header("Access-Control-Allow-Origin", "*")
 
 
-ParsedQS = NamedTuple("ParsedQS", [("f", List[str]), ("n", int), ("full", bool)])
+ParsedQS = NamedTuple(
+    "ParsedQS",
+    [
+        ("f", List[str]),
+        ("n", int),
+        ("full", bool),
+        ("since", Optional[datetime.datetime]),
+        ("fields", fields_t),
+    ],
+)
+
+CURSOR_PREFIX = "v1:"
+
+
+def encode_cursor(since: datetime.datetime) -> str:
+    """
+    Encode a (naive, UTC) datetime as an opaque cursor string.
+    """
+    raw = CURSOR_PREFIX + since.isoformat()
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> datetime.datetime:
+    """
+    Decode a cursor made by `encode_cursor`.
+
+    :raises ValueError: if `cursor` is not a valid cursor.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not raw.startswith(CURSOR_PREFIX):
+        raise ValueError("Invalid cursor")
+    return parse_since(raw[len(CURSOR_PREFIX):])
+
+
+def parse_since(since: str) -> datetime.datetime:
+    """
+    Parse a `since` timestamp: either an ISO 8601 date/time or a number of
+    seconds since the epoch (with a decimal point, or of more than 8 digits:
+    4 and 8 digits are an ISO 8601 year and date, such as '2024' and
+    '20240501'). Returns a naive datetime in UTC.
+
+    :raises ValueError: if `since` cannot be parsed.
+    """
+    if since.isdigit() and len(since) <= 8:
+        if len(since) == 4:
+            return datetime.datetime.strptime(since, "%Y")
+        if len(since) == 8:
+            return datetime.datetime.strptime(since, "%Y%m%d")
+        raise ValueError("Invalid since: {}".format(since))
+    try:
+        dt = datetime.datetime.fromtimestamp(float(since), datetime.timezone.utc)
+        return dt.replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        pass
+    if since.endswith(("Z", "z")):
+        since = since[:-1] + "+00:00"
+    dt = datetime.datetime.fromisoformat(since)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def next_cursor(entries: List[EntryMetadata], since: Optional[datetime.datetime]) -> Optional[str]:
+    """
+    The cursor for a client to pass on its next request: the date of the
+    newest of `entries` (or `since` again if there are none).
+    """
+    newest = since
+    for e in entries:
+        date = e.get("pubdate") or e.get("updateddate")
+        if date is not None and (newest is None or date > newest):
+            newest = date
+    return encode_cursor(newest) if newest is not None else None
 
 
 def parse_qs(req: falcon.Request) -> ParsedQS:
     """
-    Get `feeds` and `num_keep` from request query string.
+    Get `feeds`, `num_keep`, `full`, `since` (from either the `since` or
+    the `cursor` field) and `fields` from request query string.
 
     :param req: the Falcon request from which to parse the query string.
     """
@@ -92,9 +229,321 @@ def parse_qs(req: falcon.Request) -> ParsedQS:
     full = qs.get("full", False)
     if not full:
         full = qs.get("FULL", False)
+    since = None
+    if qs.get("cursor"):
+        try:
+            since = decode_cursor(qs["cursor"])
+        except ValueError:
+            raise falcon.HTTPInvalidParam("Not a cursor returned by FeedMixer", "cursor")
+    elif qs.get("since"):
+        try:
+            since = parse_since(qs["since"])
+        except ValueError:
+            raise falcon.HTTPInvalidParam(
+                "Expected an ISO 8601 timestamp or seconds since the epoch", "since"
+            )
+    fields = None
+    if qs.get("fields"):
+        try:
+            fields = parse_fields(qs["fields"])
+        except ValueError as e:
+            raise falcon.HTTPInvalidParam(str(e), "fields")
     if not isinstance(feeds, list):
         feeds = [feeds]  # NOQA
-    return ParsedQS(feeds, int_n, bool(full))
+    return ParsedQS(feeds, int_n, bool(full), since, fields)
+
+
+def render(fm: FeedMixer, ftype: str) -> str:
+    """
+    Dynamically find and call the appropriate `FeedMixer` method based on
+    `ftype` (one of 'atom', 'rss', or 'json').
+    """
+    method_name = "{}_feed".format(ftype)
+    method = getattr(fm, method_name)
+    return method()
+
+
+def content_type(ftype: str) -> str:
+    """
+    The Content-Type of feeds of type `ftype`.
+    """
+    if ftype == "json":
+        # special case content_type for JSON
+        return "application/json"
+    return "application/{}+xml".format(ftype)
+
+
+def accepted_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Choose the content-coding (one of `ENCODINGS`) to respond with given the
+    value of a request's Accept-Encoding header, or None for no compression.
+    """
+    if not accept_encoding:
+        return None
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qvalues[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in ENCODINGS:
+        q = qvalues.get(coding, qvalues.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    Compress `data` with `encoding` ('gzip' or 'br'). If `best` is True use
+    the slowest, strongest settings (for output which is compressed once and
+    served many times).
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+class CompressedVariants:
+    """
+    An LRU cache of the compressed variants of rendered feeds, keyed by a
+    digest of the rendered body, so that a body which is served repeatedly is
+    only compressed once per encoding.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self._variants = collections.OrderedDict()  # type: collections.OrderedDict[Any, bytes]
+        self._lock = threading.Lock()
+
+    def get(self, data: bytes, encoding: str) -> bytes:
+        key = (hashlib.sha1(data).digest(), encoding)
+        with self._lock:
+            compressed = self._variants.get(key)
+            if compressed is not None:
+                self._variants.move_to_end(key)
+                return compressed
+        compressed = compress(data, encoding)
+        with self._lock:
+            self._variants[key] = compressed
+            while len(self._variants) > self.maxsize:
+                self._variants.popitem(last=False)
+        return compressed
+
+
+def set_body(
+    req: falcon.Request,
+    resp: falcon.Response,
+    data: bytes,
+    compressed: Optional[Callable[[str], bytes]] = None,
+) -> None:
+    """
+    Set the response body to `data`, or to a compressed variant of it (got
+    from `compressed(encoding)`) if the client accepts one.
+    """
+    if compressed is not None:
+        resp.append_header("Vary", "Accept-Encoding")
+        encoding = accepted_encoding(req.get_header("Accept-Encoding"))
+        if encoding is not None and len(data) >= MIN_COMPRESS_SIZE:
+            resp.data = compressed(encoding)
+            resp.set_header("Content-Encoding", encoding)
+            return
+    resp.data = data
+
+
+def pack_rendered(
+    data: bytes, headers: List[Tuple[str, str]], compressed: Optional[Dict[str, bytes]] = None
+) -> bytes:
+    """
+    Serialize a rendered feed, its response headers and its `compressed`
+    variants (keyed by encoding) for a render cache.
+    """
+    variants = list((compressed or {}).items())
+    head = {"headers": headers, "compressed": [[enc, len(v)] for enc, v in variants]}
+    return b"".join([json.dumps(head).encode("utf-8"), b"\n"] + [v for _, v in variants] + [data])
+
+
+def unpack_rendered(blob: bytes) -> Tuple[bytes, List[Tuple[str, str]], Dict[str, bytes]]:
+    head, _, body = blob.partition(b"\n")
+    meta = json.loads(head)
+    compressed = {}
+    pos = 0
+    for enc, size in meta["compressed"]:
+        compressed[enc] = body[pos : pos + size]
+        pos += size
+    headers = [(name, value) for name, value in meta["headers"]]
+    return body[pos:], headers, compressed
+
+
+def error_strings(error_urls: error_dict_t) -> Dict[str, str]:
+    """
+    Convert `FeedMixer.error_urls` into a dict of error messages suitable for
+    JSON-encoding.
+    """
+    error_dict = {}
+    for url, e in error_urls.items():
+        err_str = str(e)
+        if hasattr(e, "status"):
+            err_str += " ({})".format(e.status)
+        error_dict[url] = err_str
+    return error_dict
+
+
+def client_id(req: falcon.Request, trusted_proxies: int = 0) -> str:
+    """
+    The client a request is counted against for rate limiting: its remote
+    address or, behind `trusted_proxies` reverse proxies, the address the
+    outermost of them saw (the `trusted_proxies`-th from the right of the
+    'X-Forwarded-For' header, as each proxy appends the address it got the
+    request from). Addresses further left were sent by the client, which can
+    put anything there, so they are never used.
+
+    :param req: the Falcon request.
+    :param trusted_proxies: the number of reverse proxies in front of the
+        app which append to 'X-Forwarded-For' (0 to ignore the header).
+    """
+    if trusted_proxies > 0:
+        forwarded = [a.strip() for a in (req.get_header("X-Forwarded-For") or "").split(",")]
+        if len(forwarded) >= trusted_proxies and forwarded[-trusted_proxies]:
+            return forwarded[-trusted_proxies]
+    return req.remote_addr or ""
+
+
+class Overloaded(Exception):
+    """
+    Raised by `AdmissionControl.acquire` when a request is refused.
+    """
+
+    def __init__(self, reason: str, retry_after: int, client_limited: bool = False) -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.client_limited = client_limited
+
+    def http_error(self) -> falcon.HTTPError:
+        """
+        The error to respond with: 429 if the client is over its own rate
+        limit, otherwise 503 (with a 'Retry-After' header either way).
+        """
+        if self.client_limited:
+            return falcon.HTTPTooManyRequests(description=str(self), retry_after=self.retry_after)
+        return falcon.HTTPServiceUnavailable(description=str(self), retry_after=self.retry_after)
+
+
+class AdmissionControl:
+    """
+    Limits the mixing work a process takes on, so that a traffic spike is
+    answered quickly with an error (or a stale copy of the requested feed)
+    instead of queueing every request behind the upstream fetches of the ones
+    before it. Three limits are enforced (each disabled when 0):
+
+    - `max_mixes`: the number of mixes being rendered at once
+    - `max_fetches`: the number of upstream fetches those mixes may make (a
+      mix is counted as one fetch per feed; a single mix larger than the limit
+      is still admitted when nothing else is in flight)
+    - `rate` and `burst`: a token bucket per client (see `client_id`; behind
+      `trusted_proxies` reverse proxies), which refills at `rate` requests per
+      second up to `burst`
+
+    Feeds rendered while admission control is in place are kept in
+    `stale_cache` for `stale_ttl` seconds, to be served (marked with an
+    'X-fm-stale' header) to requests which are refused.
+    """
+
+    def __init__(
+        self,
+        max_mixes: int = 0,
+        max_fetches: int = 0,
+        rate: float = 0,
+        burst: int = 10,
+        retry_after: int = 5,
+        stale_cache: Optional["BaseCache"] = None,
+        stale_ttl: int = 3600,
+        max_clients: int = 10000,
+        trusted_proxies: int = 0,
+    ) -> None:
+        """
+        :param max_mixes: the maximum number of mixes rendered at once.
+        :param max_fetches: the maximum number of upstream fetches pending at
+            once.
+        :param rate: requests per second allowed to each client.
+        :param burst: the number of requests a client may make at once.
+        :param retry_after: the 'Retry-After' value (in seconds) of refusals.
+        :param stale_cache: where rendered feeds are kept to be served stale
+            (a cache backend from `feedmixer_cache`; by default an in-process
+            `MemoryCache`).
+        :param stale_ttl: how long rendered feeds are kept, in seconds.
+        :param max_clients: the number of client token buckets kept.
+        :param trusted_proxies: the number of reverse proxies in front of the
+            app whose 'X-Forwarded-For' addresses are trusted (see
+            `client_id`).
+        """
+        self.max_mixes = max_mixes
+        self.max_fetches = max_fetches
+        self.rate = rate
+        self.burst = burst
+        self.retry_after = retry_after
+        if stale_cache is None:
+            from feedmixer_cache import MemoryCache
+
+            stale_cache = MemoryCache(maxsize=256)
+        self.stale_cache = stale_cache
+        self.stale_ttl = stale_ttl
+        self.max_clients = max_clients
+        self.trusted_proxies = trusted_proxies
+        self.mixes = 0
+        self.fetches = 0
+        self.refused = 0
+        self._buckets = collections.OrderedDict()  # type: collections.OrderedDict[str, Tuple[float, float]]
+        self._lock = threading.Lock()
+
+    def _take_token(self, client: str, now: float) -> bool:
+        tokens, last = self._buckets.get(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+        ok = tokens >= 1
+        self._buckets[client] = (tokens - 1 if ok else tokens, now)
+        self._buckets.move_to_end(client)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return ok
+
+    def acquire(self, client: str, fetches: int) -> None:
+        """
+        Admit a mix of `fetches` upstream fetches requested by `client`, or
+        raise `Overloaded`. Every admitted mix must be `release`d.
+        """
+        with self._lock:
+            if self.rate > 0 and not self._take_token(client, time.monotonic()):
+                self.refused += 1
+                retry = max(self.retry_after, int(1 / self.rate) + 1)
+                raise Overloaded("Too many requests from {}".format(client), retry, client_limited=True)
+            if self.max_mixes and self.mixes >= self.max_mixes:
+                self.refused += 1
+                raise Overloaded("Too many mixes in progress", self.retry_after)
+            if self.max_fetches and self.fetches and self.fetches + fetches > self.max_fetches:
+                self.refused += 1
+                raise Overloaded("Too many feeds being fetched", self.retry_after)
+            self.mixes += 1
+            self.fetches += fetches
+
+    def release(self, fetches: int) -> None:
+        with self._lock:
+            self.mixes -= 1
+            self.fetches -= fetches
+
+    def keep(self, key: str, blob: bytes) -> None:
+        """
+        Keep a rendered feed (see `pack_rendered`) to serve stale.
+        """
+        self.stale_cache.set("stale:" + key, blob, expires=self.stale_ttl)
+
+    def stale(self, key: str) -> Optional[bytes]:
+        return self.stale_cache.get("stale:" + key)
 
 
 class MixedFeed:
@@ -114,6 +563,16 @@ class MixedFeed:
         sess: requests.session = requests.session(),
         timeout: int = DEFAULT_TIMEOUT,
         parser_cache = None,
+        entry_store: Optional[EntryStore] = None,
+        compression: Optional[CompressedVariants] = None,
+        native_xml: bool = False,
+        json_backend: Optional[str] = None,
+        fetch: Optional[Callable[[str], Document]] = None,
+        render_cache: Optional["BaseCache"] = None,
+        render_ttl: int = 60,
+        admission: Optional[AdmissionControl] = None,
+        latencies: Optional[LatencyTracker] = None,
+        hedger: Optional[Hedger] = None,
     ) -> None:
         """
         :param ftype: one of 'atom', 'rss', or 'json'
@@ -123,6 +582,28 @@ class MixedFeed:
         :param sess: the requests.session object to use for making http GET requests.
         :param timeout: the timeout for http requests in seconds.
         :param parser_cache: A functools.lru_cache-wrapped feedparser.parse function for application-wide caching.
+        :param entry_store: An `EntryStore` for application-wide reuse of extracted entries.
+        :param compression: If given, responses are compressed for clients
+            which accept it. Feeds which are kept in `render_cache` (or kept
+            to serve stale) are stored with their compressed variants;
+            those of other feeds are cached here.
+        :param native_xml: If True, Atom and RSS are written by FeedMixer's
+            native serializer rather than by feedgenerator.
+        :param json_backend: If set, JSON is encoded directly with this
+            backend (see `feedmixer.JSON_BACKENDS`).
+        :param fetch: If set, the function FeedMixer gets documents with
+            instead of `sess` (see `feedmixer_crawler.CrawlStore.fetch`).
+        :param render_cache: If given, a cache backend (see `feedmixer_cache`)
+            in which rendered feeds are kept for `render_ttl` seconds, so that
+            identical requests within that time (to any worker sharing the
+            backend) are answered without fetching or mixing.
+        :param render_ttl: how long rendered feeds are kept, in seconds.
+        :param admission: If given, the `AdmissionControl` which each mix
+            must be admitted by before it is fetched.
+        :param latencies: A `LatencyTracker` for application-wide fetch
+            latency estimates (so the slowest feeds of a mix start first).
+        :param hedger: If given, the `Hedger` with which slow fetches are
+            hedged.
         """
         super().__init__()
         self.ftype = ftype
@@ -131,18 +612,36 @@ class MixedFeed:
         self.sess = sess
         self.timeout = timeout
         self.parser_cache = parser_cache
+        self.entry_store = entry_store
+        self.compression = compression
+        self.native_xml = native_xml
+        self.json_backend = json_backend
+        self.fetch = fetch
+        self.render_cache = render_cache
+        self.render_ttl = render_ttl
+        self.admission = admission
+        self.latencies = latencies
+        self.hedger = hedger
+
+    def render_key(self, fm: FeedMixer) -> str:
+        """
+        The render cache key of the feed `fm` renders. It is built from the
+        (canonical) feeds and parsed parameters rather than the request URI,
+        so that requests which differ only in how the feed URLs are spelled
+        or in the order they are given share a rendered feed (whose link is
+        that of the first of them).
+        """
+        fields = ",".join(sorted(fm.fields)) if fm.fields is not None else ""
+        since = fm.since.isoformat() if fm.since is not None else ""
+        params = [str(fm.num_keep), str(fm.prefer_summary), since, fields]
+        ident = "\n".join([self.ftype, self.title, self.desc] + params + sorted(fm.feeds))
+        return "rendered:" + hashlib.sha1(ident.encode("utf-8")).hexdigest()
 
     def on_get(self, req: falcon.Request, resp: falcon.Response) -> None:
         """
         Falcon GET handler.
         """
-        feeds, n, full = parse_qs(req)
-
-        # Let app know if no feeds were given
-        if len(feeds) == 0:
-            resp.append_header(
-                "X-fm-errors", '"No feeds were provided in query string  parameters."'
-            )
+        feeds, n, full, since, fields = parse_qs(req)
 
         summ = not full
         fm = FeedMixer(
@@ -155,30 +654,913 @@ class MixedFeed:
             sess=self.sess,
             timeout=self.timeout,
             parser_cache=self.parser_cache,
+            entry_store=self.entry_store,
+            since=since,
+            fields=fields,
+            native_xml=self.native_xml,
+            json_backend=self.json_backend,
+            fetch=self.fetch,
+            latencies=self.latencies,
+            hedger=self.hedger,
         )
 
-        # dynamically find and call appropriate method based on ftype:
-        method_name = "{}_feed".format(self.ftype)
-        method = getattr(fm, method_name)
-        resp.text = method()
+        cache = self.render_cache is not None and self.render_ttl > 0
+        key = None
+        if cache or self.admission is not None:
+            key = self.render_key(fm)
+        if cache:
+            cached = self.render_cache.get(key)
+            if cached is not None:
+                data, headers, compressed = unpack_rendered(cached)
+                self.respond(req, resp, data, headers, compressed)
+                return
+
+        headers = []  # type: List[Tuple[str, str]]
+        # Let app know if no feeds were given
+        if len(feeds) == 0:
+            headers.append(("X-fm-errors", '"No feeds were provided in query string  parameters."'))
+
+        # (documents from `fetch` are not fetched upstream)
+        fetches = len(fm.feeds) if self.fetch is None else 0
+        if self.admission is not None:
+            try:
+                self.admission.acquire(client_id(req, self.admission.trusted_proxies), fetches)
+            except Overloaded as e:
+                logger.info("Refused {}: {}".format(req.uri, e))
+                stale = self.admission.stale(key)
+                if stale is None:
+                    raise e.http_error()
+                data, headers, compressed = unpack_rendered(stale)
+                self.respond(req, resp, data, headers + [("X-fm-stale", "true")], compressed)
+                return
+        try:
+            data = render(fm, self.ftype).encode("utf-8")
+        finally:
+            if self.admission is not None:
+                self.admission.release(fetches)
+
+        cursor = next_cursor(fm.mixed_entries, since)
+        if cursor is not None:
+            headers.append(("X-fm-cursor", cursor))
 
         if fm.error_urls:
             # There were errors; report them in the 'X-fm-errors' http header as
             # a url-encoded JSON hash
-            error_dict = {}
-            for url, e in fm.error_urls.items():
-                err_str = str(e)
-                if hasattr(e, "status"):
-                    err_str += " ({})".format(e.status)
-                error_dict[url] = err_str
-            json_err = urllib.parse.quote(json.dumps(error_dict))
-            resp.append_header("X-fm-errors", json_err)
+            json_err = urllib.parse.quote(json.dumps(error_strings(fm.error_urls)))
+            headers.append(("X-fm-errors", json_err))
+
+        compressed = {}  # type: Dict[str, bytes]
+        if key is not None:
+            # (the variants are stored with the rendered feed, so that they are
+            # compressed once for every worker that shares the cache)
+            if self.compression is not None and len(data) >= MIN_COMPRESS_SIZE:
+                compressed = {enc: compress(data, enc) for enc in ENCODINGS}
+            blob = pack_rendered(data, headers, compressed)
+            if cache:
+                self.render_cache.set(key, blob, expires=self.render_ttl)
+            if self.admission is not None:
+                self.admission.keep(key, blob)
+        self.respond(req, resp, data, headers, compressed)
+
+    def respond(
+        self,
+        req: falcon.Request,
+        resp: falcon.Response,
+        data: bytes,
+        headers: List[Tuple[str, str]],
+        compressed: Optional[Dict[str, bytes]] = None,
+    ) -> None:
+        """
+        Respond with the rendered feed `data`, compressed with one of the
+        `compressed` variants it was stored with or, failing those, with a
+        variant from `self.compression`.
+        """
+        variant = None
+        if self.compression is not None:
+            if compressed:
+                variant = compressed.__getitem__
+            else:
+                variant = functools.partial(self.compression.get, data)
+        set_body(req, resp, data, variant)
+        for name, value in headers:
+            resp.append_header(name, value)
+        resp.content_type = content_type(self.ftype)
+        resp.status = falcon.HTTP_200
+
+
+class ReleasingStream:
+    """
+    An iterable over `lines` which calls `release` once, when it is
+    exhausted or closed: the WSGI server closes a response iterable even if
+    it is never iterated (e.g. when the client has already gone away), which
+    a generator's own `finally` would not see.
+    """
+
+    def __init__(self, lines: Iterator[bytes], release: Optional[Callable[[], None]]) -> None:
+        self.lines = lines
+        self._release = release
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> "ReleasingStream":
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            return next(self.lines)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        with self._lock:
+            release, self._release = self._release, None
+        try:
+            close = getattr(self.lines, "close", None)
+            if close is not None:
+                close()
+        finally:
+            if release is not None:
+                release()
 
-        if self.ftype == "json":
-            # special case content_type for JSON
-            resp.content_type = "application/json"
+
+class StreamedMix:
+    """
+    Used to handle HTTP GET requests to the '/stream' endpoint, which takes the
+    same query string as '/atom', '/rss' and '/json' but writes the mix as
+    newline delimited JSON (application/x-ndjson), one record per line:
+
+    - ``{"feed": <url>, "items": [...]}`` for each feed, as soon as it has been
+      fetched and parsed (in the order the feeds arrive), with its entries
+      (newest first) as JSON Feed items
+    - a final ``{"errors": {<url>: <error>, ...}}`` (with a ``"cursor"`` as in
+      the `X-fm-cursor` header, if there is one)
+
+    so that interactive clients can show the first feeds without waiting for
+    the slowest. The feeds are not merged: sorting across them is left to the
+    client.
+    """
+
+    def __init__(
+        self,
+        sess: requests.session = requests.session(),
+        timeout: int = DEFAULT_TIMEOUT,
+        parser_cache = None,
+        entry_store: Optional[EntryStore] = None,
+        json_backend: Optional[str] = None,
+        fetch: Optional[Callable[[str], Document]] = None,
+        admission: Optional[AdmissionControl] = None,
+        latencies: Optional[LatencyTracker] = None,
+        hedger: Optional[Hedger] = None,
+    ) -> None:
+        """
+        :param sess: the requests.session object to use for making http GET requests.
+        :param timeout: the timeout for http requests in seconds.
+        :param parser_cache: A functools.lru_cache-wrapped feedparser.parse function for application-wide caching.
+        :param entry_store: An `EntryStore` for application-wide reuse of extracted entries.
+        :param json_backend: the backend to encode records with (see
+            `feedmixer.JSON_BACKENDS`; default 'stdlib').
+        :param fetch: If set, the function FeedMixer gets documents with
+            instead of `sess` (see `feedmixer_crawler.CrawlStore.fetch`).
+        :param admission: If given, the `AdmissionControl` which each mix
+            must be admitted by before it is fetched (it is held until the
+            stream ends).
+        :param latencies: A `LatencyTracker` for application-wide fetch
+            latency estimates (so the slowest feeds of a mix start first).
+        :param hedger: If given, the `Hedger` with which slow fetches are
+            hedged.
+        """
+        super().__init__()
+        self.sess = sess
+        self.timeout = timeout
+        self.parser_cache = parser_cache
+        self.entry_store = entry_store
+        self.dumps = JSON_BACKENDS[json_backend or "stdlib"]
+        self.fetch = fetch
+        self.admission = admission
+        self.latencies = latencies
+        self.hedger = hedger
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response) -> None:
+        """
+        Falcon GET handler.
+        """
+        feeds, n, full, since, fields = parse_qs(req)
+        fm = FeedMixer(
+            feeds=feeds,
+            num_keep=n,
+            prefer_summary=not full,
+            link=req.uri,
+            sess=self.sess,
+            timeout=self.timeout,
+            parser_cache=self.parser_cache,
+            entry_store=self.entry_store,
+            since=since,
+            fields=fields,
+            fetch=self.fetch,
+            latencies=self.latencies,
+            hedger=self.hedger,
+        )
+
+        fetches = len(fm.feeds) if self.fetch is None else 0
+        if self.admission is not None:
+            try:
+                self.admission.acquire(client_id(req, self.admission.trusted_proxies), fetches)
+            except Overloaded as e:
+                logger.info("Refused {}: {}".format(req.uri, e))
+                raise e.http_error()
+
+        resp.content_type = "application/x-ndjson"
+        # (ask nginx not to buffer the response, which would defeat the point)
+        resp.set_header("X-Accel-Buffering", "no")
+        release = None
+        if self.admission is not None:
+            release = functools.partial(self.admission.release, fetches)
+        resp.stream = ReleasingStream(self.records(fm, since), release)
+        resp.status = falcon.HTTP_200
+
+    def records(self, fm: FeedMixer, since: Optional[datetime.datetime]) -> Iterator[bytes]:
+        """
+        Generate the lines of the response.
+        """
+        mixed = []  # type: List[EntryMetadata]
+        for url, entries in fm.iter_feeds():
+            mixed += entries
+            yield self.dumps({"feed": url, "items": [json_item(e) for e in entries]}).encode("utf-8") + b"\n"
+        last = {"errors": error_strings(fm.error_urls)}  # type: Dict[str, Any]
+        if not fm.feeds:
+            last["errors"] = "No feeds were provided in query string parameters."
+        cursor = next_cursor(mixed, since)
+        if cursor is not None:
+            last["cursor"] = cursor
+        yield self.dumps(last).encode("utf-8") + b"\n"
+
+
+class PrefetchSession:
+    """
+    Wraps a requests.session so that each URL is only fetched once over the
+    lifetime of the wrapper, no matter how many `FeedMixer` objects `get()` it
+    (or from how many threads). The response (or exception) of the first
+    request for a URL is returned to every later request for it.
+    """
+
+    def __init__(self, sess: requests.session) -> None:
+        """
+        :param sess: the requests.session object to make the actual requests with.
+        """
+        self.sess = sess
+        self._lock = threading.Lock()
+        self._fetched = {}  # type: Dict[str, Future]
+
+    @property
+    def headers(self):
+        return self.sess.headers
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        future, owner = self._claim(url)
+        if owner:
+            self._fill(future, lambda: self.sess.get(url, **kwargs))
+        return future.result()
+
+    def _claim(self, url: str, hedged: bool = False) -> Tuple[Future, bool]:
+        """
+        The future response for `url`, and whether the caller is the first to
+        ask for it (and so must make the request).
+        """
+        with self._lock:
+            future = self._fetched.get(url)
+            if future is not None:
+                return future, False
+            future = HedgedCall() if hedged else Future()
+            self._fetched[url] = future
+            return future, True
+
+    @staticmethod
+    def _fill(future: Future, request: Callable[[], requests.Response]) -> None:
+        try:
+            future.set_result(request())
+        except Exception as e:
+            future.set_exception(e)
+
+    def prefetch(
+        self,
+        urls: List[str],
+        max_threads: int = 10,
+        latencies: Optional[LatencyTracker] = None,
+        hedger: Optional[Hedger] = None,
+        **kwargs
+    ) -> None:
+        """
+        Fetch all of `urls` in parallel. Errors are not raised here, but by
+        later calls to `get()`. If `latencies` is given, the time each fetch
+        takes is recorded in it, each request gets its host's adaptive
+        timeout, and (when there are more `urls` than `max_threads`) those
+        expected to be slowest are started first; with a `hedger` too, slow
+        requests are hedged.
+        """
+        if latencies is not None and len(urls) > max_threads:
+            urls = latencies.order(urls)
+        hedged = hedger is not None and latencies is not None
+
+        def fetch(url: str, future: Future) -> None:
+            args = kwargs
+            if latencies is not None and "timeout" in kwargs:
+                args = dict(kwargs, timeout=latencies.timeout(url, kwargs["timeout"]))
+
+            def request() -> requests.Response:
+                start = time.perf_counter()
+                r = None
+                error = None
+                try:
+                    r = self.sess.get(url, **args)
+                    return r
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    if latencies is not None:
+                        latencies.record_result(url, time.perf_counter() - start, r, error)
+
+            if hedged:
+                hedger.run(request, latencies.percentile(url, hedger.quantile), future)
+            else:
+                self._fill(future, request)
+
+        claimed = []
+        for url in urls:
+            future, owner = self._claim(url, hedged)
+            if owner:
+                claimed.append((url, future))
+
+        exec = ThreadPoolExecutor(max_workers=max_threads)
+        for url, future in claimed:
+            exec.submit(fetch, url, future)
+        # (wait for the first response for each URL, but not for requests
+        # which lost to their hedges: they finish on their own)
+        wait([future for _, future in claimed])
+        exec.shutdown(wait=False)
+
+
+MixSpec = NamedTuple(
+    "MixSpec", [("f", List[str]), ("n", int), ("full", bool), ("ftype", str), ("fields", fields_t)]
+)
+
+
+def parse_batch(media: Any, max_mixes: int) -> List[MixSpec]:
+    """
+    Validate the JSON body of a batch request: a list of objects, each with a
+    list of feed URLs `f` and optionally `n`, `full`, `ftype` and `fields`.
+
+    :param media: the decoded JSON body.
+    :param max_mixes: the maximum number of mixes allowed in one batch.
+    """
+    if isinstance(media, dict):
+        media = media.get("mixes")
+    if not isinstance(media, list):
+        raise falcon.HTTPBadRequest(
+            title="Invalid batch", description="Expected a JSON list of mixes"
+        )
+    if len(media) > max_mixes:
+        raise falcon.HTTPBadRequest(
+            title="Invalid batch",
+            description="At most {} mixes may be requested at once".format(max_mixes),
+        )
+
+    specs = []
+    for i, spec in enumerate(media):
+        if not isinstance(spec, dict):
+            raise falcon.HTTPBadRequest(
+                title="Invalid batch", description="Mix {} is not an object".format(i)
+            )
+        feeds = spec.get("f", spec.get("feeds", []))
+        if isinstance(feeds, str):
+            feeds = [feeds]
+        if not isinstance(feeds, list) or not all(isinstance(f, str) for f in feeds):
+            raise falcon.HTTPBadRequest(
+                title="Invalid batch",
+                description="Mix {}: f must be a list of URLs".format(i),
+            )
+        try:
+            n = int(spec.get("n", 0))
+        except (TypeError, ValueError):
+            raise falcon.HTTPBadRequest(
+                title="Invalid batch",
+                description="Mix {}: could not parse the n parameter".format(i),
+            )
+        ftype = spec.get("ftype", "json")
+        if ftype not in FTYPES:
+            raise falcon.HTTPBadRequest(
+                title="Invalid batch",
+                description="Mix {}: ftype must be one of {}".format(i, ", ".join(FTYPES)),
+            )
+        fields = spec.get("fields")
+        if fields:
+            if isinstance(fields, str):
+                fields = [fields]
+            if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+                raise falcon.HTTPBadRequest(
+                    title="Invalid batch",
+                    description="Mix {}: fields must be a list of field names".format(i),
+                )
+            try:
+                fields = parse_fields(fields)
+            except ValueError as e:
+                raise falcon.HTTPBadRequest(
+                    title="Invalid batch", description="Mix {}: {}".format(i, e)
+                )
         else:
-            resp.content_type = "application/{}+xml".format(self.ftype)
+            fields = None
+        specs.append(MixSpec(feeds, n, bool(spec.get("full", False)), ftype, fields))
+    return specs
+
+
+class BatchMix:
+    """
+    Handles HTTP POST requests to '/batch', which render several mixes at once.
+    The union of all the mixes' feed URLs is fetched (in parallel) only once.
+
+    The request body is a JSON list of mixes, each an object with the same
+    fields as the query string of the GET endpoints plus the feed type::
+
+        [{"f": ["http://a.example/feed", "http://b.example/feed"], "n": 3,
+          "full": false, "ftype": "atom"}, ...]
+
+    The response is a JSON object whose 'mixes' list holds, for each requested
+    mix in order, its 'ftype', 'content_type', rendered 'feed' (a string) and
+    'errors' (the same hash as the 'X-fm-errors' header of the GET endpoints).
+    """
+
+    def __init__(
+        self,
+        title: str = "FeedMixer feed",
+        desc: str = "{type} feed created by FeedMixer.",
+        sess: requests.session = requests.session(),
+        timeout: int = DEFAULT_TIMEOUT,
+        parser_cache=None,
+        entry_store: Optional[EntryStore] = None,
+        max_mixes: int = 50,
+        max_threads: int = 10,
+        max_feeds: int = 100,
+        native_xml: bool = False,
+        json_backend: Optional[str] = None,
+        fetch: Optional[Callable[[str], Document]] = None,
+        admission: Optional[AdmissionControl] = None,
+        latencies: Optional[LatencyTracker] = None,
+        hedger: Optional[Hedger] = None,
+    ) -> None:
+        """
+        :param title: the title of the generated feeds
+        :param desc: description of the generated feeds (the '{type}'
+            formatting parameter will be replaced by each mix's `ftype`)
+        :param sess: the requests.session object to use for making http GET requests.
+        :param timeout: the timeout for http requests in seconds.
+        :param parser_cache: A functools.lru_cache-wrapped feedparser.parse
+            function for application-wide caching.
+        :param entry_store: An `EntryStore` for application-wide reuse of
+            extracted entries.
+        :param max_mixes: the maximum number of mixes in one batch.
+        :param max_threads: the maximum number of threads to fetch with.
+        :param max_feeds: the maximum number of feeds to fetch per mix.
+        :param native_xml: If True, Atom and RSS are written by FeedMixer's
+            native serializer rather than by feedgenerator.
+        :param json_backend: If set, JSON is encoded directly with this
+            backend (see `feedmixer.JSON_BACKENDS`).
+        :param fetch: If set, the function FeedMixer gets documents with
+            instead of `sess` (see `feedmixer_crawler.CrawlStore.fetch`).
+        :param admission: If given, the `AdmissionControl` which each batch
+            must be admitted by (as one mix fetching the union of its feeds).
+        :param latencies: A `LatencyTracker` for application-wide fetch
+            latency estimates (so the slowest feeds of a batch start first).
+        :param hedger: If given, the `Hedger` with which slow fetches are
+            hedged.
+        """
+        self.title = title
+        self.desc = desc
+        self.sess = sess
+        self.timeout = timeout
+        self.parser_cache = parser_cache
+        self.entry_store = entry_store
+        self.admission = admission
+        self.max_mixes = max_mixes
+        self.max_threads = max_threads
+        self.max_feeds = max_feeds
+        self.native_xml = native_xml
+        self.json_backend = json_backend
+        self.fetch = fetch
+        self.latencies = latencies
+        self.hedger = hedger
+
+    def on_post(self, req: falcon.Request, resp: falcon.Response) -> None:
+        """
+        Falcon POST handler.
+        """
+        specs = parse_batch(req.get_media(), self.max_mixes)
+
+        union = canonical_feeds(url for spec in specs for url in canonical_feeds(spec.f)[: self.max_feeds])
+
+        fetches = len(union) if self.fetch is None else 0
+        if self.admission is not None:
+            try:
+                self.admission.acquire(client_id(req, self.admission.trusted_proxies), fetches)
+            except Overloaded as e:
+                logger.info("Refused batch: {}".format(e))
+                raise e.http_error()
+        try:
+            mixes = self.render_batch(req, specs, union)
+        finally:
+            if self.admission is not None:
+                self.admission.release(fetches)
+
+        resp.media = {"mixes": mixes}
+        resp.status = falcon.HTTP_200
+
+    def render_batch(self, req: falcon.Request, specs: List[MixSpec], union: List[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch the `union` of the feeds of `specs` and render each mix.
+        """
+        shared = PrefetchSession(self.sess)
+        if self.fetch is None:
+            shared.prefetch(
+                union,
+                max_threads=self.max_threads,
+                latencies=self.latencies,
+                hedger=self.hedger,
+                timeout=self.timeout,
+            )
+
+        parser_cache = self.parser_cache
+        if parser_cache is None:
+            # parse each document only once within this batch
+            parser_cache = functools.lru_cache(maxsize=max(len(union), 1))(feedparser.parse)
+        entry_store = self.entry_store
+        if entry_store is None:
+            entry_store = EntryStore(maxsize=max(len(union), 1))
+
+        mixes = []
+        for spec in specs:
+            fm = FeedMixer(
+                feeds=spec.f,
+                num_keep=spec.n,
+                prefer_summary=not spec.full,
+                title=self.title,
+                desc=self.desc.format(type=spec.ftype),
+                link=req.uri,
+                sess=shared,
+                timeout=self.timeout,
+                max_threads=self.max_threads,
+                max_feeds=self.max_feeds,
+                parser_cache=parser_cache,
+                entry_store=entry_store,
+                fields=spec.fields,
+                native_xml=self.native_xml,
+                json_backend=self.json_backend,
+                fetch=self.fetch,
+            )
+            feed = render(fm, spec.ftype)
+            errors = error_strings(fm.error_urls)
+            if not spec.f:
+                errors = "No feeds were provided in the mix."
+            mixes.append(
+                {
+                    "ftype": spec.ftype,
+                    "content_type": content_type(spec.ftype),
+                    "feed": feed,
+                    "errors": errors,
+                }
+            )
+        return mixes
+
+
+NamedMixConfig = NamedTuple(
+    "NamedMixConfig",
+    [
+        ("title", str),
+        ("desc", str),
+        ("link", str),
+        ("f", List[str]),
+        ("n", int),
+        ("full", bool),
+        ("refresh", float),
+    ],
+)
+
+RenderedFeed = NamedTuple(
+    "RenderedFeed",
+    [("data", bytes), ("errors", Dict[str, str]), ("compressed", Dict[str, bytes])],
+)
+
+
+def load_mixes(path: str, refresh: float = 300) -> Dict[str, NamedMixConfig]:
+    """
+    Read named mixes from a JSON file which maps each mix name to an object
+    with the fields `feeds` (required), `title`, `desc`, `link`, `n`, `full`,
+    and `refresh` (the number of seconds between re-renders)::
+
+        {"planet": {"title": "Planet Example", "n": 3,
+                    "feeds": ["http://a.example/feed", "http://b.example/feed"]}}
+
+    :param path: the path of the JSON file.
+    :param refresh: the default number of seconds between re-renders.
+    """
+    with open(path, "r") as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError("{}: expected an object mapping names to mixes".format(path))
+
+    mixes = {}
+    for name, spec in raw.items():
+        if not isinstance(spec, dict):
+            raise ValueError("{}: mix '{}' must be an object".format(path, name))
+        feeds = spec.get("feeds", spec.get("f"))
+        if isinstance(feeds, str):
+            feeds = [feeds]
+        if not isinstance(feeds, list) or not feeds:
+            raise ValueError("{}: mix '{}' has no feeds".format(path, name))
+        mixes[name] = NamedMixConfig(
+            title=spec.get("title", name),
+            desc=spec.get("desc", "{type} feed created by FeedMixer."),
+            link=spec.get("link", ""),
+            f=feeds,
+            n=int(spec.get("n", 0)),
+            full=bool(spec.get("full", False)),
+            refresh=float(spec.get("refresh", refresh)),
+        )
+    return mixes
+
+
+class NamedMixes:
+    """
+    Keeps the rendered Atom, RSS and JSON output of a set of named mixes in
+    memory, and re-renders each mix on a schedule (every `refresh` seconds) in
+    a background thread, so that serving a named mix is just a lookup.
+    """
+
+    def __init__(
+        self,
+        mixes: Dict[str, NamedMixConfig],
+        sess: requests.session = requests.session(),
+        timeout: int = DEFAULT_TIMEOUT,
+        parser_cache=None,
+        entry_store: Optional[EntryStore] = None,
+        compress: bool = False,
+        native_xml: bool = False,
+        json_backend: Optional[str] = None,
+        fetch: Optional[Callable[[str], Document]] = None,
+        latencies: Optional[LatencyTracker] = None,
+        hedger: Optional[Hedger] = None,
+    ) -> None:
+        """
+        :param mixes: the named mixes (see `load_mixes`).
+        :param sess: the requests.session object to use for making http GET requests.
+        :param timeout: the timeout for http requests in seconds.
+        :param parser_cache: A functools.lru_cache-wrapped feedparser.parse
+            function for application-wide caching.
+        :param entry_store: An `EntryStore` for application-wide reuse of
+            extracted entries.
+        :param compress: If True, also keep a compressed variant of each
+            rendering for every encoding in `ENCODINGS`.
+        :param native_xml: If True, Atom and RSS are written by FeedMixer's
+            native serializer rather than by feedgenerator.
+        :param json_backend: If set, JSON is encoded directly with this
+            backend (see `feedmixer.JSON_BACKENDS`).
+        :param fetch: If set, the function FeedMixer gets documents with
+            instead of `sess` (see `feedmixer_crawler.CrawlStore.fetch`).
+        :param latencies: A `LatencyTracker` for application-wide fetch
+            latency estimates (so the slowest feeds of a mix start first).
+        :param hedger: If given, the `Hedger` with which slow fetches are
+            hedged.
+        """
+        self.mixes = mixes
+        self.sess = sess
+        self.timeout = timeout
+        self.parser_cache = parser_cache
+        self.entry_store = entry_store
+        self.compress = compress
+        self.native_xml = native_xml
+        self.json_backend = json_backend
+        self.fetch = fetch
+        self.latencies = latencies
+        self.hedger = hedger
+        self._rendered = {}  # type: Dict[str, Dict[str, RenderedFeed]]
+        self._render_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._pid = None  # type: Optional[int]
+
+    def refresh(self, name: str) -> Dict[str, RenderedFeed]:
+        """
+        Fetch the feeds of mix `name` and render it in every format.
+        """
+        mix = self.mixes[name]
+        fm = FeedMixer(
+            feeds=mix.f,
+            num_keep=mix.n,
+            prefer_summary=not mix.full,
+            title=mix.title,
+            link=mix.link,
+            sess=self.sess,
+            timeout=self.timeout,
+            parser_cache=self.parser_cache,
+            entry_store=self.entry_store,
+            native_xml=self.native_xml,
+            json_backend=self.json_backend,
+            fetch=self.fetch,
+            latencies=self.latencies,
+            hedger=self.hedger,
+        )
+        rendered = {}
+        for ftype in FTYPES:
+            fm.desc = mix.desc.format(type=ftype)
+            data = render(fm, ftype).encode("utf-8")
+            compressed = {}
+            if self.compress and len(data) >= MIN_COMPRESS_SIZE:
+                compressed = {enc: compress(data, enc, best=True) for enc in ENCODINGS}
+            rendered[ftype] = RenderedFeed(data, error_strings(fm.error_urls), compressed)
+        self._rendered[name] = rendered
+        logger.info("Rendered named mix {}".format(name))
+        return rendered
+
+    def get(self, name: str, ftype: str) -> RenderedFeed:
+        """
+        The rendered `ftype` output of mix `name` (rendering it now if it has
+        not been rendered yet).
+        """
+        rendered = self._rendered.get(name)
+        if rendered is None:
+            # serialize first renders so concurrent requests for a cold mix
+            # only fetch it once
+            with self._render_lock:
+                rendered = self._rendered.get(name)
+                if rendered is None:
+                    rendered = self.refresh(name)
+        return rendered[ftype]
+
+    def start(self) -> None:
+        """
+        Start the background refresh thread (if it is not already running in
+        this process; threads do not survive a fork, so WSGI servers which
+        fork workers should call this from each worker).
+        """
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="named-mixes", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        due = {name: 0.0 for name in self.mixes}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for name, mix in self.mixes.items():
+                if due[name] <= now:
+                    try:
+                        self.refresh(name)
+                    except Exception as e:
+                        logger.exception("Failed to render named mix {}: {}".format(name, e))
+                    due[name] = time.monotonic() + mix.refresh
+            self._stop.wait(max(0.0, min(due.values()) - time.monotonic()) if due else None)
+
+
+class NamedMixFeed:
+    """
+    Handles HTTP GET requests to '/mix/{name}.{ftype}', returning the
+    precomputed output of a named mix (see `NamedMixes`).
+
+    Any errors that occurred while fetching the mix are returned in the
+    'X-fm-errors' header as for the other endpoints.
+    """
+
+    def __init__(self, mixes: NamedMixes) -> None:
+        self.mixes = mixes
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response, name: str, ftype: str) -> None:
+        """
+        Falcon GET handler.
+        """
+        if name not in self.mixes.mixes or ftype not in FTYPES:
+            raise falcon.HTTPNotFound()
+        rendered = self.mixes.get(name, ftype)
+        compressed = rendered.compressed.__getitem__ if rendered.compressed else None
+        set_body(req, resp, rendered.data, compressed)
+        if rendered.errors:
+            json_err = urllib.parse.quote(json.dumps(rendered.errors))
+            resp.append_header("X-fm-errors", json_err)
+        resp.content_type = content_type(ftype)
+        resp.status = falcon.HTTP_200
+
+
+def cache_stats(sess: requests.Session, parser_cache=None) -> Dict[str, Any]:
+    """
+    Report the number of entries (and, where it can be measured, the size) of
+    the parser cache and of any CacheControl dict cache mounted on `sess`.
+    """
+    stats = {}  # type: Dict[str, Any]
+    if parser_cache is not None and hasattr(parser_cache, "cache_info"):
+        info = parser_cache.cache_info()
+        stats["parser_cache"] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "maxsize": info.maxsize,
+            "currsize": info.currsize,
+        }
+    seen = set()
+    for prefix, adapter in sess.adapters.items():
+        cache = getattr(adapter, "cache", None)
+        data = getattr(cache, "data", None)
+        if data is None or id(cache) in seen:
+            continue
+        seen.add(id(cache))
+        stats.setdefault("http_cache", []).append(
+            {
+                "prefix": prefix,
+                "entries": len(data),
+                "bytes": sum(len(v) for v in list(data.values())),
+            }
+        )
+    return stats
+
+
+class MemoryDebug:
+    """
+    Handles GET requests to the opt-in '/debug/memory' endpoint, which reports
+    the current and peak memory traced by `tracemalloc`, the size of the
+    caches, and the top allocation sites.
+
+    The query string may contain:
+
+    limit
+        The number of allocation sites to return (default 25).
+
+    group
+        One of 'lineno' (default), 'filename' or 'traceback'.
+    """
+
+    def __init__(
+        self, sess: requests.session, parser_cache=None, nframes: int = 1
+    ) -> None:
+        """
+        :param sess: the requests.session whose (CacheControl) cache to report on.
+        :param parser_cache: the application-wide parser cache to report on.
+        :param nframes: the number of frames `tracemalloc` stores per allocation.
+        """
+        self.sess = sess
+        self.parser_cache = parser_cache
+        # (only imported when memory debugging is enabled)
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(nframes)
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response) -> None:
+        """
+        Falcon GET handler.
+        """
+        import tracemalloc
+
+        limit = req.get_param_as_int("limit", min_value=1, default=25)
+        group = req.get_param("group", default="lineno")
+        if group not in ("lineno", "filename", "traceback"):
+            raise falcon.HTTPBadRequest(
+                title="Invalid group", description="group must be lineno, filename, or traceback"
+            )
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        stats = snapshot.statistics(group)
+        feedparser_bytes = sum(
+            stat.size for stat in snapshot.statistics("filename")
+            if "feedparser" in stat.traceback[0].filename
+        )
+
+        caches = cache_stats(self.sess, self.parser_cache)
+        cached_feeds = caches.get("parser_cache", {}).get("currsize", 0)
+
+        resp.text = json.dumps(
+            {
+                "traced_bytes": current,
+                "peak_bytes": peak,
+                "feedparser_bytes": feedparser_bytes,
+                "bytes_per_cached_feed": feedparser_bytes // cached_feeds if cached_feeds else None,
+                "caches": caches,
+                "top": [
+                    {
+                        "site": [str(frame) for frame in stat.traceback],
+                        "bytes": stat.size,
+                        "count": stat.count,
+                    }
+                    for stat in stats[:limit]
+                ],
+            }
+        )
+        resp.content_type = "application/json"
         resp.status = falcon.HTTP_200
 
 
@@ -189,15 +1571,84 @@ def wsgi_app(
     allow_cors: bool = False,
     timeout: int = DEFAULT_TIMEOUT,
     parser_cache = None,
+    entry_store: Optional[EntryStore] = None,
+    compress: bool = False,
+    debug_memory: bool = False,
+    named_mixes: Optional[NamedMixes] = None,
+    native_xml: bool = False,
+    json_backend: Optional[str] = None,
+    fetch: Optional[Callable[[str], Document]] = None,
+    render_cache: Optional["BaseCache"] = None,
+    render_ttl: int = 60,
+    admission: Optional[AdmissionControl] = None,
+    latencies: Optional[LatencyTracker] = None,
+    hedger: Optional[Hedger] = None,
 ) -> falcon.App:
     """
     Creates the Falcon api object (a WSGI-compliant callable)
 
     See `FeedMixer` docstring for parameter descriptions.
+
+    If `compress` is True, feeds are gzip (or, if the `brotli` package is
+    installed, brotli) compressed for clients which accept it. Each distinct
+    rendered feed is only compressed once.
+
+    If `debug_memory` is True, `tracemalloc` is started and the '/debug/memory'
+    endpoint is added (see `MemoryDebug`). Tracing slows every allocation down,
+    so only enable it while investigating memory use.
+
+    If `named_mixes` is given, its mixes are served from '/mix/{name}.{ftype}'
+    (see `NamedMixes`; the caller is responsible for starting its refresh
+    thread).
+
+    If `native_xml` is True, Atom and RSS feeds are written by FeedMixer's
+    native serializer, which produces the same XML as feedgenerator but keeps
+    each entry's markup for reuse by later requests.
+
+    If `json_backend` is set, JSON feeds are encoded directly with that backend
+    ('stdlib', or 'orjson' or 'msgspec' if installed) rather than through the
+    jsonfeed package.
+
+    If `fetch` is set, documents are got with it rather than with `sess`: pass
+    `feedmixer_crawler.CrawlStore.fetch` to serve only feeds already fetched
+    by the crawler (read-only mode), so that no request waits on the network.
+
+    If `render_cache` (a backend from `feedmixer_cache`) is given, feeds
+    rendered by the GET endpoints are kept there for `render_ttl` seconds and
+    served from it to identical requests.
+
+    If `admission` (an `AdmissionControl`) is given, mixes, streams and batches
+    beyond its limits are refused with a 503 (or 429, for a client over its
+    rate limit) and a 'Retry-After' header, or answered with a stale copy of
+    the requested feed if one was rendered recently.
+
+    If `latencies` (a `LatencyTracker`) is given, it is shared by every mix,
+    so that the feeds which have been slowest to fetch are fetched first.
+
+    If `hedger` (a `Hedger`) is given too, fetches which take longer than
+    their host usually does are hedged with a second request (see
+    `FeedMixer`).
     """
-    atom = MixedFeed(ftype="atom", title=title, desc=desc, sess=sess, timeout=timeout, parser_cache=parser_cache)
-    rss = MixedFeed(ftype="rss", title=title, desc=desc, sess=sess, timeout=timeout, parser_cache=parser_cache)
-    jsn = MixedFeed(ftype="json", title=title, desc=desc, sess=sess, timeout=timeout, parser_cache=parser_cache)
+    compression = CompressedVariants() if compress else None
+    feed_args = dict(
+        title=title,
+        desc=desc,
+        sess=sess,
+        timeout=timeout,
+        parser_cache=parser_cache,
+        entry_store=entry_store,
+        native_xml=native_xml,
+        json_backend=json_backend,
+        fetch=fetch,
+        latencies=latencies,
+        hedger=hedger,
+    )
+    get_args = dict(
+        compression=compression, render_cache=render_cache, render_ttl=render_ttl, admission=admission
+    )
+    atom = MixedFeed(ftype="atom", **get_args, **feed_args)
+    rss = MixedFeed(ftype="rss", **get_args, **feed_args)
+    jsn = MixedFeed(ftype="json", **get_args, **feed_args)
 
     middleware = []
     if allow_cors:
@@ -207,4 +1658,23 @@ def wsgi_app(
     api.add_route("/atom", atom)
     api.add_route("/rss", rss)
     api.add_route("/json", jsn)
+    api.add_route(
+        "/stream",
+        StreamedMix(
+            sess=sess,
+            timeout=timeout,
+            parser_cache=parser_cache,
+            entry_store=entry_store,
+            json_backend=json_backend,
+            fetch=fetch,
+            admission=admission,
+            latencies=latencies,
+            hedger=hedger,
+        ),
+    )
+    api.add_route("/batch", BatchMix(admission=admission, **feed_args))
+    if named_mixes is not None:
+        api.add_route("/mix/{name}.{ftype}", NamedMixFeed(named_mixes))
+    if debug_memory:
+        api.add_route("/debug/memory", MemoryDebug(sess=sess, parser_cache=parser_cache))
     return api
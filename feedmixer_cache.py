@@ -0,0 +1,680 @@
+"""
+Cache backends which can be shared by every worker process on a node, so that
+a feed fetched, parsed or mixed by one worker is warm for all of them.
+
+Each backend stores bytes under string keys and implements the CacheControl
+cache interface (`get`, `set`, `delete`, `close`), so the same backend can be
+used for:
+
+- fetched bodies: pass it to `cachecontrol.CacheControl(sess, cache=backend)`
+- parsed feeds: wrap it in a `SharedParserCache` and pass that to `FeedMixer`
+  as its `parser_cache`
+- rendered feeds: pass it to `feedmixer_api.wsgi_app` as its `render_cache`
+
+The backends are:
+
+- `MemoryCache`: an in-process LRU dict (not shared; the default behaviour,
+  and useful for tests)
+- `SqliteCache`: an SQLite database file, shared by the processes on a host
+- `RedisCache`: a Redis server (or anything speaking its protocol), shared
+  by all the hosts which can reach it
+
+Use `open_cache` to create one from a URL such as ``sqlite:///var/cache/fm.db``
+or ``redis://localhost:6379/0``.
+
+Parsed feeds are stored pickled, so only point a `SharedParserCache` at a
+store which nothing untrusted can write to.
+
+The in-process caches (`MemoryCache` and CacheControl's `DictCache`) can be
+saved to a snapshot file and loaded from it (see `Snapshotter`), so that a
+restarted worker starts with warm caches (including the validators of cached
+responses) instead of refetching every feed.
+"""
+
+import atexit
+import collections
+import datetime
+import functools
+import gzip
+import hashlib
+import logging
+import math
+import os
+import pickle
+import socket
+import sqlite3
+import struct
+import threading
+import time
+import urllib.parse
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import feedparser
+from cachecontrol.cache import BaseCache, DictCache
+
+logger = logging.getLogger(__name__)
+
+expires_t = Union[int, float, datetime.datetime, None]
+
+
+def expiry_time(expires: expires_t) -> Optional[float]:
+    """
+    Convert an `expires` argument (seconds from now, or a datetime, as
+    CacheControl passes it) to a POSIX timestamp, or None for no expiry.
+    """
+    if not expires:
+        return None
+    if isinstance(expires, datetime.datetime):
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=datetime.timezone.utc)
+        return expires.timestamp()
+    return time.time() + expires
+
+
+class MemoryCache(BaseCache):
+    """
+    A thread-safe in-process LRU cache of at most `maxsize` items.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._items = collections.OrderedDict()  # type: collections.OrderedDict[str, tuple]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, expires: expires_t = None) -> None:
+        with self._lock:
+            self._items[key] = (value, expiry_time(expires))
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """
+        The (unexpired) keys which start with `prefix`.
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                key
+                for key, (_, expires) in self._items.items()
+                if key.startswith(prefix) and (expires is None or expires > now)
+            ]
+
+    def items(self) -> List[Tuple[str, bytes, Optional[float]]]:
+        """
+        A copy of the cached items as (key, value, expiry timestamp) tuples,
+        least recently used first.
+        """
+        with self._lock:
+            return [(key, value, expires) for key, (value, expires) in self._items.items()]
+
+
+class SqliteCache(BaseCache):
+    """
+    A cache kept in an SQLite database at `path`, which any number of threads
+    and processes can use at once. At most about `maxsize` items are kept (the
+    least recently stored are removed first).
+
+    Errors from the database (e.g. a lock timeout) are logged and treated as a
+    cache miss rather than failing the request.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, maxsize: int = 10000, timeout: float = 5.0) -> None:
+        self.path = path
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._local = threading.local()
+        self._sets = 0
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, stored REAL NOT NULL)"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread, and a new one after a fork
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def __len__(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            row = self._db().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("sqlite cache get failed: {}".format(e))
+            return None
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires <= time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, expires: expires_t = None) -> None:
+        try:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, stored) VALUES (?, ?, ?, ?)",
+                (key, value, expiry_time(expires), time.time()),
+            )
+            self._sets += 1
+            if self._sets % self.PRUNE_EVERY == 0:
+                self.prune()
+        except sqlite3.Error as e:
+            logger.warning("sqlite cache set failed: {}".format(e))
+
+    def prune(self) -> None:
+        """
+        Remove expired items, and the oldest items beyond `maxsize`.
+        """
+        db = self._db()
+        db.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        db.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def delete(self, key: str) -> None:
+        try:
+            self._db().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("sqlite cache delete failed: {}".format(e))
+
+    def clear(self) -> None:
+        self._db().execute("DELETE FROM cache")
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """
+        The (unexpired) keys which start with `prefix`.
+        """
+        try:
+            rows = self._db().execute(
+                "SELECT key FROM cache WHERE substr(key, 1, ?) = ? AND (expires IS NULL OR expires > ?)",
+                (len(prefix), prefix, time.time()),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("sqlite cache keys failed: {}".format(e))
+            return []
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCache(BaseCache):
+    """
+    A cache kept in a Redis server (or any server speaking the Redis protocol,
+    RESP), using only the GET, SET, DEL and SCAN commands. Keys are stored
+    with `prefix` so that several services can share one database.
+
+    This talks to the server itself (one connection per thread) so that the
+    redis package is not needed. Connection errors are logged and treated as
+    a cache miss rather than failing the request.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        prefix: str = "feedmixer:",
+        timeout: float = 2.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> None:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.rfile = sock.makefile("rb")
+        self._local.pid = os.getpid()
+        if self.password:
+            self._send(["AUTH", self.password])
+        if self.db:
+            self._send(["SELECT", str(self.db)])
+
+    def _send(self, args: List[Union[str, bytes]]) -> Any:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._local.sock.sendall(b"".join(parts))
+        return self._read()
+
+    def _read(self) -> Any:
+        line = self._local.rfile.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._local.rfile.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            if size < 0:
+                return None
+            return [self._read() for _ in range(size)]
+        raise RedisError("unexpected reply {!r}".format(line))
+
+    def command(self, *args: Union[str, bytes]) -> Any:
+        """
+        Send one command and return its reply (reconnecting once if the
+        connection has gone away).
+        """
+        for attempt in (1, 2):
+            if getattr(self._local, "sock", None) is None or self._local.pid != os.getpid():
+                self._connect()
+            try:
+                return self._send(list(args))
+            except (OSError, ConnectionError):
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def _safely(self, fn: Callable[[], Any]) -> Any:
+        try:
+            return fn()
+        except (OSError, ConnectionError, RedisError) as e:
+            logger.warning("redis cache {}:{} failed: {}".format(self.host, self.port, e))
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._safely(lambda: self.command("GET", self.prefix + key))
+
+    def set(self, key: str, value: bytes, expires: expires_t = None) -> None:
+        args = ["SET", self.prefix + key, value]  # type: List[Union[str, bytes]]
+        at = expiry_time(expires)
+        if at is not None:
+            ms = int((at - time.time()) * 1000)
+            if ms <= 0:
+                self.delete(key)
+                return
+            args += ["PX", str(ms)]
+        self._safely(lambda: self.command(*args))
+
+    def delete(self, key: str) -> None:
+        self._safely(lambda: self.command("DEL", self.prefix + key))
+
+    def _scan(self, prefix: str) -> Iterator[List[bytes]]:
+        # (glob characters in the prefix are escaped)
+        pattern = "".join("\\" + c if c in "*?[]\\" else c for c in self.prefix + prefix) + "*"
+        cursor = b"0"
+        while True:
+            cursor, keys = self.command("SCAN", cursor, "MATCH", pattern, "COUNT", "1000")
+            yield keys
+            if cursor == b"0":
+                break
+
+    def clear(self) -> None:
+        """
+        Delete every key with this cache's `prefix`.
+        """
+        for keys in self._scan(""):
+            if keys:
+                self.command("DEL", *keys)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """
+        The keys which start with `prefix` (not including this cache's own
+        `prefix`).
+        """
+        skip = len(self.prefix)
+        found = self._safely(
+            lambda: [key.decode("utf-8")[skip:] for keys in self._scan(prefix) for key in keys]
+        )
+        return found or []
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            self._local.rfile.close()
+            sock.close()
+            self._local.sock = None
+
+
+def open_cache(url: str, maxsize: int = 10000) -> BaseCache:
+    """
+    Create a cache backend from a URL:
+
+    - ``memory`` (or ``memory://``): a `MemoryCache`
+    - ``sqlite:///path/to/file.db``: a `SqliteCache`
+    - ``redis://[:password@]host[:port][/db]``: a `RedisCache`
+
+    Raises:
+        ValueError: if the URL's scheme is not one of these.
+    """
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme or url
+    if scheme == "memory":
+        return MemoryCache(maxsize=maxsize)
+    if scheme == "sqlite":
+        path = parts.netloc + parts.path
+        if not path:
+            raise ValueError("No database path in cache URL '{}'".format(url))
+        return SqliteCache(path, maxsize=maxsize)
+    if scheme == "redis":
+        db = parts.path.strip("/")
+        return RedisCache(
+            host=parts.hostname or "localhost",
+            port=parts.port or 6379,
+            db=int(db) if db else 0,
+            password=parts.password,
+        )
+    raise ValueError("Unknown cache backend '{}' (use memory, sqlite or redis)".format(scheme))
+
+
+class SharedParserCache(object):
+    """
+    A drop-in replacement for the `functools.lru_cache`-wrapped
+    `feedparser.parse` used as a `FeedMixer` parser cache, which also keeps
+    the parse results in a (shared) backend, keyed by a digest of the
+    document's bytes (and response headers, if given). A document parsed by any worker is then only unpickled by the
+    others.
+
+    The most recently used `maxsize` results are also kept in process (so
+    repeated requests get the very same object, which the `EntryStore` relies
+    on to skip unchanged feeds).
+    """
+
+    def __init__(
+        self,
+        backend: BaseCache,
+        maxsize: int = 128,
+        expires: int = 86400,
+        parse: Callable[..., feedparser.util.FeedParserDict] = feedparser.parse,
+    ) -> None:
+        """
+        Args:
+            backend: the cache backend to share parse results through.
+            maxsize: the number of parse results to also keep in process.
+            expires: how long (in seconds) the backend should keep a result.
+                Results are keyed by the document's contents, so this only
+                bounds the space used by documents no longer served.
+            parse: the parsing function.
+        """
+        self.backend = backend
+        self.expires = expires
+        self.parse = parse
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self._local = functools.lru_cache(maxsize=maxsize)(self._lookup)
+
+    def __call__(
+        self, doc: Union[bytes, str], response_headers: Optional[Tuple[Tuple[str, str], ...]] = None
+    ) -> feedparser.util.FeedParserDict:
+        """
+        Args:
+            doc: the document (preferably its raw bytes, so feedparser can
+                work out the encoding).
+            response_headers: the HTTP headers it was served with (as a
+                tuple of pairs, so it can be part of the cache key), passed on
+                to `feedparser.parse`.
+        """
+        return self._local(doc, response_headers)
+
+    @staticmethod
+    def key(doc: Union[bytes, str], response_headers: Optional[Tuple[Tuple[str, str], ...]] = None) -> str:
+        if isinstance(doc, str):
+            doc = doc.encode("utf-8", "surrogatepass")
+        digest = hashlib.sha1(doc)
+        if response_headers:
+            digest.update(repr(response_headers).encode("utf-8", "surrogatepass"))
+        return "parsed:" + digest.hexdigest()
+
+    def _lookup(
+        self, doc: Union[bytes, str], response_headers: Optional[Tuple[Tuple[str, str], ...]]
+    ) -> feedparser.util.FeedParserDict:
+        key = self.key(doc, response_headers)
+        blob = self.backend.get(key)
+        if blob is not None:
+            try:
+                parsed = pickle.loads(blob)
+                self.shared_hits += 1
+                return parsed
+            except Exception as e:
+                logger.warning("Could not load cached parse result {}: {}".format(key, e))
+        self.shared_misses += 1
+        if response_headers:
+            parsed = self.parse(doc, response_headers=response_headers)
+        else:
+            parsed = self.parse(doc)
+        try:
+            self.backend.set(key, pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL), expires=self.expires)
+        except Exception as e:
+            # e.g. an unpicklable bozo_exception
+            logger.info("Could not store parse result {}: {}".format(key, e))
+        return parsed
+
+    def cache_info(self) -> Any:
+        """
+        The in-process `functools.lru_cache` statistics (see `shared_hits`
+        and `shared_misses` for the backend).
+        """
+        return self._local.cache_info()
+
+    def cache_clear(self) -> None:
+        """
+        Clear the in-process results (the backend is left as it is).
+        """
+        self._local.cache_clear()
+
+
+SNAPSHOT_MAGIC = b"FMSNAP1\n"
+
+# each record: the lengths of the cache name, key and value, and the expiry
+# timestamp (NaN for none), followed by the name, key and value themselves
+_RECORD = struct.Struct("!HIId")
+
+
+def cache_items(cache: BaseCache) -> Iterator[Tuple[str, bytes, Optional[float]]]:
+    """
+    The (key, value, expiry timestamp) items of an in-process cache.
+
+    Raises:
+        TypeError: if the contents of `cache` cannot be listed.
+    """
+    if isinstance(cache, MemoryCache):
+        return iter(cache.items())
+    if isinstance(cache, DictCache):
+        with cache.lock:
+            return iter([(key, value, None) for key, value in cache.data.items()])
+    raise TypeError("Cannot snapshot a {}".format(type(cache).__name__))
+
+
+def save_snapshot(path: str, caches: Dict[str, BaseCache]) -> int:
+    """
+    Write the contents of `caches` (named in-process caches) to the
+    (gzipped) snapshot file `path`, replacing it atomically.
+
+    Returns:
+        The number of items written.
+    """
+    now = time.time()
+    count = 0
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with gzip.open(tmp, "wb", compresslevel=5) as f:
+        f.write(SNAPSHOT_MAGIC)
+        for name, cache in caches.items():
+            bname = name.encode("utf-8")
+            for key, value, expires in cache_items(cache):
+                if expires is not None and expires <= now:
+                    continue
+                bkey = key.encode("utf-8")
+                f.write(_RECORD.pack(len(bname), len(bkey), len(value), math.nan if expires is None else expires))
+                f.write(bname + bkey + value)
+                count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def load_snapshot(path: str, caches: Dict[str, BaseCache]) -> int:
+    """
+    Load a snapshot written by `save_snapshot` into `caches` (items of caches
+    not named in `caches`, and expired items, are skipped).
+
+    Returns:
+        The number of items loaded.
+
+    Raises:
+        ValueError: if `path` is not a snapshot file.
+    """
+    now = time.time()
+    count = 0
+    with gzip.open(path, "rb") as f:
+        try:
+            magic = f.read(len(SNAPSHOT_MAGIC))
+        except OSError as e:
+            raise ValueError("{} is not a snapshot: {}".format(path, e))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("{} is not a snapshot".format(path))
+        while True:
+            head = f.read(_RECORD.size)
+            if not head:
+                break
+            if len(head) < _RECORD.size:
+                raise ValueError("{} is truncated".format(path))
+            name_len, key_len, value_len, expires = _RECORD.unpack(head)
+            body = f.read(name_len + key_len + value_len)
+            if len(body) < name_len + key_len + value_len:
+                raise ValueError("{} is truncated".format(path))
+            cache = caches.get(body[:name_len].decode("utf-8"))
+            if cache is None or (not math.isnan(expires) and expires <= now):
+                continue
+            key = body[name_len : name_len + key_len].decode("utf-8")
+            at = None
+            if not math.isnan(expires):
+                at = datetime.datetime.fromtimestamp(expires, datetime.timezone.utc)
+            cache.set(key, body[name_len + key_len :], expires=at)
+            count += 1
+    return count
+
+
+class Snapshotter(object):
+    """
+    Saves named in-process caches to a snapshot file every `interval` seconds
+    (in a background thread) and when the process exits, and loads them from
+    it at startup. Several processes may share one file: each save replaces
+    it atomically.
+    """
+
+    def __init__(self, path: str, caches: Dict[str, BaseCache], interval: float = 300) -> None:
+        """
+        Args:
+            path: the snapshot file.
+            caches: the caches to snapshot, by name.
+            interval: seconds between saves (0 to only save at exit).
+        """
+        self.path = path
+        self.caches = caches
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._pid = None  # type: Optional[int]
+
+    def load(self) -> int:
+        """
+        Load the snapshot file, if there is one. A missing or unreadable file
+        is logged and otherwise ignored.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            count = load_snapshot(self.path, self.caches)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load cache snapshot: {}".format(e))
+            return 0
+        logger.info("Loaded {} cached items from {}".format(count, self.path))
+        return count
+
+    def save(self) -> int:
+        try:
+            count = save_snapshot(self.path, self.caches)
+        except OSError as e:
+            logger.warning("Could not save cache snapshot: {}".format(e))
+            return 0
+        logger.info("Saved {} cached items to {}".format(count, self.path))
+        return count
+
+    def start(self) -> None:
+        """
+        Start saving periodically and at exit (once per process; calling it
+        again is a no-op).
+        """
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        # (a forked child inherits its parent's exit handlers)
+        atexit.unregister(self.save)
+        atexit.register(self.save)
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="cache-snapshots", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        atexit.unregister(self.save)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._pid = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.save()
@@ -0,0 +1,357 @@
+"""
+A background crawler which keeps feeds fetched and parsed in a shared cache
+backend (see `feedmixer_cache`), so that the web workers can run in read-only
+mode: they mix only documents the crawler has already stored and never wait
+on the network.
+
+Run the crawler alongside the WSGI app, with the same backend::
+
+$ FM_CACHE_BACKEND=sqlite:///var/cache/fm.db python -m feedmixer_crawler --mixes mixes.json
+$ FM_CACHE_BACKEND=sqlite:///var/cache/fm.db FM_READ_ONLY=1 gunicorn -w 8 feedmixer_wsgi
+
+The crawler fetches:
+
+- the URLs listed in ``--urls`` files (one per line) and the feeds of the
+  named mixes in ``--mixes`` files, always
+- every URL requested of a read-only worker (which subscribes it through
+  `CrawlStore.fetch`), until it has not been requested for ``--forget``
+  seconds
+
+Each feed is refetched on its own schedule: its interval halves (down to
+``--min-interval``) when the document has changed since the last fetch, and
+doubles (up to ``--max-interval``) when it has not, or when fetching fails.
+Fetches go through CacheControl with the shared backend, so they are
+conditional requests whenever the server sent validators.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import feedparser
+import requests
+from cachecontrol.cache import BaseCache
+
+from feedmixer import DEFAULT_TIMEOUT, Document, ParseError, canonical_feeds, parse_document
+
+logger = logging.getLogger(__name__)
+
+
+class NotCrawledError(Exception):
+    """
+    Raised (in read-only mode) for a URL the crawler has not fetched yet.
+    """
+
+    pass
+
+
+class CrawlStore(object):
+    """
+    The documents fetched by the crawler and the URLs subscribed to, kept in
+    a shared cache backend (one which can list its keys: `MemoryCache`,
+    `SqliteCache` or `RedisCache`).
+    """
+
+    DOC_PREFIX = "crawl:doc:"
+    SUB_PREFIX = "crawl:sub:"
+
+    def __init__(self, backend: BaseCache, forget: float = 7 * 86400, touch_interval: float = 300) -> None:
+        """
+        Args:
+            backend: the cache backend shared with the crawler.
+            forget: how long (in seconds) a subscription (and its document)
+                is kept after the URL was last requested.
+            touch_interval: the minimum time (in seconds) between renewals of
+                a subscription by one process.
+        """
+        self.backend = backend
+        self.forget = forget
+        self.touch_interval = touch_interval
+        self._touched = {}  # type: Dict[str, float]
+        self._lock = threading.Lock()
+
+    def put(self, url: str, doc: Document) -> None:
+        """
+        Store the document just fetched from `url`.
+        """
+        # (its Content-Type on the first line, then the raw body)
+        blob = (doc.content_type or "").encode("latin-1", "replace") + b"\n" + doc.content
+        self.backend.set(self.DOC_PREFIX + url, blob, expires=self.forget)
+
+    def get(self, url: str) -> Optional[Document]:
+        """
+        The stored document of `url`, or None.
+        """
+        blob = self.backend.get(self.DOC_PREFIX + url)
+        if blob is None:
+            return None
+        content_type, _, content = blob.partition(b"\n")
+        return Document(content, content_type.decode("latin-1") or None)
+
+    def subscribe(self, url: str) -> None:
+        """
+        Ask the crawler to keep `url` fetched (for another `forget` seconds).
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(url, -self.touch_interval) < self.touch_interval:
+                return
+            self._touched[url] = now
+        self.backend.set(self.SUB_PREFIX + url, b"1", expires=self.forget)
+
+    def subscriptions(self) -> List[str]:
+        """
+        The URLs currently subscribed to.
+        """
+        skip = len(self.SUB_PREFIX)
+        return [key[skip:] for key in self.backend.keys(self.SUB_PREFIX)]
+
+    def fetch(self, url: str) -> Document:
+        """
+        Subscribe to `url` and return its stored document (for use as the
+        `fetch` function of a `FeedMixer`).
+
+        Raises:
+            NotCrawledError: if the crawler has not fetched `url` yet.
+        """
+        self.subscribe(url)
+        doc = self.get(url)
+        if doc is None:
+            raise NotCrawledError("{} has not been crawled yet".format(url))
+        return doc
+
+
+class FeedSchedule(object):
+    """
+    When a feed is next due to be fetched, and what it was last time.
+    """
+
+    __slots__ = ("url", "interval", "due", "digest", "failures")
+
+    def __init__(self, url: str, interval: float, due: float) -> None:
+        self.url = url
+        self.interval = interval
+        self.due = due
+        self.digest = None  # type: Optional[str]
+        self.failures = 0
+
+
+class Crawler(object):
+    """
+    Fetches the subscribed feeds of a `CrawlStore` on adaptive schedules,
+    parses them (warming a shared parser cache) and stores them.
+    """
+
+    def __init__(
+        self,
+        store: CrawlStore,
+        sess: Optional[requests.Session] = None,
+        parser_cache: Optional[Callable[..., feedparser.util.FeedParserDict]] = None,
+        seeds: Iterable[str] = (),
+        min_interval: float = 60,
+        max_interval: float = 3600,
+        timeout: int = DEFAULT_TIMEOUT,
+        max_threads: int = 10,
+        refresh: float = 30,
+    ) -> None:
+        """
+        Args:
+            store: where to store documents and find subscriptions.
+            sess: the requests.session object to fetch with (see the
+                cachecontrol package).
+            parser_cache: the parsing function (e.g. a `SharedParserCache`
+                on the same backend, so the workers need not parse again).
+            seeds: URLs to crawl whether or not they are subscribed to.
+            min_interval: the shortest time between fetches of a feed.
+            max_interval: the longest time between fetches of a feed.
+            timeout: the timeout for http requests in seconds.
+            max_threads: the maximum number of feeds fetched at once.
+            refresh: how often (in seconds) to look for new subscriptions.
+        """
+        self.store = store
+        if sess is None:
+            sess = requests.Session()
+        self.sess = sess
+        self.sess.headers.update({"User-Agent": "feedmixer (github.com/cristoper/feedmixer)"})
+        if parser_cache is None:
+            parser_cache = feedparser.parse
+        self.parser_cache = parser_cache
+        self.seeds = list(seeds)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.max_threads = max_threads
+        self.refresh = refresh
+        self.schedule = {}  # type: Dict[str, FeedSchedule]
+        self._stop = threading.Event()
+
+    def update_subscriptions(self, now: Optional[float] = None) -> None:
+        """
+        Schedule newly subscribed feeds (due at once), and drop those no
+        longer subscribed to.
+        """
+        if now is None:
+            now = time.time()
+        urls = set(self.seeds)
+        urls.update(self.store.subscriptions())
+        for url in urls:
+            if url not in self.schedule:
+                self.schedule[url] = FeedSchedule(url, self.min_interval, now)
+        for url in list(self.schedule):
+            if url not in urls:
+                del self.schedule[url]
+
+    def crawl(self, url: str) -> str:
+        """
+        Fetch, parse and store one feed.
+
+        Returns:
+            A digest of the document.
+        """
+        r = self.sess.get(url, timeout=self.timeout)
+        r.raise_for_status()
+        doc = Document(r.content, r.headers.get("content-type"))
+        f = parse_document(self.parser_cache, doc)
+        if len(f.get("entries") or []) == 0 and f.get("bozo"):
+            raise ParseError("Parse error: {}".format(f.get("bozo_exception")))
+        self.store.put(url, doc)
+        return hashlib.sha1(doc.content).hexdigest()
+
+    def run_once(self, now: Optional[float] = None) -> int:
+        """
+        Crawl every feed which is due, and reschedule it.
+
+        Returns:
+            The number of feeds crawled.
+        """
+        if now is None:
+            now = time.time()
+        due = [s for s in self.schedule.values() if s.due <= now]
+        if not due:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.max_threads) as exec:
+            future_to_sched = {exec.submit(self.crawl, s.url): s for s in due}
+            for future in concurrent.futures.as_completed(future_to_sched):
+                sched = future_to_sched[future]
+                try:
+                    digest = future.result()
+                except Exception as e:
+                    # will be ParseError or RequestException; keep the last
+                    # good document and back off
+                    sched.failures += 1
+                    sched.interval = min(sched.interval * 2, self.max_interval)
+                    logger.info("{} generated an exception: {}".format(sched.url, e))
+                else:
+                    if digest != sched.digest:
+                        sched.interval = max(sched.interval / 2, self.min_interval)
+                    else:
+                        sched.interval = min(sched.interval * 2, self.max_interval)
+                    sched.digest = digest
+                    sched.failures = 0
+                    logger.info("Crawled {} (next in {:.0f}s)".format(sched.url, sched.interval))
+                sched.due = time.time() + sched.interval
+        return len(due)
+
+    def run(self) -> None:
+        """
+        Crawl until `stop` is called.
+        """
+        self._stop.clear()
+        next_refresh = 0.0
+        while not self._stop.is_set():
+            now = time.time()
+            if now >= next_refresh:
+                self.update_subscriptions(now)
+                next_refresh = now + self.refresh
+            self.run_once(now)
+            wake = min([s.due for s in self.schedule.values()] + [next_refresh])
+            self._stop.wait(max(wake - time.time(), 0))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def read_seeds(urls_files: Iterable[str], mixes_files: Iterable[str]) -> List[str]:
+    """
+    The URLs listed in `urls_files` (one per line; blank lines and lines
+    starting with '#' are skipped) and the feeds of the named mixes in
+    `mixes_files` (see `feedmixer_api.load_mixes`), canonicalized (as
+    FeedMixer does, so that they match the URLs it subscribes to) and
+    deduplicated.
+    """
+    seeds = []  # type: List[str]
+    for path in urls_files:
+        with open(path, "r") as f:
+            seeds += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if mixes_files:
+        from feedmixer_api import load_mixes
+
+        for path in mixes_files:
+            for mix in load_mixes(path).values():
+                seeds += mix.f
+    return canonical_feeds(seeds)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import cachecontrol
+
+    from feedmixer_cache import SharedParserCache, open_cache
+
+    parser = argparse.ArgumentParser(description="Keep feeds fetched in a shared FeedMixer cache backend.")
+    parser.add_argument(
+        "--backend",
+        default=os.environ.get("FM_CACHE_BACKEND"),
+        help="cache backend URL (default: $FM_CACHE_BACKEND)",
+    )
+    parser.add_argument("--urls", action="append", default=[], help="file of URLs to crawl, one per line")
+    parser.add_argument("--mixes", action="append", default=[], help="named mixes file whose feeds to crawl")
+    parser.add_argument("--min-interval", type=float, default=60)
+    parser.add_argument("--max-interval", type=float, default=3600)
+    parser.add_argument("--forget", type=float, default=7 * 86400, help="seconds to keep unrequested URLs")
+    parser.add_argument("--refresh", type=float, default=30, help="seconds between subscription checks")
+    parser.add_argument("--timeout", type=int, default=int(os.environ.get("FM_TIMEOUT", DEFAULT_TIMEOUT)))
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--once", action="store_true", help="crawl every feed once and exit")
+    parser.add_argument("--log-level", default=os.environ.get("FM_LOG_LEVEL", "INFO").upper())
+    args = parser.parse_args(argv)
+
+    if not args.backend:
+        parser.error("a shared cache backend is required (--backend or FM_CACHE_BACKEND)")
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=args.log_level,
+        format="%(name)s: %(asctime)s %(levelname)s:%(message)s",
+    )
+
+    backend = open_cache(args.backend)
+    crawler = Crawler(
+        CrawlStore(backend, forget=args.forget),
+        sess=cachecontrol.CacheControl(requests.session(), cache=backend),
+        parser_cache=SharedParserCache(backend),
+        seeds=read_seeds(args.urls, args.mixes),
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        timeout=args.timeout,
+        max_threads=args.threads,
+        refresh=args.refresh,
+    )
+    if args.once:
+        crawler.update_subscriptions()
+        crawler.run_once()
+        return
+    try:
+        crawler.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -16,19 +16,30 @@ because it creates the logfiles ('fm.log' and 'fm.log.1') there.
 .. _gunicorn: http://gunicorn.org/
 """
 
+import atexit
 import functools
 import logging
+import logging.handlers
 import os
+import queue
+import random
 import sys
+from typing import Optional
 
 import cachecontrol
 import requests
 import feedparser
 
-from feedmixer_api import wsgi_app
+from feedmixer import JSON_BACKENDS, EntryStore, Hedger, LatencyTracker
+from feedmixer_api import AdmissionControl, NamedMixes, load_mixes, wsgi_app
+from cachecontrol.cache import DictCache
 
 # envar configs
 ALLOW_CORS = bool(os.environ.get("FM_ALLOW_CORS"))
+COMPRESS = bool(os.environ.get("FM_COMPRESS"))
+DEBUG_MEMORY = bool(os.environ.get("FM_DEBUG_MEMORY"))
+NATIVE_XML = bool(os.environ.get("FM_NATIVE_XML"))
+READ_ONLY = bool(os.environ.get("FM_READ_ONLY"))
 LOG_LEVEL_NAME = os.environ.get("FM_LOG_LEVEL", "INFO").upper()
 LOG_LEVEL = logging.getLevelName(LOG_LEVEL_NAME)
 if not isinstance(LOG_LEVEL, int):
@@ -38,6 +49,15 @@ if not isinstance(LOG_LEVEL, int):
     )
     LOG_LEVEL = logging.INFO
 
+try:
+    LOG_SAMPLE = float(os.environ.get("FM_LOG_SAMPLE", "1"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid log sample value '{os.environ.get('FM_LOG_SAMPLE')}'. Defaulting to 1.",
+        file=sys.stderr,
+    )
+    LOG_SAMPLE = 1
+
 try:
     TIMEOUT = int(os.environ.get("FM_TIMEOUT", "30"))
 except ValueError:
@@ -47,6 +67,42 @@ except ValueError:
     )
     TIMEOUT = 30
 
+try:
+    TIMEOUT_FACTOR = float(os.environ.get("FM_TIMEOUT_FACTOR", "4"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid timeout factor value '{os.environ.get('FM_TIMEOUT_FACTOR')}'. Defaulting to 4.",
+        file=sys.stderr,
+    )
+    TIMEOUT_FACTOR = 4
+
+try:
+    MIN_TIMEOUT = float(os.environ.get("FM_MIN_TIMEOUT", "2"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid min timeout value '{os.environ.get('FM_MIN_TIMEOUT')}'. Defaulting to 2.",
+        file=sys.stderr,
+    )
+    MIN_TIMEOUT = 2
+
+try:
+    MAX_TIMEOUT = float(os.environ.get("FM_MAX_TIMEOUT", str(TIMEOUT)))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid max timeout value '{os.environ.get('FM_MAX_TIMEOUT')}'. Defaulting to {TIMEOUT}.",
+        file=sys.stderr,
+    )
+    MAX_TIMEOUT = TIMEOUT
+
+try:
+    HEDGE = float(os.environ.get("FM_HEDGE", "0"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid hedge budget value '{os.environ.get('FM_HEDGE')}'. Defaulting to 0.",
+        file=sys.stderr,
+    )
+    HEDGE = 0
+
 
 try:
     CACHE_SIZE = int(os.environ.get("FM_CACHE_SIZE", "128"))
@@ -58,40 +114,305 @@ except ValueError:
     CACHE_SIZE = 128
 
 
-# Application-wide memoized parser
-PARSER_CACHE = functools.lru_cache(maxsize=CACHE_SIZE)(
-    feedparser.parse
-)
+try:
+    MIXES_REFRESH = float(os.environ.get("FM_MIXES_REFRESH", "300"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid mixes refresh value '{os.environ.get('FM_MIXES_REFRESH')}'. Defaulting to 300.",
+        file=sys.stderr,
+    )
+    MIXES_REFRESH = 300
 
+MIXES_FILE = os.environ.get("FM_MIXES_FILE")
 
-# All requests share a requests.session object so they can share a CacheControl cache
-SESS = cachecontrol.CacheControl(requests.session())
+CACHE_BACKEND = os.environ.get("FM_CACHE_BACKEND")
 
+SNAPSHOT_FILE = os.environ.get("FM_SNAPSHOT_FILE")
 
-def application(environ, start_response):
+try:
+    SNAPSHOT_INTERVAL = float(os.environ.get("FM_SNAPSHOT_INTERVAL", "300"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid snapshot interval value '{os.environ.get('FM_SNAPSHOT_INTERVAL')}'. Defaulting to 300.",
+        file=sys.stderr,
+    )
+    SNAPSHOT_INTERVAL = 300
+
+try:
+    RENDER_TTL = int(os.environ.get("FM_RENDER_TTL", "0"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid render TTL value '{os.environ.get('FM_RENDER_TTL')}'. Defaulting to 0.",
+        file=sys.stderr,
+    )
+    RENDER_TTL = 0
+
+try:
+    MAX_MIXES = int(os.environ.get("FM_MAX_MIXES", "0"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid max mixes value '{os.environ.get('FM_MAX_MIXES')}'. Defaulting to 0.",
+        file=sys.stderr,
+    )
+    MAX_MIXES = 0
+
+try:
+    MAX_FETCHES = int(os.environ.get("FM_MAX_FETCHES", "0"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid max fetches value '{os.environ.get('FM_MAX_FETCHES')}'. Defaulting to 0.",
+        file=sys.stderr,
+    )
+    MAX_FETCHES = 0
+
+try:
+    CLIENT_RATE = float(os.environ.get("FM_CLIENT_RATE", "0"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid client rate value '{os.environ.get('FM_CLIENT_RATE')}'. Defaulting to 0.",
+        file=sys.stderr,
+    )
+    CLIENT_RATE = 0
+
+try:
+    CLIENT_BURST = int(os.environ.get("FM_CLIENT_BURST", "10"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid client burst value '{os.environ.get('FM_CLIENT_BURST')}'. Defaulting to 10.",
+        file=sys.stderr,
+    )
+    CLIENT_BURST = 10
+
+try:
+    TRUSTED_PROXIES = int(os.environ.get("FM_TRUSTED_PROXIES", "0"))
+except ValueError:
+    print(
+        f"feedmixer_wsgi: Invalid trusted proxies value '{os.environ.get('FM_TRUSTED_PROXIES')}'. Defaulting to 0.",
+        file=sys.stderr,
+    )
+    TRUSTED_PROXIES = 0
+
+JSON_BACKEND = os.environ.get("FM_JSON_BACKEND") or None
+if JSON_BACKEND is not None and JSON_BACKEND not in JSON_BACKENDS:
+    print(
+        f"feedmixer_wsgi: JSON backend '{JSON_BACKEND}' is not available. Defaulting to jsonfeed.",
+        file=sys.stderr,
+    )
+    JSON_BACKEND = None
+
+
+class SampleFilter(logging.Filter):
+    """
+    Passes a random `rate` fraction of the records below WARNING, and every
+    record at or above it.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class LogListener(object):
     """
-    Wrap the main WSGI app to set up logging to stderr.
+    Writes the records queued by `LOG_QUEUE`'s handler to `handler` from a
+    background thread, started once per (forked worker) process.
     """
-    # Log to stderr
-    handler = logging.StreamHandler(sys.stderr)
-    format_str = "%(name)s: "
-    format_str += "%(asctime)s %(levelname)s:%(message)s"
-    formatter = logging.Formatter(format_str)
-    handler.setFormatter(formatter)
-    handler.setLevel(LOG_LEVEL)
-    root_logger = logging.getLogger()
-    root_logger.setLevel(LOG_LEVEL)
-    root_logger.handlers = []
-    root_logger.addHandler(handler)
-
-    # setup and return actual app:
-    api = wsgi_app(
+
+    def __init__(self, log_queue: queue.SimpleQueue, handler: logging.Handler) -> None:
+        self.queue = log_queue
+        self.handler = handler
+        self._listener = None  # type: Optional[logging.handlers.QueueListener]
+        self._pid = None  # type: Optional[int]
+
+    def start(self) -> None:
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._listener = logging.handlers.QueueListener(self.queue, self.handler)
+        self._listener.start()
+        # (a forked child inherits its parent's exit handlers)
+        atexit.unregister(self.stop)
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Write out the queued records and stop the thread.
+        """
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+        self._pid = None
+
+
+# Log to stderr without blocking: request threads only put records on a queue
+# (after sampling, if FM_LOG_SAMPLE < 1) and a listener thread writes them
+LOG_QUEUE = queue.SimpleQueue()  # type: queue.SimpleQueue
+_stderr_handler = logging.StreamHandler(sys.stderr)
+_stderr_handler.setFormatter(logging.Formatter("%(name)s: %(asctime)s %(levelname)s:%(message)s"))
+_queue_handler = logging.handlers.QueueHandler(LOG_QUEUE)
+_queue_handler.setLevel(LOG_LEVEL)
+if LOG_SAMPLE < 1:
+    _queue_handler.addFilter(SampleFilter(LOG_SAMPLE))
+logging.getLogger().setLevel(LOG_LEVEL)
+logging.getLogger().handlers = [_queue_handler]
+LOG_LISTENER = LogListener(LOG_QUEUE, _stderr_handler)
+LOG_LISTENER.start()
+
+
+# A cache backend shared by all the workers (see feedmixer_cache), if configured
+# (feedmixer_cache and feedmixer_crawler are only imported when configured, to
+# keep worker startup quick)
+SHARED_CACHE = None
+if CACHE_BACKEND:
+    from feedmixer_cache import open_cache
+
+    SHARED_CACHE = open_cache(CACHE_BACKEND)
+
+
+# In read-only mode feeds are only read from the documents stored by the
+# crawler (see feedmixer_crawler), which needs a backend it can share
+FETCH = None
+if READ_ONLY:
+    from feedmixer_cache import MemoryCache
+
+    if SHARED_CACHE is None or isinstance(SHARED_CACHE, MemoryCache):
+        print(
+            "feedmixer_wsgi: FM_READ_ONLY requires a shared FM_CACHE_BACKEND (sqlite or redis). Ignoring it.",
+            file=sys.stderr,
+        )
+    else:
+        from feedmixer_crawler import CrawlStore
+
+        FETCH = CrawlStore(SHARED_CACHE).fetch
+
+
+# Application-wide memoized parser (whose results are also shared through the
+# backend, if there is one, or kept where they can be snapshotted)
+PARSED_CACHE = None
+if SHARED_CACHE is not None:
+    from feedmixer_cache import SharedParserCache
+
+    PARSER_CACHE = SharedParserCache(SHARED_CACHE, maxsize=CACHE_SIZE)
+elif SNAPSHOT_FILE:
+    from feedmixer_cache import MemoryCache, SharedParserCache
+
+    PARSED_CACHE = MemoryCache(maxsize=CACHE_SIZE)
+    PARSER_CACHE = SharedParserCache(PARSED_CACHE, maxsize=CACHE_SIZE)
+else:
+    PARSER_CACHE = functools.lru_cache(maxsize=CACHE_SIZE)(
+        feedparser.parse
+    )
+
+
+# Application-wide store of extracted entries, so refreshing a feed only
+# processes its new entries
+ENTRY_STORE = EntryStore(maxsize=CACHE_SIZE)
+
+# Application-wide fetch latency estimates, so the slowest feeds of a mix are
+# fetched first and each host gets a timeout adapted to its response times
+LATENCIES = LatencyTracker(timeout_factor=TIMEOUT_FACTOR, min_timeout=MIN_TIMEOUT, max_timeout=MAX_TIMEOUT)
+
+# Fetches slower than their host's 95th percentile are hedged with a second
+# request, for at most FM_HEDGE of all requests (opt-in)
+HEDGER = Hedger(budget=HEDGE) if HEDGE > 0 else None
+
+
+# All requests share a requests.session object so they can share a CacheControl
+# cache (kept in the shared backend, if there is one)
+HTTP_CACHE = SHARED_CACHE if SHARED_CACHE is not None else DictCache()
+SESS = cachecontrol.CacheControl(requests.session(), cache=HTTP_CACHE)
+
+
+# Snapshots of the in-process caches, so that restarted workers come up warm
+SNAPSHOTS = None
+if SNAPSHOT_FILE:
+    from feedmixer_cache import MemoryCache, Snapshotter
+
+    if SHARED_CACHE is None:
+        SNAPSHOTS = Snapshotter(
+            SNAPSHOT_FILE, {"http": HTTP_CACHE, "parsed": PARSED_CACHE}, interval=SNAPSHOT_INTERVAL
+        )
+    elif isinstance(SHARED_CACHE, MemoryCache):
+        SNAPSHOTS = Snapshotter(SNAPSHOT_FILE, {"shared": SHARED_CACHE}, interval=SNAPSHOT_INTERVAL)
+    else:
+        print(
+            "feedmixer_wsgi: FM_SNAPSHOT_FILE is ignored: the cache backend is already persistent.",
+            file=sys.stderr,
+        )
+    if SNAPSHOTS is not None:
+        SNAPSHOTS.load()
+
+
+# Named mixes (served from /mix/<name>.<type>) are kept rendered in memory
+NAMED_MIXES = None
+if MIXES_FILE:
+    NAMED_MIXES = NamedMixes(
+        load_mixes(MIXES_FILE, refresh=MIXES_REFRESH),
         sess=SESS,
-        allow_cors=ALLOW_CORS,
         timeout=TIMEOUT,
         parser_cache=PARSER_CACHE,
+        entry_store=ENTRY_STORE,
+        compress=COMPRESS,
+        native_xml=NATIVE_XML,
+        json_backend=JSON_BACKEND,
+        fetch=FETCH,
+        latencies=LATENCIES,
+        hedger=HEDGER,
     )
-    return api(environ, start_response)
+
+
+# Admission control (per worker process), if any limit is configured; refused
+# requests are answered with a stale copy of their feed when there is one
+ADMISSION = None
+if MAX_MIXES or MAX_FETCHES or CLIENT_RATE:
+    ADMISSION = AdmissionControl(
+        max_mixes=MAX_MIXES,
+        max_fetches=MAX_FETCHES,
+        rate=CLIENT_RATE,
+        burst=CLIENT_BURST,
+        stale_cache=SHARED_CACHE,
+        trusted_proxies=TRUSTED_PROXIES,
+    )
+
+
+# The app is built once per process (so that per-app state such as the cache
+# of compressed responses is shared by all requests)
+FALCON_APP = wsgi_app(
+    sess=SESS,
+    allow_cors=ALLOW_CORS,
+    timeout=TIMEOUT,
+    parser_cache=PARSER_CACHE,
+    entry_store=ENTRY_STORE,
+    compress=COMPRESS,
+    debug_memory=DEBUG_MEMORY,
+    named_mixes=NAMED_MIXES,
+    native_xml=NATIVE_XML,
+    json_backend=JSON_BACKEND,
+    fetch=FETCH,
+    render_cache=SHARED_CACHE,
+    render_ttl=RENDER_TTL,
+    admission=ADMISSION,
+    latencies=LATENCIES,
+    hedger=HEDGER,
+)
+
+
+def application(environ, start_response):
+    """
+    Wrap the main WSGI app to start the per-process background threads (the
+    log listener, named mix refreshes and cache snapshots).
+    """
+    # (re)started lazily so that each forked worker gets its own threads
+    LOG_LISTENER.start()
+    if NAMED_MIXES is not None:
+        NAMED_MIXES.start()
+    if SNAPSHOTS is not None:
+        SNAPSHOTS.start()
+
+    return FALCON_APP(environ, start_response)
 
 
 api = application
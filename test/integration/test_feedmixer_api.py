@@ -1,10 +1,23 @@
+import datetime
+import functools
+import gzip
 import json
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock
 from urllib.parse import unquote
 
+import falcon
 import feedparser
+import requests
 from falcon import testing
+from requests.exceptions import RequestException
 
 import feedmixer_api
+from feedmixer_cache import MemoryCache
 
 
 def build_qs(feeds=[], n=-1, full=False):
@@ -105,3 +118,500 @@ class TestAtom(FMTestCase):
         e_full_desc = e_full.get("description")
         self.assertEqual(eid, e_full.get("id"))
         self.assertTrue(len(e_desc) < len(e_full_desc))
+
+
+class TestMemoryDebug(testing.TestCase):
+    def test_disabled_by_default(self):
+        app = feedmixer_api.wsgi_app()
+        result = testing.TestClient(app).simulate_get("/debug/memory")
+        self.assertEqual(result.status_code, 404)
+
+    def test_report(self):
+        parser_cache = functools.lru_cache(maxsize=4)(feedparser.parse)
+        app = feedmixer_api.wsgi_app(parser_cache=parser_cache, debug_memory=True)
+        try:
+            result = testing.TestClient(app).simulate_get(
+                "/debug/memory", query_string="limit=3"
+            )
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(result.status_code, 200)
+        report = result.json
+        self.assertLessEqual(len(report["top"]), 3)
+        self.assertIn("traced_bytes", report)
+        self.assertEqual(report["caches"]["parser_cache"]["maxsize"], 4)
+
+    def test_bad_group(self):
+        app = feedmixer_api.wsgi_app(debug_memory=True)
+        try:
+            result = testing.TestClient(app).simulate_get(
+                "/debug/memory", query_string="group=nope"
+            )
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(result.status_code, 400)
+
+
+def build_stub_session():
+    """
+    A session which serves the test feeds for the URLs 'atom' and 'rss' and
+    raises a RequestException for any other URL.
+    """
+    docs = {}
+    for url, path in (("atom", "test/test_atom.xml"), ("rss", "test/test_rss2.xml")):
+        with open(path, "r") as f:
+            docs[url] = f.read()
+
+    def mock_fetch(url, **kwargs):
+        if url not in docs:
+            raise RequestException("fetch error")
+        resp = MagicMock(spec=requests.Response)
+        resp.content = docs[url].encode("utf-8")
+        resp.headers = {"content-type": "application/xml"}
+        return resp
+
+    stub_session = MagicMock(spec=requests.session())
+    stub_session.get = MagicMock(side_effect=mock_fetch)
+    return stub_session
+
+
+class TestBatch(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sess = build_stub_session()
+        self.app = feedmixer_api.wsgi_app(sess=self.sess)
+
+    def test_batch(self):
+        mixes = [
+            {"f": ["atom", "rss"], "n": 1, "ftype": "atom"},
+            {"f": ["atom"], "n": 2, "ftype": "json"},
+            {"f": ["rss", "fetcherror"], "n": 3, "full": True, "ftype": "rss"},
+        ]
+        result = self.simulate_post("/batch", json=mixes)
+        self.assertEqual(result.status_code, 200)
+        out = result.json["mixes"]
+        self.assertEqual(len(out), 3)
+
+        # the union of the URLs is only fetched once
+        self.assertEqual(self.sess.get.call_count, 3)
+
+        atom = feedparser.parse(out[0]["feed"])
+        self.assertEqual(out[0]["content_type"], "application/atom+xml")
+        self.assertEqual(len(atom.entries), 2)
+        self.assertEqual(out[0]["errors"], {})
+
+        self.assertEqual(out[1]["content_type"], "application/json")
+        self.assertEqual(len(json.loads(out[1]["feed"])["items"]), 2)
+
+        rss = feedparser.parse(out[2]["feed"])
+        self.assertEqual(len(rss.entries), 3)
+        self.assertIn("fetcherror", out[2]["errors"])
+
+    def test_no_feeds(self):
+        result = self.simulate_post("/batch", json=[{"f": []}])
+        self.assertEqual(result.status_code, 200)
+        self.assertIsInstance(result.json["mixes"][0]["errors"], str)
+
+    def test_invalid(self):
+        for body in ({"f": "atom"}, [{"f": ["atom"], "ftype": "html"}], [{"n": "x"}], ["atom"]):
+            result = self.simulate_post("/batch", json=body)
+            self.assertEqual(result.status_code, 400, body)
+
+
+class TestNamedMixes(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sess = build_stub_session()
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(
+                {
+                    "both": {"title": "Both", "feeds": ["atom", "rss"], "n": 1},
+                    "broken": {"feeds": ["atom", "fetcherror"], "n": 2, "refresh": 60},
+                },
+                f,
+            )
+        self.addCleanup(os.remove, f.name)
+        self.named = feedmixer_api.NamedMixes(
+            feedmixer_api.load_mixes(f.name), sess=self.sess
+        )
+        self.app = feedmixer_api.wsgi_app(sess=self.sess, named_mixes=self.named)
+
+    def test_load_mixes(self):
+        self.assertEqual(self.named.mixes["both"].f, ["atom", "rss"])
+        self.assertEqual(self.named.mixes["both"].refresh, 300)
+        self.assertEqual(self.named.mixes["broken"].refresh, 60)
+        self.assertEqual(self.named.mixes["broken"].title, "broken")
+
+    def test_load_invalid_mixes(self):
+        for raw in (["atom"], {"list": ["atom", "rss"]}, {"empty": {"feeds": []}}):
+            with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+                json.dump(raw, f)
+            self.addCleanup(os.remove, f.name)
+            with self.assertRaises(ValueError, msg=raw):
+                feedmixer_api.load_mixes(f.name)
+
+    def test_serve_precomputed(self):
+        for ftype in ("atom", "rss", "json"):
+            result = self.simulate_get("/mix/both.{}".format(ftype))
+            self.assertEqual(result.status_code, 200)
+        atom = feedparser.parse(self.simulate_get("/mix/both.atom").text)
+        self.assertEqual(atom.feed.title, "Both")
+        self.assertEqual(len(atom.entries), 2)
+        # every format was rendered from a single fetch of each feed
+        self.assertEqual(self.sess.get.call_count, 2)
+
+    def test_errors(self):
+        result = self.simulate_get("/mix/broken.json")
+        errors = json.loads(unquote(result.headers["x-fm-errors"]))
+        self.assertIn("fetcherror", errors)
+
+    def test_not_found(self):
+        self.assertEqual(self.simulate_get("/mix/nope.atom").status_code, 404)
+        self.assertEqual(self.simulate_get("/mix/both.html").status_code, 404)
+
+    def test_refresh_thread(self):
+        self.named.start()
+        self.addCleanup(self.named.stop)
+        for _ in range(100):
+            if self.sess.get.call_count >= 4:
+                break
+            time.sleep(0.01)
+        result = self.simulate_get("/mix/both.rss")
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(self.sess.get.call_count, 4)
+
+
+class TestSince(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.app = feedmixer_api.wsgi_app(sess=build_stub_session())
+
+    def test_since(self):
+        # the test Atom feed's three newest entries were published in 2016,
+        # January 2015 and December 2014
+        qs = build_qs(feeds=["atom"], n=0) + "&since=2015-01-01T00:00:00Z"
+        result = self.simulate_get("/json", query_string=qs)
+        self.assertEqual(len(result.json["items"]), 2)
+
+        qs = build_qs(feeds=["atom"], n=0) + "&since=1420070400"
+        result = self.simulate_get("/json", query_string=qs)
+        self.assertEqual(len(result.json["items"]), 2)
+
+    def test_cursor(self):
+        qs = build_qs(feeds=["atom", "rss"], n=5)
+        first = self.simulate_get("/json", query_string=qs)
+        self.assertEqual(len(first.json["items"]), 10)
+        cursor = first.headers["x-fm-cursor"]
+
+        # nothing is newer than what we already have
+        second = self.simulate_get("/json", query_string=qs + "&cursor=" + cursor)
+        self.assertEqual(second.json["items"], [])
+        self.assertEqual(second.headers["x-fm-cursor"], cursor)
+
+        # a cursor from before the newest entry returns just that one
+        since = feedmixer_api.decode_cursor(cursor) - datetime.timedelta(seconds=1)
+        qs += "&cursor=" + feedmixer_api.encode_cursor(since)
+        third = self.simulate_get("/json", query_string=qs)
+        self.assertEqual(len(third.json["items"]), 1)
+        self.assertEqual(third.headers["x-fm-cursor"], cursor)
+
+    def test_digits(self):
+        """
+        Test that 4 and 8 digits are an ISO 8601 year and date, not seconds
+        since the epoch.
+        """
+        self.assertEqual(feedmixer_api.parse_since("2024"), datetime.datetime(2024, 1, 1))
+        self.assertEqual(feedmixer_api.parse_since("20240501"), datetime.datetime(2024, 5, 1))
+        self.assertEqual(feedmixer_api.parse_since("1714521600"), datetime.datetime(2024, 5, 1))
+        self.assertEqual(feedmixer_api.parse_since("86400.0"), datetime.datetime(1970, 1, 2))
+
+        qs = build_qs(feeds=["atom"], n=0) + "&since=2015"
+        result = self.simulate_get("/json", query_string=qs)
+        self.assertEqual(len(result.json["items"]), 2)
+
+    def test_invalid(self):
+        qs = build_qs(feeds=["atom"])
+        for param in ("since=yesterday", "since=123456", "cursor=bm9wZQ"):
+            result = self.simulate_get("/json", query_string=qs + "&" + param)
+            self.assertEqual(result.status_code, 400, param)
+
+
+class TestFields(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.app = feedmixer_api.wsgi_app(sess=build_stub_session())
+
+    def test_fields(self):
+        qs = build_qs(feeds=["atom"], n=2)
+        full = self.simulate_get("/json", query_string=qs)
+        titles = self.simulate_get("/json", query_string=qs + "&fields=title,link")
+        self.assertEqual([i["title"] for i in titles.json["items"]], [i["title"] for i in full.json["items"]])
+        self.assertNotIn("content_html", titles.json["items"][0])
+        self.assertLess(len(titles.content), len(full.content))
+
+        result = self.simulate_get("/json", query_string=qs + "&fields=body")
+        self.assertEqual(result.status_code, 400)
+
+    def test_batch_fields(self):
+        mixes = [{"f": ["atom"], "n": 1, "fields": ["title"]}]
+        result = self.simulate_post("/batch", json=mixes)
+        item = json.loads(result.json["mixes"][0]["feed"])["items"][0]
+        self.assertNotIn("content_html", item)
+        for fields in (["body"], [1]):
+            result = self.simulate_post("/batch", json=[{"f": ["atom"], "fields": fields}])
+            self.assertEqual(result.status_code, 400, fields)
+
+
+class TestStream(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.app = feedmixer_api.wsgi_app(sess=build_stub_session())
+
+    def test_stream(self):
+        qs = build_qs(feeds=["atom", "rss", "fetcherror"], n=2)
+        result = self.simulate_get("/stream", query_string=qs)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers["content-type"], "application/x-ndjson")
+        records = [json.loads(line) for line in result.text.splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual({r["feed"] for r in records[:2]}, {"atom", "rss"})
+        # (the same items as the JSON feed has for each)
+        for r in records[:2]:
+            mixed = self.simulate_get("/json", query_string=build_qs(feeds=[r["feed"]], n=2)).json
+            self.assertEqual(r["items"], mixed["items"])
+        self.assertEqual(list(records[2]["errors"]), ["fetcherror"])
+        self.assertIn("cursor", records[2])
+
+    def test_no_feeds(self):
+        result = self.simulate_get("/stream")
+        self.assertEqual(json.loads(result.text), {"errors": "No feeds were provided in query string parameters."})
+
+
+class TestCompression(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.app = feedmixer_api.wsgi_app(sess=build_stub_session(), compress=True)
+        # (the RSS test feed has an undated entry, which is given the current
+        # time when rendered, so it is left out to get identical renderings)
+        self.qs = build_qs(feeds=["atom"], n=3, full=True)
+
+    def test_uncompressed(self):
+        result = self.simulate_get("/atom", query_string=self.qs)
+        self.assertNotIn("content-encoding", result.headers)
+        self.assertIn("Accept-Encoding", result.headers["vary"])
+        self.assertEqual(len(feedparser.parse(result.text).entries), 3)
+
+    def test_gzip(self):
+        plain = self.simulate_get("/atom", query_string=self.qs)
+        result = self.simulate_get(
+            "/atom", query_string=self.qs, headers={"Accept-Encoding": "gzip, deflate"}
+        )
+        self.assertEqual(result.headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(result.content), plain.content)
+        self.assertLess(len(result.content), len(plain.content))
+
+    def test_compressed_once(self):
+        compression = feedmixer_api.CompressedVariants()
+        data = b"<feed>" + b"x" * 4096 + b"</feed>"
+        first = compression.get(data, "gzip")
+        self.assertIs(compression.get(data, "gzip"), first)
+
+    def test_render_cache_variants(self):
+        """
+        Test that rendered feeds are kept in the render cache with their
+        compressed variants, which cache hits are served from.
+        """
+        cache = MemoryCache()
+        sess = build_stub_session()
+        self.app = feedmixer_api.wsgi_app(sess=sess, compress=True, render_cache=cache, render_ttl=60)
+        first = self.simulate_get("/atom", query_string=self.qs, headers={"Accept-Encoding": "gzip"})
+        (key,) = [k for k in cache._items if k.startswith("rendered:")]
+        data, headers, compressed = feedmixer_api.unpack_rendered(cache.get(key))
+        self.assertEqual(set(compressed), set(feedmixer_api.ENCODINGS))
+        self.assertEqual(gzip.decompress(compressed["gzip"]), data)
+
+        calls = sess.get.call_count
+        second = self.simulate_get("/atom", query_string=self.qs, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(sess.get.call_count, calls)
+        self.assertEqual(second.headers["content-encoding"], "gzip")
+        self.assertEqual(second.content, compressed["gzip"])
+        self.assertEqual(second.content, first.content)
+
+    def test_pack_rendered(self):
+        headers = [("X-fm-cursor", "abc")]
+        compressed = {"gzip": b"\x1f\x8b\n", "br": b"\n\x00"}
+        blob = feedmixer_api.pack_rendered(b"<feed>\n</feed>", headers, compressed)
+        self.assertEqual(feedmixer_api.unpack_rendered(blob), (b"<feed>\n</feed>", headers, compressed))
+        self.assertEqual(feedmixer_api.unpack_rendered(feedmixer_api.pack_rendered(b"", [])), (b"", [], {}))
+
+    def test_accepted_encoding(self):
+        accept = feedmixer_api.accepted_encoding
+        self.assertIsNone(accept(None))
+        self.assertIsNone(accept("identity"))
+        self.assertIsNone(accept("gzip;q=0"))
+        self.assertEqual(accept("*"), feedmixer_api.ENCODINGS[0])
+        self.assertEqual(accept("deflate, gzip;q=0.5"), "gzip")
+        self.assertEqual(accept("br;q=0.1, gzip"), "gzip")
+
+    @unittest.skipIf(feedmixer_api.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        result = self.simulate_get(
+            "/atom", query_string=self.qs, headers={"Accept-Encoding": "gzip, br"}
+        )
+        self.assertEqual(result.headers["content-encoding"], "br")
+
+    def test_named_mix_precompressed(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"both": {"feeds": ["atom", "rss"], "n": 3, "full": True}}, f)
+        self.addCleanup(os.remove, f.name)
+        named = feedmixer_api.NamedMixes(
+            feedmixer_api.load_mixes(f.name), sess=build_stub_session(), compress=True
+        )
+        rendered = named.get("both", "rss")
+        self.assertEqual(set(rendered.compressed), set(feedmixer_api.ENCODINGS))
+
+        app = feedmixer_api.wsgi_app(sess=build_stub_session(), named_mixes=named)
+        result = testing.TestClient(app).simulate_get(
+            "/mix/both.rss", headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(result.headers["content-encoding"], "gzip")
+        self.assertEqual(result.content, rendered.compressed["gzip"])
+
+
+class TestNativeXML(testing.TestCase):
+    def test_same_output(self):
+        """
+        Test that the native serializer serves the same Atom and RSS as
+        feedgenerator.
+        """
+        qs = build_qs(feeds=["atom"], n=3, full=False)
+        native = testing.TestClient(feedmixer_api.wsgi_app(sess=build_stub_session(), native_xml=True))
+        plain = testing.TestClient(feedmixer_api.wsgi_app(sess=build_stub_session()))
+        for path in ("/atom", "/rss"):
+            expected = plain.simulate_get(path, query_string=qs).text
+            self.assertEqual(native.simulate_get(path, query_string=qs).text, expected)
+
+
+class TestRenderCache(testing.TestCase):
+    def test_cached_render(self):
+        """
+        Test that an identical request is served from the render cache without
+        fetching, with the same headers.
+        """
+        sess = build_stub_session()
+        self.app = feedmixer_api.wsgi_app(sess=sess, render_cache=MemoryCache(), render_ttl=60)
+        qs = build_qs(feeds=["atom", "fetcherror"], n=2)
+        first = self.simulate_get("/atom", query_string=qs)
+        calls = sess.get.call_count
+        second = self.simulate_get("/atom", query_string=qs)
+        self.assertEqual(sess.get.call_count, calls)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.headers["x-fm-errors"], first.headers["x-fm-errors"])
+
+        # a different mix is rendered
+        self.simulate_get("/atom", query_string=build_qs(feeds=["atom"], n=1))
+        self.assertGreater(sess.get.call_count, calls)
+
+    def test_equivalent_requests(self):
+        """
+        Test that requests for the same mix with the feeds in another order
+        or repeated share a rendered feed.
+        """
+        sess = build_stub_session()
+        self.app = feedmixer_api.wsgi_app(sess=sess, render_cache=MemoryCache(), render_ttl=60)
+        first = self.simulate_get("/atom", query_string=build_qs(feeds=["atom", "rss"], n=1))
+        calls = sess.get.call_count
+        second = self.simulate_get("/atom", query_string=build_qs(feeds=["rss", "atom", "rss"], n=1))
+        self.assertEqual(sess.get.call_count, calls)
+        self.assertEqual(second.content, first.content)
+
+
+class TestAdmission(testing.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admission = feedmixer_api.AdmissionControl(max_mixes=1, max_fetches=3, retry_after=7)
+        self.app = feedmixer_api.wsgi_app(sess=build_stub_session(), admission=self.admission)
+        self.qs = build_qs(feeds=["atom", "rss"], n=1)
+
+    def test_max_mixes(self):
+        self.admission.acquire("other", 0)
+        result = self.simulate_get("/atom", query_string=self.qs)
+        self.assertEqual(result.status_code, 503)
+        self.assertEqual(result.headers["retry-after"], "7")
+        self.assertEqual(self.simulate_post("/batch", json=[{"f": ["atom"]}]).status_code, 503)
+
+        self.admission.release(0)
+        self.assertEqual(self.simulate_get("/atom", query_string=self.qs).status_code, 200)
+        self.assertEqual((self.admission.mixes, self.admission.fetches), (0, 0))
+
+    def test_max_fetches(self):
+        self.admission.max_mixes = 0
+        self.admission.acquire("other", 2)
+        self.assertEqual(self.simulate_get("/atom", query_string=self.qs).status_code, 503)
+        self.admission.release(2)
+        # (a mix bigger than the limit is admitted when nothing else is
+        # pending)
+        qs = build_qs(feeds=["atom", "rss", "atom", "rss"], n=1)
+        self.assertEqual(self.simulate_get("/atom", query_string=qs).status_code, 200)
+
+    def test_stream(self):
+        self.admission.acquire("other", 0)
+        self.assertEqual(self.simulate_get("/stream", query_string=self.qs).status_code, 503)
+        self.admission.release(0)
+        self.assertEqual(self.simulate_get("/stream", query_string=self.qs).status_code, 200)
+        # (released once the stream has been written)
+        self.assertEqual((self.admission.mixes, self.admission.fetches), (0, 0))
+
+    def test_stream_closed_unread(self):
+        """
+        Test that a stream which is closed before it is read (as when the
+        client has gone away) releases its admission.
+        """
+        resource = feedmixer_api.StreamedMix(sess=build_stub_session(), admission=self.admission)
+        resp = falcon.Response()
+        resource.on_get(testing.create_req(path="/stream", query_string=self.qs), resp)
+        self.assertEqual(self.admission.mixes, 1)
+        resp.stream.close()
+        resp.stream.close()
+        self.assertEqual((self.admission.mixes, self.admission.fetches), (0, 0))
+
+    def test_stale(self):
+        fresh = self.simulate_get("/atom", query_string=self.qs)
+        self.admission.acquire("other", 0)
+        stale = self.simulate_get("/atom", query_string=self.qs)
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.content, fresh.content)
+        self.assertEqual(stale.headers["x-fm-stale"], "true")
+        self.assertEqual(self.simulate_get("/rss", query_string=self.qs).status_code, 503)
+
+    def test_client_rate(self):
+        client = testing.TestClient(
+            feedmixer_api.wsgi_app(
+                sess=build_stub_session(),
+                admission=feedmixer_api.AdmissionControl(rate=0.01, burst=2, trusted_proxies=1),
+            )
+        )
+        for _ in range(2):
+            self.assertEqual(client.simulate_get("/json", query_string=self.qs).status_code, 200)
+        # (a mix which has not been rendered before has no stale copy)
+        qs = build_qs(feeds=["atom"], n=2)
+        result = client.simulate_get("/json", query_string=qs)
+        self.assertEqual(result.status_code, 429)
+        self.assertEqual(result.headers["retry-after"], "101")
+        # (buckets are per client)
+        other = client.simulate_get("/json", query_string=qs, headers={"X-Forwarded-For": "10.0.0.2"})
+        self.assertEqual(other.status_code, 200)
+
+    def test_client_id(self):
+        """
+        Test that only the 'X-Forwarded-For' addresses appended by trusted
+        proxies identify a client.
+        """
+        headers = {"X-Forwarded-For": "6.6.6.6, 10.0.0.2, 10.0.0.1"}
+        req = testing.create_req(headers=headers, remote_addr="10.0.0.9")
+        self.assertEqual(feedmixer_api.client_id(req), "10.0.0.9")
+        self.assertEqual(feedmixer_api.client_id(req, trusted_proxies=1), "10.0.0.1")
+        self.assertEqual(feedmixer_api.client_id(req, trusted_proxies=2), "10.0.0.2")
+        self.assertEqual(feedmixer_api.client_id(req, trusted_proxies=4), "10.0.0.9")
+        req = testing.create_req(remote_addr="10.0.0.9")
+        self.assertEqual(feedmixer_api.client_id(req, trusted_proxies=1), "10.0.0.9")
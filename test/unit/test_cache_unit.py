@@ -0,0 +1,300 @@
+import os
+import re
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import feedparser
+from cachecontrol.cache import DictCache
+
+from feedmixer_cache import (
+    MemoryCache,
+    RedisCache,
+    SharedParserCache,
+    Snapshotter,
+    SqliteCache,
+    load_snapshot,
+    open_cache,
+    save_snapshot,
+)
+
+ATOM_PATH = "test/test_atom.xml"
+
+with open(ATOM_PATH, "r") as f:
+    TEST_ATOM = f.read()
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough of the Redis protocol (RESP) for `RedisCache`.
+    """
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        data = self.server.data
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            if cmd == b"GET":
+                value, expires = data.get(args[1], (None, None))
+                if expires is not None and expires <= time.time():
+                    value = None
+                reply = self.bulk(value)
+            elif cmd == b"SET":
+                expires = None
+                if len(args) == 5 and args[3].upper() == b"PX":
+                    expires = time.time() + int(args[4]) / 1000
+                data[args[1]] = (args[2], expires)
+                reply = b"+OK\r\n"
+            elif cmd == b"DEL":
+                reply = b":%d\r\n" % sum(data.pop(k, None) is not None for k in args[1:])
+            elif cmd == b"SCAN":
+                prefix = re.sub(rb"\\(.)", rb"\1", args[3][:-1])
+                keys = [k for k in data if k.startswith(prefix)]
+                reply = b"*2\r\n" + self.bulk(b"0") + b"*%d\r\n" % len(keys) + b"".join(map(self.bulk, keys))
+            elif cmd == b"SELECT":
+                reply = b"+OK\r\n"
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+
+
+class BackendTests(object):
+    def make_cache(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.cache = self.make_cache()
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.set("a", b"\x00value\r\n")
+        self.assertEqual(self.cache.get("a"), b"\x00value\r\n")
+        self.cache.delete("a")
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_expires(self):
+        self.cache.set("a", b"1", expires=0.05)
+        self.cache.set("b", b"2", expires=3600)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), b"2")
+
+    def test_clear(self):
+        self.cache.set("a", b"1")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_keys(self):
+        self.cache.set("sub:http://a.example/feed?x=[1]", b"1")
+        self.cache.set("sub:http://b.example/feed", b"1")
+        self.cache.set("doc:http://a.example/feed", b"1")
+        self.assertEqual(
+            sorted(self.cache.keys("sub:")),
+            ["sub:http://a.example/feed?x=[1]", "sub:http://b.example/feed"],
+        )
+
+    def test_shared_parser_cache(self):
+        """
+        Test that a document parsed through one SharedParserCache is not
+        parsed again by another using the same backend.
+        """
+        parse = MagicMock(side_effect=feedparser.parse)
+        first = SharedParserCache(self.cache, parse=parse)
+        second = SharedParserCache(self.cache, parse=parse)
+        parsed = first(TEST_ATOM)
+        self.assertEqual(second(TEST_ATOM).entries[0].title, parsed.entries[0].title)
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(second.shared_hits, 1)
+        # (in process, the same object is returned)
+        self.assertIs(second(TEST_ATOM), second(TEST_ATOM))
+
+    def test_shared_parser_cache_bytes(self):
+        """
+        Test that raw documents are keyed on their bytes and response headers.
+        """
+        parse = MagicMock(side_effect=feedparser.parse)
+        parser = SharedParserCache(self.cache, parse=parse)
+        doc = TEST_ATOM.encode("utf-8")
+        headers = (("content-type", "application/atom+xml"),)
+        self.assertEqual(parser(doc, headers).entries[0].title, parser(TEST_ATOM).entries[0].title)
+        parse.assert_any_call(doc, response_headers=headers)
+        self.assertEqual(parser.key(doc), parser.key(TEST_ATOM))
+        self.assertNotEqual(parser.key(doc, headers), parser.key(doc))
+
+
+class TestMemoryCache(BackendTests, unittest.TestCase):
+    def make_cache(self):
+        return MemoryCache()
+
+    def test_maxsize(self):
+        cache = MemoryCache(maxsize=2)
+        for key in "abc":
+            cache.set(key, b"x")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("a"))
+
+
+class TestSqliteCache(BackendTests, unittest.TestCase):
+    def make_cache(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        return SqliteCache(os.path.join(self.tmpdir.name, "cache.db"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_shared_between_instances(self):
+        other = SqliteCache(self.cache.path)
+        self.cache.set("a", b"1")
+        self.assertEqual(other.get("a"), b"1")
+
+    def test_threads(self):
+        def work(n):
+            for i in range(20):
+                self.cache.set("{}-{}".format(n, i), b"x")
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.cache), 80)
+
+    def test_prune(self):
+        cache = SqliteCache(self.cache.path, maxsize=5)
+        for i in range(10):
+            cache.set(str(i), b"x")
+        cache.prune()
+        self.assertEqual(len(cache), 5)
+        self.assertEqual(cache.get("9"), b"x")
+
+
+class TestRedisCache(BackendTests, unittest.TestCase):
+    def make_cache(self):
+        self.server = FakeRedisServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        return RedisCache(host=host, port=port)
+
+    def tearDown(self):
+        self.cache.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_prefix(self):
+        self.cache.set("a", b"1")
+        self.assertIn(b"feedmixer:a", self.server.data)
+
+    def test_server_down(self):
+        """
+        Test that an unreachable server is a cache miss, not an error.
+        """
+        self.cache.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.set("a", b"1")
+
+
+class TestOpenCache(unittest.TestCase):
+    def test_urls(self):
+        self.assertIsInstance(open_cache("memory"), MemoryCache)
+        redis = open_cache("redis://:secret@cache.example:6380/2")
+        self.assertEqual((redis.host, redis.port, redis.db, redis.password), ("cache.example", 6380, 2, "secret"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sqlite = open_cache("sqlite://" + os.path.join(tmpdir, "fm.db"))
+            self.assertIsInstance(sqlite, SqliteCache)
+            sqlite.close()
+        with self.assertRaises(ValueError):
+            open_cache("memcached://localhost")
+
+
+class TestSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "caches.snap")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        http = DictCache()
+        http.set("https://example.org/feed", b"\x00serialized response")
+        parsed = MemoryCache()
+        parsed.set("a", b"1", expires=3600)
+        parsed.set("gone", b"2", expires=0.01)
+        time.sleep(0.02)
+        self.assertEqual(save_snapshot(self.path, {"http": http, "parsed": parsed}), 2)
+
+        new_http, new_parsed = DictCache(), MemoryCache()
+        self.assertEqual(load_snapshot(self.path, {"http": new_http, "parsed": new_parsed}), 2)
+        self.assertEqual(new_http.get("https://example.org/feed"), b"\x00serialized response")
+        self.assertEqual(new_parsed.get("a"), b"1")
+        self.assertIsNone(new_parsed.get("gone"))
+        # (the expiry time is kept)
+        self.assertAlmostEqual(new_parsed.items()[0][2], parsed.items()[0][2], places=3)
+
+    def test_warm_parser(self):
+        """
+        Test that a parser cache loaded from a snapshot does not parse again.
+        """
+        backend = MemoryCache()
+        SharedParserCache(backend)(TEST_ATOM)
+        save_snapshot(self.path, {"parsed": backend})
+
+        restored = MemoryCache()
+        load_snapshot(self.path, {"parsed": restored})
+        parse = MagicMock(side_effect=feedparser.parse)
+        self.assertTrue(SharedParserCache(restored, parse=parse)(TEST_ATOM).entries)
+        parse.assert_not_called()
+
+    def test_bad_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+        with self.assertRaises(ValueError):
+            load_snapshot(self.path, {})
+        self.assertEqual(Snapshotter(self.path, {}).load(), 0)
+
+    def test_periodic(self):
+        cache = MemoryCache()
+        cache.set("a", b"1")
+        snapshots = Snapshotter(self.path, {"c": cache}, interval=0.05)
+        snapshots.start()
+        try:
+            deadline = time.time() + 5
+            while not os.path.exists(self.path) and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            snapshots.stop()
+        restored = MemoryCache()
+        Snapshotter(self.path, {"c": restored}).load()
+        self.assertEqual(restored.get("a"), b"1")
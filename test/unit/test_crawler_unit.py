@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+from requests.exceptions import RequestException
+
+from feedmixer import Document, FeedMixer
+from feedmixer_cache import MemoryCache
+from feedmixer_crawler import Crawler, CrawlStore, NotCrawledError
+
+ATOM_PATH = "test/test_atom.xml"
+
+with open(ATOM_PATH, "r") as f:
+    TEST_ATOM = f.read()
+
+ATOM_DOC = Document(TEST_ATOM.encode("utf-8"), "application/xml")
+
+
+def build_stub_session(docs):
+    def mock_fetch(url, **kwargs):
+        if url not in docs:
+            raise RequestException("fetch error")
+        resp = MagicMock(spec=requests.Response)
+        resp.content = docs[url].encode("utf-8")
+        resp.headers = {"content-type": "application/xml"}
+        return resp
+
+    stub_session = MagicMock(spec=requests.session())
+    stub_session.headers = {}
+    stub_session.get = MagicMock(side_effect=mock_fetch)
+    return stub_session
+
+
+class TestCrawlStore(unittest.TestCase):
+    def setUp(self):
+        self.store = CrawlStore(MemoryCache())
+
+    def test_fetch(self):
+        """
+        Test that fetching an uncrawled URL subscribes to it and fails.
+        """
+        with self.assertRaises(NotCrawledError):
+            self.store.fetch("http://a.example/feed")
+        self.assertEqual(self.store.subscriptions(), ["http://a.example/feed"])
+        self.store.put("http://a.example/feed", ATOM_DOC)
+        self.assertEqual(self.store.fetch("http://a.example/feed"), ATOM_DOC)
+        self.store.put("http://b.example/feed", Document(b"<rss>\n</rss>", None))
+        self.assertEqual(self.store.get("http://b.example/feed"), Document(b"<rss>\n</rss>", None))
+
+    def test_read_only_mix(self):
+        """
+        Test that a FeedMixer using the store never touches its session.
+        """
+        sess = build_stub_session({})
+        self.store.put("atom", ATOM_DOC)
+        fm = FeedMixer(feeds=["atom", "missing"], num_keep=2, sess=sess, fetch=self.store.fetch)
+        self.assertEqual(len(fm.mixed_entries), 2)
+        self.assertIsInstance(fm.error_urls["missing"], NotCrawledError)
+        sess.get.assert_not_called()
+
+
+class TestCrawler(unittest.TestCase):
+    def setUp(self):
+        self.store = CrawlStore(MemoryCache())
+        self.docs = {"atom": TEST_ATOM}
+        self.crawler = Crawler(
+            self.store, sess=build_stub_session(self.docs), seeds=["atom"], min_interval=10, max_interval=80
+        )
+
+    def test_subscriptions(self):
+        self.store.subscribe("http://a.example/feed")
+        self.crawler.update_subscriptions()
+        self.assertEqual(set(self.crawler.schedule), {"atom", "http://a.example/feed"})
+        self.store.backend.clear()
+        self.crawler.update_subscriptions()
+        self.assertEqual(set(self.crawler.schedule), {"atom"})
+
+    def test_run_once(self):
+        self.crawler.update_subscriptions(now=0)
+        self.assertEqual(self.crawler.run_once(now=0), 1)
+        self.assertEqual(self.store.get("atom"), ATOM_DOC)
+        # (nothing is due until the interval has passed)
+        self.assertEqual(self.crawler.run_once(now=0), 0)
+
+    def test_adaptive_interval(self):
+        """
+        Test that the interval grows while a feed is unchanged (or failing)
+        and shrinks when it changes.
+        """
+        sched = self.crawler.schedule
+        self.crawler.update_subscriptions(now=0)
+        self.crawler.run_once(now=0)
+        self.assertEqual(sched["atom"].interval, 10)
+        for interval in (20, 40, 80, 80):
+            self.crawler.run_once(now=sched["atom"].due)
+            self.assertEqual(sched["atom"].interval, interval)
+        self.docs["atom"] = TEST_ATOM.replace("Ⓐmerican Cynic", "Changed Feed")
+        self.crawler.run_once(now=sched["atom"].due)
+        self.assertEqual(sched["atom"].interval, 40)
+
+        del self.docs["atom"]
+        self.crawler.run_once(now=sched["atom"].due)
+        self.assertEqual(sched["atom"].interval, 80)
+        self.assertEqual(sched["atom"].failures, 1)
+        # (the last good document is kept)
+        self.assertIn(b"Changed Feed", self.store.get("atom").content)
@@ -1,12 +1,35 @@
+import datetime
 import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, call
 
+import feedgenerator
 import feedparser
 import requests
 from requests.exceptions import RequestException
 
-from feedmixer import DEFAULT_TIMEOUT, FeedMixer, ParseError
+from feedmixer import (
+    DEFAULT_TIMEOUT,
+    JSON_BACKENDS,
+    REQUIRED_FIELDS,
+    EntryStore,
+    FeedMixer,
+    HedgedCall,
+    Hedger,
+    LatencyTracker,
+    ParseError,
+    atom_entry,
+    canonical_url,
+    native_feed,
+    parse_fields,
+    rss_entry,
+)
 
 ATOM_PATH = "test/test_atom.xml"
 RSS_PATH = "test/test_rss2.xml"
@@ -80,7 +103,8 @@ def build_stub_session():
         """Mimics the cache_get() method"""
         if url == "atom":
             resp = MagicMock()
-            resp.text = TEST_ATOM
+            resp.content = TEST_ATOM.encode("utf-8")
+            resp.headers = {"content-type": "application/xml"}
             return resp
         elif url == "fetcherror":
             raise RequestException("fetch error")
@@ -88,15 +112,18 @@ def build_stub_session():
             raise ParseError("parse error")
         elif url == "rss":
             resp = MagicMock()
-            resp.text = TEST_RSS
+            resp.content = TEST_RSS.encode("utf-8")
+            resp.headers = {"content-type": "application/xml"}
             return resp
         elif url == "rfc822_rss":
             resp = MagicMock()
-            resp.text = TEST_RSS_RFC822
+            resp.content = TEST_RSS_RFC822.encode("utf-8")
+            resp.headers = {"content-type": "application/xml"}
             return resp
         else:
             resp = MagicMock(spec=requests.Response)
-            resp.text = url
+            resp.content = url.encode("utf-8")
+            resp.headers = {"content-type": "application/xml"}
             return resp
 
     stub_session = MagicMock(spec=requests.session())
@@ -125,6 +152,27 @@ class TestMixedEntries(unittest.TestCase):
         mc.get.assert_called_once_with("atom", timeout=DEFAULT_TIMEOUT)
         self.assertEqual(len(me), 2)
 
+    def test_document_encoding(self):
+        """
+        Test that the raw bytes are parsed, so the encoding is taken from the
+        document when the Content-Type has no charset.
+        """
+        doc = (
+            '<?xml version="1.0" encoding="iso-8859-1"?><rss version="2.0"><channel><title>Caf\xe9</title>'
+            "<link>http://example.com/</link>"
+            "<item><title>Cr\xe8me br\xfbl\xe9e</title><link>http://example.com/1</link>"
+            "<pubDate>Mon, 02 Jan 2017 10:00:00 GMT</pubDate></item></channel></rss>"
+        )
+        resp = MagicMock(spec=requests.Response)
+        resp.content = doc.encode("iso-8859-1")
+        resp.headers = {"content-type": "application/xml"}
+        mc = MagicMock(spec=requests.session())
+        mc.get = MagicMock(return_value=resp)
+        parser_cache = MagicMock(side_effect=feedparser.parse)
+        fm = FeedMixer(feeds=["latin1"], num_keep=1, sess=mc, parser_cache=parser_cache)
+        self.assertEqual(fm.mixed_entries[0]["title"], "Cr\xe8me br\xfbl\xe9e")
+        parser_cache.assert_called_once_with(resp.content, response_headers=(("content-type", "application/xml"),))
+
     def test_memoized(self):
         """
         Test that calls to the parser are memoized
@@ -148,7 +196,7 @@ class TestMixedEntries(unittest.TestCase):
 
     def test_multi_good(self):
         """
-        Test with multiple good URLs.
+        Test with multiple good URLs (a repeated URL is fetched once).
         """
         mc = build_stub_session()
         fm = FeedMixer(feeds=["atom", "rss", "atom"], num_keep=2, sess=mc)
@@ -159,11 +207,11 @@ class TestMixedEntries(unittest.TestCase):
             [
                 call("atom", timeout=DEFAULT_TIMEOUT),
                 call("rss", timeout=DEFAULT_TIMEOUT),
-                call("atom", timeout=DEFAULT_TIMEOUT),
             ],
             any_order=True,
         )
-        self.assertEqual(len(me), 6)
+        self.assertEqual(mc.get.call_count, 2)
+        self.assertEqual(len(me), 4)
 
     def test_single_exception(self):
         """
@@ -175,6 +223,18 @@ class TestMixedEntries(unittest.TestCase):
         self.assertEqual(len(me), 0)
         self.assertIsInstance(fm.error_urls["fetcherror"], RequestException)
 
+    def test_summary_log(self):
+        """
+        Test that a mix logs one summary line at INFO.
+        """
+        mc = build_stub_session()
+        fm = FeedMixer(feeds=["atom", "rss", "fetcherror"], num_keep=1, sess=mc)
+        with self.assertLogs("feedmixer", level="INFO") as logs:
+            fm.mixed_entries
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("mix feeds=3 errors=1 entries=2 ", logs.output[0])
+        self.assertTrue(logs.output[0].endswith(" failed=fetcherror"))
+
     def test_multi_exception(self):
         """
         Test with several URLs which all throw exceptions.
@@ -263,6 +323,395 @@ class TestMixedEntries(unittest.TestCase):
         self.assertEqual(me[1]["title"], "Middle Entry")
         self.assertEqual(me[2]["title"], "Oldest Entry")
 
+    def test_since(self):
+        """
+        Test that only entries newer than `since` are kept (after num_keep
+        has been applied), and undated entries are dropped.
+        """
+        mc = build_stub_session()
+        since = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+        fm = FeedMixer(feeds=["atom", "rss"], num_keep=3, sess=mc, since=since)
+        me = fm.mixed_entries
+        self.assertEqual(len(me), 4)
+        self.assertTrue(all(e["pubdate"] > since.replace(tzinfo=None) for e in me))
+
+    def test_iter_feeds(self):
+        """
+        Test that each feed is yielded as soon as it arrives, without waiting
+        for slower ones.
+        """
+        stub = build_stub_session()
+        arrived = threading.Event()
+
+        def slow_fetch(url, **kwargs):
+            if url == "slow":
+                self.assertTrue(arrived.wait(5))
+                url = "rss"
+            return stub.get(url, **kwargs)
+
+        mc = MagicMock(spec=requests.session())
+        mc.get = MagicMock(side_effect=slow_fetch)
+        fm = FeedMixer(feeds=["slow", "atom", "fetcherror"], num_keep=2, sess=mc)
+        feeds = fm.iter_feeds()
+        url, entries = next(feeds)
+        self.assertEqual(url, "atom")
+        self.assertEqual(len(entries), 2)
+        arrived.set()
+        self.assertEqual([url for url, _ in feeds], ["slow"])
+        self.assertEqual(list(fm.error_urls), ["fetcherror"])
+
+
+class TestEntryStore(unittest.TestCase):
+    def test_shared_store(self):
+        """
+        Test that extracted entries are reused between FeedMixer instances
+        sharing a store.
+        """
+        mc = build_stub_session()
+        store = EntryStore()
+        first = FeedMixer(feeds=["atom"], num_keep=2, sess=mc, entry_store=store)
+        second = FeedMixer(feeds=["atom"], num_keep=2, sess=mc, entry_store=store)
+        self.assertEqual(len(first.mixed_entries), 2)
+        self.assertIs(first.mixed_entries[0], second.mixed_entries[0])
+        self.assertIn("atom", store)
+
+    def test_merge_new_entries(self):
+        """
+        Test that refreshing a feed only creates records for new or changed
+        entries.
+        """
+        store = EntryStore()
+        old = store.update("atom", feedparser.parse(TEST_ATOM)).document
+        old_meta = [e.meta() for e in old]
+
+        # a new entry at the top, and a changed title on the (old) second entry
+        changed = TEST_ATOM.replace(
+            "<entry>",
+            "<entry><title>New</title><id>tag:new</id><updated>2017-03-01T00:00:00Z</updated></entry><entry>",
+            1,
+        ).replace("Dyer Lum on", "Changed: Dyer Lum on", 1)
+        new = store.update("atom", feedparser.parse(changed)).document
+
+        self.assertEqual(len(new), len(old) + 1)
+        self.assertEqual(new[0].meta()["title"], "New")
+        self.assertIs(new[1], old[0])
+        self.assertIs(new[1].meta(), old_meta[0])
+        self.assertIsNot(new[2], old[1])
+        self.assertTrue(new[2].meta()["title"].startswith("Changed"))
+        self.assertTrue(all(n is o for n, o in zip(new[3:], old[2:])))
+        self.assertEqual(store.get("atom").document, new)
+        self.assertEqual(store.get("atom").entries, new)
+
+    def test_changed_entry_and_feed(self):
+        """
+        Test that an entry is re-extracted when its updated date changes, or
+        when its feed's title does.
+        """
+        store = EntryStore()
+        old = store.update("atom", feedparser.parse(TEST_ATOM)).document
+        self.assertIs(store.update("atom", feedparser.parse(TEST_ATOM)).document[0], old[0])
+
+        retagged = TEST_ATOM.replace("<entry>", '<entry><category term="new-tag"/>', 1)
+        self.assertIs(store.update("atom", feedparser.parse(retagged)).document[0], old[0])
+        retagged = retagged.replace("2017-02-15T07:00:00Z", "2017-02-16T07:00:00Z", 1)
+        new = store.update("atom", feedparser.parse(retagged)).document
+        self.assertIsNot(new[0], old[0])
+        self.assertIn("new-tag", new[0].meta()["categories"])
+        self.assertIs(new[1], old[1])
+
+        retitled = retagged.replace("<title>", "<title>Renamed ", 1)
+        parsed = feedparser.parse(retitled)
+        renamed = store.update("atom", parsed)
+        self.assertTrue(all(r is not n for r, n in zip(renamed.document, new)))
+        self.assertEqual(renamed.entries[1].meta()["feed_title"], parsed.feed.title)
+
+    def test_keeps_dropped_entries(self):
+        """
+        Test that entries which drop off the document stay in the store, in
+        date order, up to `max_entries`.
+        """
+        parsed = feedparser.parse(TEST_ATOM)
+        store = EntryStore(max_entries=len(parsed.entries))
+        old = store.update("atom", parsed).entries
+        # the newest entry is dropped and a newer one added
+        start = TEST_ATOM.index("<entry>")
+        end = TEST_ATOM.index("</entry>") + len("</entry>")
+        new_entry = "<entry><title>New</title><id>tag:new</id><updated>2017-03-01T00:00:00Z</updated></entry>"
+        stored = store.update("atom", feedparser.parse(TEST_ATOM[:start] + new_entry + TEST_ATOM[end:]))
+
+        self.assertNotIn(old[0], stored.document)
+        self.assertEqual(stored.entries[0].meta()["title"], "New")
+        self.assertIs(stored.entries[1], old[0])
+        self.assertEqual(stored.entries[2:], old[1:-1])
+        self.assertNotIn(old[-1].key, stored.by_key)
+
+    def test_read_only_metadata(self):
+        """
+        Test that the metadata handed out (and shared between mixes) cannot
+        be modified.
+        """
+        fm = FeedMixer(feeds=["atom"], sess=build_stub_session(), entry_store=EntryStore())
+        with self.assertRaises(TypeError):
+            fm.mixed_entries[0]["title"] = "Changed"
+        self.assertEqual(dict(fm.mixed_entries[0])["title"], fm.mixed_entries[0]["title"])
+
+        tagged = TEST_ATOM.replace("<entry>", '<entry><category term="tag"/>', 1)
+        stored = EntryStore().update("atom", feedparser.parse(tagged))
+        with self.assertRaises(AttributeError):
+            stored.document[0].meta()["categories"].append("changed")
+        stored = EntryStore().update("rss", feedparser.parse(TEST_RSS))
+        enclosures = [e.meta()["enclosures"] for e in stored.document if "enclosures" in e.meta()]
+        self.assertTrue(enclosures)
+        with self.assertRaises(TypeError):
+            enclosures[0][0] = None
+
+    def test_same_document(self):
+        """
+        Test that a parser cache hit returns the stored entries as they are.
+        """
+        store = EntryStore()
+        parsed = feedparser.parse(TEST_ATOM)
+        self.assertIs(store.update("atom", parsed), store.update("atom", parsed))
+
+    def test_parse_result_unmodified(self):
+        """
+        Test that neither storing a shared parse result nor rendering its
+        entries modifies it or the stored metadata.
+        """
+        parsed = feedparser.parse(TEST_ATOM)
+        before = [dict(e) for e in parsed.entries]
+        parser_cache = MagicMock(return_value=parsed)
+        mc = build_stub_session()
+        fm = FeedMixer(feeds=["atom"], sess=mc, parser_cache=parser_cache, entry_store=EntryStore())
+        metas = [dict(e) for e in fm.mixed_entries]
+        self.assertEqual(fm.mixed_entries[0]["feed_title"], parsed.feed.title)
+        self.assertIn("author_name", fm.mixed_entries[0])
+        self.assertIs(fm.mixed_entries[0]["unique_id_is_permalink"], False)
+        fm.rss_feed()
+        fm.json_feed()
+        self.assertEqual([dict(e) for e in parsed.entries], before)
+        self.assertEqual([dict(e) for e in fm.mixed_entries], metas)
+
+    def test_maxsize(self):
+        store = EntryStore(maxsize=1)
+        store.update("atom", feedparser.parse(TEST_ATOM))
+        store.update("rss", feedparser.parse(TEST_RSS))
+        self.assertEqual(len(store), 1)
+        self.assertIsNone(store.get("atom"))
+        self.assertIsNotNone(store.get("rss"))
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_record(self):
+        latencies = LatencyTracker(alpha=0.5)
+        latencies.record("http://a.example/feed", 1.0)
+        latencies.record("http://a.example/feed", 3.0)
+        self.assertEqual(latencies.expected("http://a.example/feed"), 2.0)
+        # (unknown URLs fall back to their host)
+        self.assertEqual(latencies.expected("http://a.example/other"), 2.0)
+        self.assertIsNone(latencies.expected("http://b.example/feed"))
+
+    def test_order(self):
+        latencies = LatencyTracker()
+        latencies.record("http://fast.example/feed", 0.1)
+        latencies.record("http://slow.example/feed", 2.0)
+        urls = ["http://fast.example/feed", "http://slow.example/feed", "http://new.example/feed"]
+        self.assertEqual(
+            latencies.order(urls),
+            ["http://new.example/feed", "http://slow.example/feed", "http://fast.example/feed"],
+        )
+
+    def test_maxsize(self):
+        latencies = LatencyTracker(maxsize=2)
+        for host in "abc":
+            latencies.record("http://{}.example/feed".format(host), 1.0)
+        self.assertEqual(len(latencies), 2)
+        self.assertIsNone(latencies.expected("http://a.example/feed"))
+
+    def test_timeout(self):
+        latencies = LatencyTracker(timeout_factor=4, min_timeout=1, min_samples=3)
+        fast, slow = "http://fast.example/feed", "http://slow.example/feed"
+        for _ in range(3):
+            latencies.record(fast, 0.1, response=True)
+            latencies.record(slow, 10, response=True)
+        # (cache hits and failures do not count)
+        latencies.record(fast, 0.001)
+        latencies.record(fast, 30)
+        self.assertEqual(latencies.timeout(fast, 30), 1)
+        self.assertEqual(latencies.timeout(slow, 30), 30)
+        latencies.max_timeout = 60
+        self.assertEqual(latencies.timeout(slow, 30), 40)
+        # (not enough history yet)
+        latencies.record("http://new.example/feed", 0.1, response=True)
+        self.assertEqual(latencies.timeout("http://new.example/feed", 30), 30)
+        latencies.timeout_factor = 0
+        self.assertEqual(latencies.timeout(fast, 30), 30)
+
+    def test_timeouts_widen(self):
+        """
+        Test that a host which becomes slower than its adaptive timeout has
+        it widened by its timeouts instead of timing out for good.
+        """
+        latencies = LatencyTracker(timeout_factor=4, min_timeout=2, min_samples=10)
+        url = "http://a.example/feed"
+        for _ in range(100):
+            latencies.record(url, 0.1, response=True)
+        self.assertEqual(latencies.timeout(url, 30), 2)
+        for _ in range(2):
+            latencies.record_result(url, 2, error=requests.Timeout())
+        self.assertEqual(latencies.timeout(url, 30), 8)
+
+    def test_error_responses(self):
+        """
+        Test that error responses (however fast) and other failures do not
+        count towards the timeout.
+        """
+        latencies = LatencyTracker(min_samples=1)
+        url = "http://a.example/feed"
+        latencies.record_result(url, 1.0, MagicMock(ok=True, from_cache=False))
+        latencies.record_result(url, 0.001, MagicMock(ok=False, from_cache=False))
+        latencies.record_result(url, 0.001, error=requests.ConnectionError())
+        self.assertEqual(latencies.percentile(url, 0.01), 1.0)
+
+    def test_max_age(self):
+        latencies = LatencyTracker(min_samples=1, max_age=0)
+        latencies.record("http://a.example/feed", 1.0, response=True)
+        time.sleep(0.01)
+        self.assertIsNone(latencies.percentile("http://a.example/feed"))
+
+    def test_adaptive_timeout(self):
+        """
+        Test that FeedMixer requests time out after the adaptive timeout once
+        the host has enough history.
+        """
+        url = "http://fast.example/feed"
+        resp = MagicMock(spec=requests.Response)
+        resp.content = TEST_ATOM.encode("utf-8")
+        resp.headers = {}
+        mc = MagicMock(spec=requests.session())
+        mc.get = MagicMock(return_value=resp)
+        latencies = LatencyTracker(min_timeout=2, min_samples=2)
+        for _ in range(3):
+            FeedMixer(feeds=[url], sess=mc, latencies=latencies).mixed_entries
+        timeouts = [c.kwargs["timeout"] for c in mc.get.call_args_list]
+        self.assertEqual(timeouts, [DEFAULT_TIMEOUT, DEFAULT_TIMEOUT, 2])
+
+    def test_slowest_first(self):
+        """
+        Test that with more feeds than threads the feeds which were slowest
+        last time are fetched first (and that fetch times are recorded).
+        """
+        urls = ["http://fast.example/feed", "http://slow.example/feed"]
+        resp = MagicMock(spec=requests.Response)
+        resp.content = TEST_ATOM.encode("utf-8")
+        resp.headers = {}
+        mc = MagicMock(spec=requests.session())
+        mc.get = MagicMock(return_value=resp)
+        latencies = LatencyTracker()
+        latencies.record(urls[1], 2.0)
+        latencies.record(urls[0], 0.1)
+
+        FeedMixer(feeds=urls, sess=mc, max_threads=1, latencies=latencies).mixed_entries
+        self.assertEqual([c.args[0] for c in mc.get.call_args_list], urls[::-1])
+        self.assertLess(latencies.expected(urls[1]), 2.0)
+
+
+class TestHedger(unittest.TestCase):
+    def stalling(self, results):
+        """
+        A function which returns each of `results` in turn, the first only
+        once `self.release` is set.
+        """
+        self.release = threading.Event()
+        calls = []
+
+        def fn(*args, **kwargs):
+            calls.append(None)
+            n = len(calls)
+            if n == 1:
+                self.assertTrue(self.release.wait(5))
+            result = results[n - 1]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.addCleanup(lambda: self.release.set())
+        return fn
+
+    def hedged_call(self, hedger, fn, delay):
+        """
+        `hedger.run` `fn` on a thread of its own; return the result of the
+        call, whether it was hedged, and whether the hedge won.
+        """
+        call = HedgedCall()
+        threading.Thread(target=hedger.run, args=(fn, delay, call), daemon=True).start()
+        return call.result(timeout=5), call.hedged, call.won
+
+    def test_fast(self):
+        hedger = Hedger()
+        threads = []
+
+        def fn():
+            threads.append(threading.current_thread())
+            return "first"
+
+        for delay in (1.0, None):
+            call = HedgedCall()
+            hedger.run(fn, delay, call)
+            self.assertEqual((call.result(), call.hedged, call.won), ("first", False, False))
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+        self.assertEqual(hedger.stats(), {"requests": 2, "hedged": 0, "wins": 0, "denied": 0})
+
+    def test_hedge_wins(self):
+        hedger = Hedger()
+        self.assertEqual(self.hedged_call(hedger, self.stalling(["first", "hedge"]), 0.01), ("hedge", True, True))
+        self.assertEqual((hedger.hedged, hedger.wins), (1, 1))
+
+    def test_failed_hedge(self):
+        hedger = Hedger()
+        fn = self.stalling(["first", RequestException("hedge failed")])
+        threading.Timer(0.05, lambda: self.release.set()).start()
+        self.assertEqual(self.hedged_call(hedger, fn, 0.01), ("first", True, False))
+        fn = self.stalling([RequestException("first failed"), RequestException("hedge failed")])
+        threading.Timer(0.05, lambda: self.release.set()).start()
+        with self.assertRaises(RequestException):
+            self.hedged_call(hedger, fn, 0.01)
+
+    def test_budget(self):
+        hedger = Hedger(budget=0, burst=1)
+        self.assertEqual(self.hedged_call(hedger, self.stalling(["first", "hedge"]), 0.01), ("hedge", True, True))
+        fn = self.stalling(["first", "hedge"])
+        threading.Timer(0.05, lambda: self.release.set()).start()
+        self.assertEqual(self.hedged_call(hedger, fn, 0.01), ("first", False, False))
+        self.assertEqual(hedger.denied, 1)
+
+    def test_log_stats(self):
+        hedger = Hedger(log_interval=0)
+        with self.assertLogs("feedmixer", level="INFO") as logs:
+            self.hedged_call(hedger, self.stalling(["first", "hedge"]), 0.01)
+            self.hedged_call(hedger, lambda: "first", None)
+        self.assertIn("hedging requests=2 hedged=1 wins=1 denied=0", logs.output[-1])
+
+    def test_feedmixer(self):
+        """
+        Test that a FeedMixer fetch which stalls past its host's usual
+        response time is hedged.
+        """
+        url = "http://a.example/feed"
+        resp = MagicMock(spec=requests.Response)
+        resp.content = TEST_ATOM.encode("utf-8")
+        resp.headers = {}
+        mc = MagicMock(spec=requests.session())
+        mc.get = MagicMock(side_effect=self.stalling([resp, resp]))
+        latencies = LatencyTracker(min_samples=1)
+        latencies.record(url, 0.01, response=True)
+        hedger = Hedger()
+        fm = FeedMixer(feeds=[url], num_keep=2, sess=mc, latencies=latencies, hedger=hedger)
+        with self.assertLogs("feedmixer", level="INFO") as logs:
+            self.assertEqual(len(fm.mixed_entries), 2)
+        self.assertEqual(hedger.wins, 1)
+        self.assertIn("hedged=1 hedge_wins=1", logs.output[-1])
+
 
 class TestFeed(unittest.TestCase):
     def test_set_feed(self):
@@ -280,16 +729,109 @@ class TestFeed(unittest.TestCase):
 
     def test_set_num_keep(self):
         """
-        Test that setting the num_keep property re-fetches the feeds.
+        Test that setting the num_keep property re-slices the entries already
+        fetched without fetching the feeds again.
         """
         # First fetch some entries
         mc = build_stub_session()
         fm = FeedMixer(feeds=["atom", "rss"], num_keep=2, sess=mc)
         self.assertEqual(len(fm.mixed_entries), 4)
 
-        # Now clear feeds and assert that mixed_entries is also cleared
         fm.num_keep = 1
         self.assertEqual(len(fm.mixed_entries), 2)
+        fm.num_keep = 0
+        self.assertGreater(len(fm.mixed_entries), 4)
+        self.assertEqual(mc.get.call_count, 2)
+
+    def test_set_prefer_summary(self):
+        """
+        Test that changing prefer_summary re-extracts the entries without
+        fetching the feeds again.
+        """
+        mc = build_stub_session()
+        fm = FeedMixer(feeds=["atom"], num_keep=1, sess=mc)
+        summary = fm.mixed_entries[0]["description"]
+        fm.prefer_summary = False
+        self.assertNotEqual(fm.mixed_entries[0]["description"], summary)
+        fm.prefer_summary = True
+        self.assertEqual(fm.mixed_entries[0]["description"], summary)
+        self.assertEqual(mc.get.call_count, 1)
+
+    def test_set_fields_and_since(self):
+        """
+        Test that fields and since set after construction are normalized as
+        the constructor's arguments are, and re-derive the mix.
+        """
+        mc = build_stub_session()
+        fm = FeedMixer(feeds=["atom", "rss"], num_keep=3, sess=mc)
+        self.assertIn("description", fm.mixed_entries[0])
+        fm.fields = ["title"]
+        self.assertEqual(fm.fields, REQUIRED_FIELDS)
+        self.assertIsNone(fm.mixed_entries[0]["description"])
+
+        expected = FeedMixer(
+            feeds=["atom", "rss"],
+            num_keep=3,
+            sess=build_stub_session(),
+            since=datetime.datetime(2015, 1, 1),
+        ).mixed_entries
+        tz = datetime.timezone(datetime.timedelta(hours=-5))
+        fm.fields = None
+        fm.since = datetime.datetime(2014, 12, 31, 19, tzinfo=tz)
+        self.assertEqual(fm.since, datetime.datetime(2015, 1, 1))
+        self.assertEqual(fm.mixed_entries, expected)
+        self.assertEqual(mc.get.call_count, 2)
+
+    def test_empty_mix_fetched_once(self):
+        """
+        Test that a mix with no entries is not fetched again each time its
+        entries are read.
+        """
+        mc = build_stub_session()
+        fm = FeedMixer(feeds=["fetcherror"], sess=mc)
+        self.assertEqual(fm.mixed_entries, [])
+        self.assertEqual(fm.mixed_entries, [])
+        self.assertEqual(mc.get.call_count, 1)
+
+        # (setting the feeds fetches them again)
+        fm.feeds = fm.feeds
+        fm.mixed_entries
+        self.assertEqual(mc.get.call_count, 2)
+
+    def test_canonical_feeds(self):
+        """
+        Test that spellings of the same feed URL are fetched (and reported)
+        once, under the canonical URL.
+        """
+        mc = build_stub_session()
+        fm = FeedMixer(feeds=["HTTP://Example.com:80/feed", "http://example.com/feed?", " rss "], sess=mc)
+        self.assertEqual(fm.feeds, ["http://example.com/feed", "rss"])
+        fm.mixed_entries
+        self.assertEqual(mc.get.call_count, 2)
+        self.assertEqual(list(fm.error_urls), ["http://example.com/feed"])
+
+
+class TestCanonicalURL(unittest.TestCase):
+    def test_canonical_url(self):
+        cases = {
+            "HTTP://Example.COM:80/feed": "http://example.com/feed",
+            "https://example.com:443/feed?": "https://example.com/feed",
+            "http://example.com": "http://example.com/",
+            "http://example.com/feed#top": "http://example.com/feed",
+            "http://example.com:8080/a%2fb%7E?q=%e2%9c%93": "http://example.com:8080/a%2Fb~?q=%E2%9C%93",
+            "http://user@Example.com/feed": "http://user@example.com/feed",
+            "http://[::1]:80/feed": "http://[::1]/feed",
+        }
+        for url, expected in cases.items():
+            self.assertEqual(canonical_url(url), expected)
+            self.assertEqual(canonical_url(expected), expected)
+
+    def test_query_order_kept(self):
+        self.assertEqual(canonical_url("http://example.com/?b=1&a=2"), "http://example.com/?b=1&a=2")
+
+    def test_not_http(self):
+        for url in ("atom", "ftp://Example.com/feed", "http://example.com:port/"):
+            self.assertEqual(canonical_url(" " + url), url)
 
 
 class TestAtomFeed(unittest.TestCase):
@@ -353,3 +895,167 @@ class TestJSONFeed(unittest.TestCase):
         jf = fm.json_feed()
         self.maxDiff = None
         self.assertEqual(expected, jf)
+
+        # encoding directly with the stdlib gives the same output
+        fm = FeedMixer(feeds=["atom", "rss"], num_keep=1, sess=mc, json_backend="stdlib")
+        self.assertEqual(expected, fm.json_feed())
+
+    def test_json_backends(self):
+        """
+        Test that every available backend encodes the same document.
+        """
+        mc = build_stub_session()
+        expected = json.loads(FeedMixer(feeds=["atom", "rss"], num_keep=0, sess=mc).json_feed())
+        for backend in JSON_BACKENDS:
+            fm = FeedMixer(feeds=["atom", "rss"], num_keep=0, sess=mc, json_backend=backend)
+            self.assertEqual(json.loads(fm.json_feed()), expected, backend)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            FeedMixer(feeds=["atom"], json_backend="nope")
+
+
+class TestNativeXML(unittest.TestCase):
+    # an entry which exercises escaping and the optional elements
+    TRICKY = {
+        "title": 'Fish & "Chips" <b>',
+        "link": "http://example.com/caf\u00e9?a=1&b='2'",
+        "description": "<p>It's</p>\n\tok",
+        "author_name": "Ann",
+        "author_email": "ann@example.com",
+        "author_link": "http://example.com/ann",
+        "pubdate": datetime.datetime(2017, 2, 15, 7, 0, 1),
+        "updateddate": datetime.datetime(2017, 2, 16, 7, 0, 1),
+        "comments": "http://example.com/comments",
+        "unique_id": "tag:example.com,2017:1",
+        # (as set by FeedMixer for guids which are not URLs)
+        "unique_id_is_permalink": False,
+        "item_copyright": "CC \"BY\"",
+        "categories": ["a & b", "c"],
+        "enclosures": [feedgenerator.Enclosure("http://example.com/e.mp3", "10", "audio/mpeg")],
+        "feed_link": "http://example.com",
+        "feed_title": "Example",
+    }
+
+    def generate(self, gen_cls, entries):
+        gen = gen_cls(title="T & t", link="http://example.com/?f=a&n=1", description="d")
+        for e in entries:
+            gen.add_item(**dict(e))
+        return gen.writeString("utf-8")
+
+    def test_entries(self):
+        """
+        Test that single entries serialize exactly as feedgenerator does.
+        """
+        entries = [self.TRICKY, dict(self.TRICKY, author_name=None, pubdate=None, categories=[])]
+        for gen_cls, ftype, serialize in [
+            (feedgenerator.Atom1Feed, "atom", atom_entry),
+            (feedgenerator.Rss201rev2Feed, "rss", rss_entry),
+        ]:
+            expected = self.generate(gen_cls, entries)
+            fragments = [serialize(e) for e in entries]
+            got = native_feed(ftype, "T & t", "http://example.com/?f=a&n=1", "d", entries, fragments)
+            self.assertEqual(got, expected)
+
+    def test_conformance(self):
+        """
+        Test that FeedMixer's native output matches its feedgenerator output.
+        """
+        # (the test RSS feed has an undated entry, which Atom gives the
+        # current time, so that is only compared as RSS)
+        for feeds, methods in [(["atom"], ["atom_feed", "rss_feed"]), (["atom", "rss"], ["rss_feed"])]:
+            for method in methods:
+                mc = build_stub_session()
+                fm = FeedMixer(feeds=feeds, num_keep=0, sess=mc)
+                native = FeedMixer(feeds=feeds, num_keep=0, sess=mc, native_xml=True)
+                self.maxDiff = None
+                self.assertEqual(getattr(native, method)(), getattr(fm, method)())
+
+    def test_reuse(self):
+        """
+        Test that the serialized entries are kept in the entry store.
+        """
+        mc = build_stub_session()
+        store = EntryStore()
+        first = FeedMixer(feeds=["atom"], num_keep=2, sess=mc, entry_store=store, native_xml=True)
+        first.atom_feed()
+        stored = store.get("atom").entries[0]
+        self.assertIs(stored.fragment("atom"), stored.fragment("atom"))
+
+    def test_control_characters(self):
+        with self.assertRaises(ValueError):
+            atom_entry(dict(self.TRICKY, title="bell\x07"))
+
+
+class TestFields(unittest.TestCase):
+    def test_parse_fields(self):
+        self.assertEqual(parse_fields("title"), REQUIRED_FIELDS)
+        self.assertEqual(parse_fields(["author,categories", "description"]) - REQUIRED_FIELDS,
+                         {"author", "categories", "description"})
+        with self.assertRaises(ValueError):
+            parse_fields("title,body")
+
+    def test_projection(self):
+        """
+        Test that only the selected fields are extracted and emitted.
+        """
+        mc = build_stub_session()
+        full = FeedMixer(feeds=["atom"], num_keep=2, prefer_summary=False, sess=mc)
+        titles = FeedMixer(feeds=["atom"], num_keep=2, prefer_summary=False, sess=mc, fields="title")
+        for entry, projected in zip(full.mixed_entries, titles.mixed_entries):
+            self.assertIsNone(projected["description"])
+            self.assertNotIn("author_name", projected)
+            self.assertEqual(
+                {k: projected[k] for k in ("title", "link", "unique_id", "pubdate")},
+                {k: entry[k] for k in ("title", "link", "unique_id", "pubdate")},
+            )
+        self.assertLess(len(titles.atom_feed()), len(full.atom_feed()) / 10)
+        items = json.loads(titles.json_feed())["items"]
+        self.assertEqual(sorted(items[0]), ["date_modified", "date_published", "id", "title", "url"])
+
+        titles.native_xml = True
+        self.assertEqual(len(feedparser.parse(titles.rss_feed()).entries), 2)
+
+    def test_shared_entries(self):
+        """
+        Test that projections of entries in a shared store do not interfere.
+        """
+        mc = build_stub_session()
+        store = EntryStore()
+        titles = FeedMixer(feeds=["atom"], num_keep=1, sess=mc, entry_store=store, fields=["title"])
+        full = FeedMixer(feeds=["atom"], num_keep=1, sess=mc, entry_store=store)
+        self.assertIsNone(titles.mixed_entries[0]["description"])
+        self.assertNotEqual(full.mixed_entries[0]["description"], "")
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_output_modules_deferred(self):
+        """
+        Test that importing feedmixer does not import the output format
+        modules until a feed is generated.
+        """
+        code = (
+            "import sys, feedmixer\n"
+            "print(sorted(m for m in ('feedgenerator', 'jsonfeed', 'orjson') if m in sys.modules))"
+        )
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "[]")
+
+        mc = build_stub_session()
+        fm = FeedMixer(feeds=["atom"], num_keep=1, sess=mc)
+        self.assertIn("<feed", fm.atom_feed())
+        self.assertIn("items", fm.json_feed())
+
+    def test_cache_modules_deferred(self):
+        """
+        Test that a worker which is configured with no shared cache, snapshot
+        file or read-only mode does not import the modules for them.
+        """
+        code = (
+            "import sys, feedmixer_wsgi\n"
+            "print(sorted(m for m in ('feedmixer_cache', 'feedmixer_crawler') if m in sys.modules))"
+        )
+        env = {k: v for k, v in os.environ.items() if not k.startswith("FM_")}
+        env["FM_LOG_LEVEL"] = "WARNING"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+        self.assertEqual(out.stdout.strip(), "[]")
@@ -0,0 +1,89 @@
+import functools
+import gc
+import os
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock
+
+import feedparser
+import requests
+
+from feedmixer import FeedMixer
+
+ATOM_PATH = "test/test_atom.xml"
+
+with open(ATOM_PATH, "r") as f:
+    TEST_ATOM = "".join(f.readlines())
+
+NUM_FEEDS = 10
+
+
+def traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def build_docs():
+    """
+    Distinct copies of the test feed (so each is a separate cache entry).
+    """
+    return {
+        "atom{}".format(i): TEST_ATOM.replace("<title>", "<title>{} ".format(i), 1)
+        for i in range(NUM_FEEDS)
+    }
+
+
+def build_stub_session(docs):
+    responses = {}
+    for url, doc in docs.items():
+        resp = MagicMock(spec=requests.Response)
+        resp.content = doc.encode("utf-8")
+        resp.headers = {"content-type": "application/xml"}
+        responses[url] = resp
+    stub_session = MagicMock(spec=requests.session())
+    stub_session.get = MagicMock(side_effect=lambda url, **kwargs: responses[url])
+    return stub_session
+
+
+@unittest.skipUnless(
+    os.environ.get("FM_MEMORY_TESTS"), "set FM_MEMORY_TESTS=1 to run memory tests"
+)
+class TestCacheMemory(unittest.TestCase):
+    """
+    Memory regression tests (run with tracemalloc, which is slow).
+    """
+
+    def setUp(self):
+        tracemalloc.start()
+
+    def tearDown(self):
+        tracemalloc.stop()
+
+    def test_parser_cache_bytes_per_feed(self):
+        """
+        Each feed in the parser cache should retain at most a small multiple
+        of the size of its document.
+        """
+        docs = build_docs()
+        cache = functools.lru_cache(maxsize=NUM_FEEDS)(feedparser.parse)
+        before = traced()
+        for doc in docs.values():
+            cache(doc)
+        per_feed = (traced() - before) // NUM_FEEDS
+        self.assertLess(per_feed, 30 * len(TEST_ATOM))
+
+    def test_mix_releases_memory(self):
+        """
+        Once a mix has been generated, nothing but the parser cache entries
+        should be retained.
+        """
+        docs = build_docs()
+        mc = build_stub_session(docs)
+        cache = functools.lru_cache(maxsize=NUM_FEEDS)(feedparser.parse)
+        FeedMixer(feeds=list(docs), num_keep=0, sess=mc, parser_cache=cache).atom_feed()
+
+        before = traced()
+        fm = FeedMixer(feeds=list(docs), num_keep=0, sess=mc, parser_cache=cache)
+        fm.atom_feed()
+        del fm
+        self.assertLess(traced() - before, 64 * 1024)